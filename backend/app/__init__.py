@@ -13,6 +13,10 @@ def create_app():
     # Database tables should be created using setup_database.py
     # Removed automatic table creation to avoid conflicts
     
+    # Return each request's pooled database connection on teardown
+    from .core.database import init_app as init_database
+    init_database(app)
+    
     # Register network detection middleware
     @app.before_request
     def before_request():
@@ -3,6 +3,7 @@
 import os
 from datetime import datetime, timedelta
 from ..core.database import get_db_cursor
+from ..core.periods import Period
 
 def calculate_salary(user_id, month=None, year=None):
     """Tính lương dựa trên dữ liệu chấm công"""
@@ -12,9 +13,10 @@ def calculate_salary(user_id, month=None, year=None):
         year = datetime.now().year
     
     try:
+        where, bounds = Period.month(year, month).sql('date')
         with get_db_cursor() as cursor:
             # Lấy dữ liệu chấm công trong tháng
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT 
                     COUNT(*) as total_days,
                     SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) as present_days,
@@ -23,9 +25,8 @@ def calculate_salary(user_id, month=None, year=None):
                     SUM(total_hours) as total_hours
                 FROM attendance 
                 WHERE user_id = %s 
-                AND EXTRACT(MONTH FROM date) = %s 
-                AND EXTRACT(YEAR FROM date) = %s
-            """, (user_id, month, year))
+                AND {where}
+            """, (user_id, *bounds))
             
             result = cursor.fetchone()
             if not result:
@@ -3,6 +3,12 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_admin, validate_required_fields, log_activity
+from ..core.principal import invalidate_principal
+from ..core.periods import Period
+from ..core.dialect import get_dialect
+from ..core.pagination import KeysetPage
+from ..face_gallery import publish_face_change
+from ..report import refresh_daily_rollup
 import bcrypt
 
 admin_bp = Blueprint('admin', __name__)
@@ -135,7 +141,9 @@ def update_user(current_user_id, user_id):
             
             if cursor.rowcount == 0:
                 return create_response(False, error='User not found', status_code=404)
-            
+
+            invalidate_principal(user_id)
+            publish_face_change('user_updated', user_id)
             log_activity('INFO', f'User {user_id} updated by admin {current_user_id}', 'admin')
             
             return create_response(True, message='User updated successfully')
@@ -153,12 +161,20 @@ def delete_user(current_user_id, user_id):
             if user_id == current_user_id:
                 return create_response(False, error='Cannot delete your own account', status_code=400)
             
+            # Days whose daily rollup counts this user's attendance (the rollup table has no foreign key)
+            cursor.execute("SELECT DISTINCT date FROM attendance WHERE user_id = %s", (user_id,))
+            attendance_days = [row[0] for row in cursor.fetchall()]
+            
             # Delete user (cascade will handle related records)
             cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
             
             if cursor.rowcount == 0:
                 return create_response(False, error='User not found', status_code=404)
-            
+
+            refresh_daily_rollup(attendance_days)
+
+            invalidate_principal(user_id)
+            publish_face_change('user_removed', user_id)
             log_activity('INFO', f'User {user_id} deleted by admin {current_user_id}', 'admin')
             
             return create_response(True, message='User deleted successfully')
@@ -309,15 +325,15 @@ def create_user(current_user_id):
                 employee_id = f"EMP{str(user_count + 1).zfill(3)}"
             
             # Create user - try new schema first, fallback to old
+            dialect = get_dialect()
             try:
-                cursor.execute("""
+                user_id = dialect.insert_returning_id(cursor, """
                     INSERT INTO users (
                         username, full_name, email, password_hash, role, 
                         allow_password_login, allow_face_only, require_password_for_external,
                         employee_id, department, position, created_at
                     )
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
                 """, (
                     data['username'],
                     data['full_name'], 
@@ -334,10 +350,9 @@ def create_user(current_user_id):
                 ))
             except Exception as e:
                 # Fallback to old schema
-                cursor.execute("""
+                user_id = dialect.insert_returning_id(cursor, """
                     INSERT INTO users (username, full_name, email, password_hash, role, created_at)
                     VALUES (%s, %s, %s, %s, %s, %s)
-                    RETURNING id
                 """, (
                     data['username'],
                     data['full_name'], 
@@ -347,8 +362,6 @@ def create_user(current_user_id):
                     datetime.now()
                 ))
             
-            user_id = cursor.fetchone()[0]
-            
             log_activity('INFO', f'User {user_id} ({access_type}) created by admin {current_user_id}', 'admin')
             
             return create_response(True, {
@@ -405,11 +418,11 @@ def get_admin_dashboard_stats(current_user_id):
             stats['total_users'] = cursor.fetchone()[0]
             
             # Total attendance records today
-            today = datetime.now().date()
-            cursor.execute("""
+            where, bounds = Period.current('day').sql('date')
+            cursor.execute(f"""
                 SELECT COUNT(*) FROM attendance 
-                WHERE DATE(check_in_time) = %s
-            """, (today,))
+                WHERE {where} AND check_in_time IS NOT NULL
+            """, bounds)
             stats['today_attendance'] = cursor.fetchone()[0]
             
             # Pending leave requests
@@ -423,8 +436,8 @@ def get_admin_dashboard_stats(current_user_id):
             week_ago = datetime.now() - timedelta(days=7)
             cursor.execute("""
                 SELECT COUNT(DISTINCT user_id) FROM attendance 
-                WHERE check_in_time >= %s
-            """, (week_ago,))
+                WHERE date >= %s AND check_in_time >= %s
+            """, (week_ago.date(), week_ago))
             stats['active_users_week'] = cursor.fetchone()[0]
             
             # Recent activities
@@ -456,28 +469,28 @@ def get_admin_dashboard_stats(current_user_id):
 def get_all_attendance(current_user_id):
     """Get all attendance records (admin only)"""
     try:
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 50))
-        offset = (page - 1) * limit
+        try:
+            page = KeysetPage.from_request(request.args, 'admin_attendance', 'a.date', 'a.id', default_limit=50)
+        except ValueError as e:
+            return create_response(False, error=str(e), status_code=400)
+        
+        source = """
+            FROM attendance a
+            JOIN users u ON a.user_id = u.id
+            WHERE 1=1
+        """
         
         with get_db_cursor() as cursor:
-            # Get total count
-            cursor.execute("SELECT COUNT(*) FROM attendance")
-            total_count = cursor.fetchone()[0]
-            
-            # Get attendance records with pagination
-            cursor.execute("""
+            # Newest first on (date, id) so deep pages seek instead of skipping rows
+            records = page.fetch(cursor, """
                 SELECT a.id, a.user_id, u.username, u.full_name,
-                       a.check_in_time, a.check_out_time, a.work_hours,
-                       a.created_at
-                FROM attendance a
-                JOIN users u ON a.user_id = u.id
-                ORDER BY a.check_in_time DESC
-                LIMIT %s OFFSET %s
-            """, (limit, offset))
+                       a.check_in_time, a.check_out_time, a.total_hours,
+                       a.created_at, a.date
+            """, source, [], key_index=(8, 0))
+            total_count = page.count(cursor, source, [], 'attendance', filtered=False)
             
             attendance_records = []
-            for record in cursor.fetchall():
+            for record in records:
                 attendance_records.append({
                     'id': record[0],
                     'user_id': record[1],
@@ -491,12 +504,7 @@ def get_all_attendance(current_user_id):
             
             return create_response(True, {
                 'attendance_records': attendance_records,
-                'pagination': {
-                    'page': page,
-                    'limit': limit,
-                    'total': total_count,
-                    'pages': (total_count + limit - 1) // limit
-                }
+                'pagination': page.pagination(total_count)
             })
             
     except Exception as e:
@@ -507,37 +515,27 @@ def get_all_attendance(current_user_id):
 def get_system_logs(current_user_id):
     """Get system activity logs (admin only)"""
     try:
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 100))
         level = request.args.get('level', 'all')
-        offset = (page - 1) * limit
+        try:
+            page = KeysetPage.from_request(request.args, 'system_logs', 'created_at', 'id', default_limit=100)
+        except ValueError as e:
+            return create_response(False, error=str(e), status_code=400)
+        
+        source = "FROM logs WHERE 1=1"
+        params = []
+        
+        if level != 'all':
+            source += " AND level = %s"
+            params.append(level.upper())
         
         with get_db_cursor() as cursor:
-            # Build query based on level filter
-            where_clause = ""
-            params = []
-            
-            if level != 'all':
-                where_clause = "WHERE level = %s"
-                params.append(level.upper())
-            
-            # Get total count
-            count_query = f"SELECT COUNT(*) FROM logs {where_clause}"
-            cursor.execute(count_query, params)
-            total_count = cursor.fetchone()[0]
-            
-            # Get logs with pagination
-            query = f"""
-                SELECT id, level, message, category, created_at
-                FROM logs {where_clause}
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s
-            """
-            params.extend([limit, offset])
-            cursor.execute(query, params)
+            # Newest first on (created_at, id); the first page reads the same index range as any later one
+            rows = page.fetch(cursor, "SELECT id, level, message, module, created_at",
+                              source, params, key_index=(4, 0))
+            total_count = page.count(cursor, source, params, 'logs', filtered=bool(params))
             
             logs = []
-            for log in cursor.fetchall():
+            for log in rows:
                 logs.append({
                     'id': log[0],
                     'level': log[1],
@@ -548,13 +546,68 @@ def get_system_logs(current_user_id):
             
             return create_response(True, {
                 'logs': logs,
-                'pagination': {
-                    'page': page,
-                    'limit': limit,
-                    'total': total_count,
-                    'pages': (total_count + limit - 1) // limit
-                }
+                'pagination': page.pagination(total_count)
             })
             
     except Exception as e:
         return create_response(False, error=f'Failed to get system logs: {str(e)}', status_code=500)
+
+@admin_bp.route('/system/face-encoder', methods=['GET'])
+@require_admin
+def get_face_encoder_stats(current_user_id):
+    """Get face encoding pipeline timings and settings (admin only)"""
+    try:
+        from ..face_encoding import get_face_encoder
+        return create_response(True, get_face_encoder().stats())
+    except Exception as e:
+        return create_response(False, error=f'Failed to get face encoder stats: {str(e)}', status_code=500)
+
+@admin_bp.route('/system/database-pool', methods=['GET'])
+@require_admin
+def get_database_pool_stats(current_user_id):
+    """Get database connection pool occupancy, checkout counts and wait times (admin only)"""
+    try:
+        from ..core.database import get_db_pool
+        return create_response(True, get_db_pool().stats())
+    except Exception as e:
+        return create_response(False, error=f'Failed to get database pool stats: {str(e)}', status_code=500)
+
+@admin_bp.route('/system/activity-log', methods=['GET'])
+@require_admin
+def get_activity_log_stats(current_user_id):
+    """Get activity log writer queue depth and write/drop counters (admin only)"""
+    try:
+        from ..core.activity_log import get_activity_log_writer
+        return create_response(True, get_activity_log_writer().stats())
+    except Exception as e:
+        return create_response(False, error=f'Failed to get activity log stats: {str(e)}', status_code=500)
+
+@admin_bp.route('/system/principal-cache', methods=['GET'])
+@require_admin
+def get_principal_cache_stats(current_user_id):
+    """Get auth principal cache hit/miss counters and size (admin only)"""
+    try:
+        from ..core.principal import get_principal_cache
+        return create_response(True, get_principal_cache().stats())
+    except Exception as e:
+        return create_response(False, error=f'Failed to get principal cache stats: {str(e)}', status_code=500)
+
+@admin_bp.route('/system/inference', methods=['GET'])
+@require_admin
+def get_inference_stats(current_user_id):
+    """Get inference worker pool queue depth and throughput (admin only)"""
+    try:
+        from ..inference import get_inference_pool
+        return create_response(True, get_inference_pool().stats())
+    except Exception as e:
+        return create_response(False, error=f'Failed to get inference stats: {str(e)}', status_code=500)
+
+@admin_bp.route('/system/report-jobs', methods=['GET'])
+@require_admin
+def get_report_job_stats(current_user_id):
+    """Get background report job queue depth and artifact cache hits (admin only)"""
+    try:
+        from ..report import get_report_job_queue
+        return create_response(True, get_report_job_queue().stats())
+    except Exception as e:
+        return create_response(False, error=f'Failed to get report job stats: {str(e)}', status_code=500)
@@ -3,6 +3,8 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, date
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_external_auth, validate_required_fields, log_activity
+from ..core.principal import get_principal
+from ..core.periods import Period
 from ..ai_integration.ai_integration import calculate_salary, get_chatbot_response
 
 ai_bp = Blueprint('ai_integration', __name__)
@@ -21,23 +23,22 @@ def calculate_user_salary(current_user_id):
         
         # Check if user is admin or requesting own salary
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if user_id != current_user_id and (not user_role or user_role[0] != 'admin'):
+            if user_id != current_user_id and (not principal or not principal.is_admin):
                 return create_response(False, error='Access denied', status_code=403)
             
             # Get attendance data for the month
-            cursor.execute("""
+            where, bounds = Period.month(year, month).sql('a.date')
+            cursor.execute(f"""
                 SELECT a.date, a.check_in_time, a.check_out_time, a.status,
                        u.username, u.full_name
                 FROM attendance a
                 JOIN users u ON a.user_id = u.id
                 WHERE a.user_id = %s 
-                AND EXTRACT(MONTH FROM a.date) = %s 
-                AND EXTRACT(YEAR FROM a.date) = %s
+                AND {where}
                 ORDER BY a.date
-            """, (user_id, month, year))
+            """, (user_id, *bounds))
             
             attendance_records = cursor.fetchall()
             
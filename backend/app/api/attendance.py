@@ -2,9 +2,13 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, date
 from ..core.database import get_db_cursor
-from ..core.utils import create_response, require_internal_network_only, external_network_limited_auth, decode_base64_image, log_activity
-from ..attendance.attendance import process_attendance_image, match_face
-import json
+from ..core.utils import create_response, require_internal_network_only, external_network_limited_auth, get_request_image, log_activity
+from ..core.principal import get_principal
+from ..core.pagination import KeysetPage
+from ..report import refresh_attendance_rollup
+from ..inference import run_inference, InferenceBusyError, InferenceWorkerError
+from ..face_gallery import get_face_gallery
+from ..config.settings import Config
 
 attendance_bp = Blueprint('attendance', __name__)
 
@@ -13,14 +17,11 @@ attendance_bp = Blueprint('attendance', __name__)
 def check_in():
     """Face recognition check-in endpoint (internal network only)"""
     try:
-        data = request.get_json()
+        # Multipart / raw image/jpeg upload, or base64 `image` in JSON
+        image = get_request_image('image', reduce=Config.FACE_DECODE_REDUCE)
         
-        if not data or 'image' not in data:
-            return create_response(False, error='No image data provided', status_code=400)
-        
-        # Decode and process image with liveness detection
-        image = decode_base64_image(data['image'])
-        result = process_attendance_image(image, enable_liveness_check=True)
+        # Process image with liveness detection
+        result = run_inference('process_attendance', [image], enable_liveness_check=True)
         
         if not result['success']:
             log_activity('WARNING', f"Attendance check-in failed: {result['error']}", 'attendance')
@@ -28,45 +29,21 @@ def check_in():
         
         encoding = result['encoding']
         
-        # Get all known face encodings from database
+        gallery = get_face_gallery()
+        if len(gallery) == 0:
+            return create_response(False, error='No registered faces found', status_code=404)
+        
+        # Internal network only - identify user by face recognition
+        matched_user, distance = gallery.match(encoding, threshold=0.5)
+        
+        if matched_user is None:
+            log_activity('WARNING', 'Face not recognized during check-in', 'attendance')
+            return create_response(False, error='Face not recognized', status_code=404)
+        
+        confidence = 1 - distance
+        user_id = matched_user['user_id']
+        
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                SELECT f.id, f.face_encoding, u.id, u.username, u.full_name 
-                FROM faces f 
-                JOIN users u ON f.user_id = u.id
-            """)
-            known_faces = cursor.fetchall()
-            
-            if not known_faces:
-                return create_response(False, error='No registered faces found', status_code=404)
-            
-            # Extract encodings and match
-            known_encodings = []
-            face_info = []
-            
-            for face in known_faces:
-                try:
-                    face_encoding = json.loads(face[1])
-                    known_encodings.append(face_encoding)
-                    face_info.append({
-                        'face_id': face[0],
-                        'user_id': face[2],
-                        'username': face[3],
-                        'full_name': face[4]
-                    })
-                except json.JSONDecodeError:
-                    continue
-            
-            # Internal network only - identify user by face recognition
-            match_idx, confidence = match_face(encoding, known_encodings)
-            
-            if match_idx is None:
-                log_activity('WARNING', 'Face not recognized during check-in', 'attendance')
-                return create_response(False, error='Face not recognized', status_code=404)
-            
-            matched_user = face_info[match_idx]
-            user_id = matched_user['user_id']
-            
             # Check if already checked in today
             today = date.today()
             cursor.execute("""
@@ -98,6 +75,7 @@ def check_in():
                 action = 'check_in'
                 message = f"Check-in successful for {matched_user['full_name']}"
             
+            refresh_attendance_rollup(user_id, today)
             log_activity('INFO', message, 'attendance')
             
             return create_response(True, {
@@ -115,6 +93,8 @@ def check_in():
             
     except ValueError as e:
         return create_response(False, error=str(e), status_code=400)
+    except (InferenceBusyError, InferenceWorkerError) as e:
+        return create_response(False, error=str(e), status_code=503)
     except Exception as e:
         log_activity('ERROR', f"Attendance check-in error: {str(e)}", 'attendance')
         return create_response(False, error=f'Check-in failed: {str(e)}', status_code=500)
@@ -128,23 +108,19 @@ def get_attendance_history(current_user_id=None):
         requested_user_id = request.args.get('user_id')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        
-        offset = (page - 1) * per_page
+        try:
+            page = KeysetPage.from_request(request.args, 'attendance_history', 'a.date', 'a.id',
+                                           limit_arg='per_page', default_limit=20)
+        except ValueError as e:
+            return create_response(False, error=str(e), status_code=400)
         
         # Check if user can view other users' records
         can_view_all = False
         if current_user_id:
-            with get_db_cursor() as cursor:
-                cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-                user_role = cursor.fetchone()
-                can_view_all = user_role and user_role[0] == 'admin'
+            principal = get_principal(current_user_id)
+            can_view_all = principal is not None and principal.is_admin
         
-        query = """
-            SELECT a.id, a.user_id, u.username, u.full_name, 
-                   a.check_in_time, a.check_out_time, a.date, a.status,
-                   a.created_at
+        source = """
             FROM attendance a
             JOIN users u ON a.user_id = u.id
             WHERE 1=1
@@ -154,35 +130,29 @@ def get_attendance_history(current_user_id=None):
         # Apply user restrictions for external network
         if current_user_id and not can_view_all:
             # Non-admin external users can only see their own records
-            query += " AND a.user_id = %s"
+            source += " AND a.user_id = %s"
             params.append(current_user_id)
         elif requested_user_id:
             # Admin or internal network can filter by specific user
-            query += " AND a.user_id = %s"
+            source += " AND a.user_id = %s"
             params.append(requested_user_id)
         
         if start_date:
-            query += " AND a.date >= %s"
+            source += " AND a.date >= %s"
             params.append(start_date)
         
         if end_date:
-            query += " AND a.date <= %s"
+            source += " AND a.date <= %s"
             params.append(end_date)
         
-        query += " ORDER BY a.date DESC, a.check_in_time DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
-        
         with get_db_cursor() as cursor:
-            cursor.execute(query, params)
-            records = cursor.fetchall()
-            
-            # Get total count
-            count_query = query.replace(
-                "SELECT a.id, a.user_id, u.username, u.full_name, a.check_in_time, a.check_out_time, a.date, a.status, a.created_at",
-                "SELECT COUNT(*)"
-            ).replace("ORDER BY a.date DESC, a.check_in_time DESC LIMIT %s OFFSET %s", "")
-            cursor.execute(count_query, params[:-2])
-            total_count = cursor.fetchone()[0]
+            # Newest day first, seeking on (date, id) instead of OFFSET
+            records = page.fetch(cursor, """
+                SELECT a.id, a.user_id, u.username, u.full_name, 
+                       a.check_in_time, a.check_out_time, a.date, a.status,
+                       a.created_at
+            """, source, params, key_index=(6, 0))
+            total_count = page.count(cursor, source, params, 'attendance', filtered=bool(params))
             
             attendance_data = []
             for record in records:
@@ -200,12 +170,7 @@ def get_attendance_history(current_user_id=None):
             
             return create_response(True, {
                 'records': attendance_data,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': total_count,
-                    'pages': (total_count + per_page - 1) // per_page
-                }
+                'pagination': page.pagination(total_count, limit_key='per_page')
             })
             
     except Exception as e:
@@ -3,6 +3,9 @@ from flask import Blueprint, request, jsonify, g
 from datetime import datetime, date, timedelta
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_internal_network_only, external_network_limited_auth, require_admin, log_activity
+from ..core.principal import get_principal
+from ..core.dialect import get_dialect, UPSERT_NEW
+from ..report import refresh_attendance_rollup
 
 attendance_extended_bp = Blueprint('attendance_extended', __name__)
 
@@ -77,9 +80,8 @@ def get_attendance_summary(current_user_id=None):
         
         if current_user_id:
             with get_db_cursor() as cursor:
-                cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-                user_role = cursor.fetchone()
-                can_view_all = user_role and user_role[0] == 'admin'
+                principal = get_principal(current_user_id)
+                can_view_all = principal is not None and principal.is_admin
                 
                 if can_view_all:
                     target_user_id = request.args.get('user_id', current_user_id)
@@ -195,6 +197,7 @@ def manual_attendance_entry(current_user_id):
                 
                 action = 'created'
             
+            refresh_attendance_rollup(user_id, entry_date)
             log_activity('INFO', f'Manual attendance {action} for user {user_id} by admin {current_user_id}', 'attendance')
             
             return create_response(True, {
@@ -226,6 +229,12 @@ def bulk_attendance_update(current_user_id):
         updated_count = 0
         errors = []
         
+        dialect = get_dialect()
+        upsert_sql = dialect.upsert(
+            'attendance', ('user_id', 'date', 'status', 'check_in_time'), ('user_id', 'date'),
+            updates={'status': UPSERT_NEW}
+        )
+        
         with get_db_cursor() as cursor:
             for i, record in enumerate(records):
                 try:
@@ -234,13 +243,9 @@ def bulk_attendance_update(current_user_id):
                     status = record.get('status', 'present')
                     
                     # Update or insert attendance record
-                    cursor.execute("""
-                        INSERT INTO attendance (user_id, date, status, check_in_time) 
-                        VALUES (%s, %s, %s, %s)
-                        ON CONFLICT (user_id, date) 
-                        DO UPDATE SET status = EXCLUDED.status, updated_at = %s
-                    """, (user_id, entry_date, status, datetime.now(), datetime.now()))
+                    cursor.execute(upsert_sql, (user_id, entry_date, status, datetime.now()))
                     
+                    refresh_attendance_rollup(user_id, entry_date)
                     updated_count += 1
                     
                 except Exception as e:
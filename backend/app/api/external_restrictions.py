@@ -1,7 +1,7 @@
 # External network restrictions API
 from flask import Blueprint, request, jsonify, g
-from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_external_auth, log_activity
+from ..core.principal import get_principal
 
 external_restrictions_bp = Blueprint('external_restrictions', __name__)
 
@@ -99,48 +99,46 @@ def check_feature_access(current_user_id, feature):
             from ..middleware.network_detection import detect_network
             detect_network()
         
-        with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
-            
-            if not user_role:
-                return create_response(False, error='User not found', status_code=404)
-            
-            role = user_role[0]
-            is_admin = role == 'admin'
-            
-            # Define feature access rules based on network type
-            if g.is_internal_network:
-                # Internal network - full access
-                feature_rules = {
-                    'attendance': True,  # Face recognition without auth
-                    'leave_requests': True,  # All users
-                    'reports': True,  # All users
-                    'face_enrollment': is_admin,  # Admin only
-                    'admin_panel': is_admin,  # Admin only
-                    'user_management': is_admin  # Admin only
-                }
-            else:
-                # External network - limited access, no attendance
-                feature_rules = {
-                    'attendance': False,  # BLOCKED for external network
-                    'leave_requests': True,  # Authenticated users only
-                    'attendance_history': True,  # Authenticated users (own records)
-                    'reports': True,  # Authenticated users (own data)
-                    'face_enrollment': is_admin,  # Admin only
-                    'admin_panel': is_admin,  # Admin only
-                    'user_management': is_admin  # Admin only
-                }
-            
-            has_access = feature_rules.get(feature, False)
-            
-            return create_response(True, {
-                'feature': feature,
-                'has_access': has_access,
-                'user_role': role,
-                'network_type': 'internal' if g.is_internal_network else 'external',
-                'requires_auth': not g.is_internal_network or feature in ['face_enrollment', 'admin_panel', 'user_management']
-            })
-            
+        principal = get_principal(current_user_id)
+        
+        if not principal:
+            return create_response(False, error='User not found', status_code=404)
+        
+        role = principal.role
+        is_admin = role == 'admin'
+        
+        # Define feature access rules based on network type
+        if g.is_internal_network:
+            # Internal network - full access
+            feature_rules = {
+                'attendance': True,  # Face recognition without auth
+                'leave_requests': True,  # All users
+                'reports': True,  # All users
+                'face_enrollment': is_admin,  # Admin only
+                'admin_panel': is_admin,  # Admin only
+                'user_management': is_admin  # Admin only
+            }
+        else:
+            # External network - limited access, no attendance
+            feature_rules = {
+                'attendance': False,  # BLOCKED for external network
+                'leave_requests': True,  # Authenticated users only
+                'attendance_history': True,  # Authenticated users (own records)
+                'reports': True,  # Authenticated users (own data)
+                'face_enrollment': is_admin,  # Admin only
+                'admin_panel': is_admin,  # Admin only
+                'user_management': is_admin  # Admin only
+            }
+        
+        has_access = feature_rules.get(feature, False)
+        
+        return create_response(True, {
+            'feature': feature,
+            'has_access': has_access,
+            'user_role': role,
+            'network_type': 'internal' if g.is_internal_network else 'external',
+            'requires_auth': not g.is_internal_network or feature in ['face_enrollment', 'admin_panel', 'user_management']
+        })
+        
     except Exception as e:
         return create_response(False, error=f'Failed to check feature access: {str(e)}', status_code=500)
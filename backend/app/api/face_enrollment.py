@@ -3,8 +3,11 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 import bcrypt
 from ..core.database import get_db_cursor
-from ..core.utils import create_response, require_auth, require_admin, validate_required_fields, decode_base64_image, log_activity
-import json
+from ..core.utils import create_response, require_auth, require_admin, validate_required_fields, request_fields, request_image_payloads, decode_image, log_activity
+from ..core.dialect import get_dialect
+from ..face_gallery import publish_face_change, encode_embedding
+from ..inference import run_inference
+from ..config.settings import Config
 
 face_enrollment_bp = Blueprint('face_enrollment', __name__)
 
@@ -51,8 +54,9 @@ def create_user_account(current_user_id):
             require_password_for_external = role != 'admin'  # Only non-admin users require password for external access
             
             # Create new user with full access control
+            dialect = get_dialect()
             try:
-                cursor.execute("""
+                user_id = dialect.insert_returning_id(cursor, """
                     INSERT INTO users (
                         username, full_name, email, password_hash, role, is_active,
                         allow_password_login, allow_face_only, require_password_for_external,
@@ -66,15 +70,11 @@ def create_user_account(current_user_id):
                 ))
             except Exception as e:
                 # Fallback to old schema if new columns don't exist
-                cursor.execute("""
+                user_id = dialect.insert_returning_id(cursor, """
                     INSERT INTO users (username, full_name, email, password_hash, role, is_active) 
                     VALUES (%s, %s, %s, %s, %s, %s)
                 """, (username, full_name, email, password_hash, role, True))
             
-            # Get the created user ID
-            cursor.execute("SELECT LAST_INSERT_ID()")
-            user_id = cursor.fetchone()[0]
-            
             log_activity('INFO', f'User account created: {username}', 'face_enrollment')
             
             return create_response(True, {
@@ -98,19 +98,32 @@ def create_user_account(current_user_id):
 # NEW WORKFLOW: Step 2 - Capture Face from Camera
 # =============================================================================
 
+def _encode_camera_face(payload):
+    """Decode a camera capture (bytes or base64) and return the encoding of its single face"""
+    face_image = decode_image(payload)
+    return run_inference('encode', [face_image], single_face=True)
+
 @face_enrollment_bp.route('/capture-face', methods=['POST'])
 @require_admin
 def capture_face_from_camera(current_user_id):
-    """Step 2: Capture face from camera and link to user (admin only)"""
+    """Step 2: Capture face samples from camera and link to user (admin only)
+    
+    Accepts `face_image` or a `face_images` list; users may hold up to
+    FACE_MAX_SAMPLES_PER_USER samples (e.g. captured under different lighting).
+    """
     try:
-        data = request.get_json()
-        validate_required_fields(data, ['user_id', 'face_image'])
+        data = request_fields()
+        validate_required_fields(data, ['user_id'])
         
         user_id = data['user_id']
-        face_image_base64 = data['face_image']  # Base64 image from camera
+        # Multipart files or base64 JSON values, under `face_images` or `face_image`
+        face_images = request_image_payloads('face_images') or request_image_payloads('face_image')
+        
+        if not isinstance(face_images, list) or not face_images:
+            return create_response(False, error='Missing required fields: face_image', status_code=400)
         
         with get_db_cursor() as cursor:
-            # Verify user exists and doesn't have face yet
+            # Verify user exists
             cursor.execute(
                 "SELECT username, full_name FROM users WHERE id = %s AND is_active = TRUE",
                 (user_id,)
@@ -120,64 +133,45 @@ def capture_face_from_camera(current_user_id):
             if not user:
                 return create_response(False, error='User not found or inactive', status_code=404)
             
-            # Check if user already has face registered
-            cursor.execute("SELECT id FROM faces WHERE user_id = %s", (user_id,))
-            existing_face = cursor.fetchone()
+            # Check how many samples the user already has
+            cursor.execute("SELECT COUNT(*) FROM faces WHERE user_id = %s", (user_id,))
+            existing_samples = cursor.fetchone()[0]
+            max_samples = Config.FACE_MAX_SAMPLES_PER_USER
             
-            if existing_face:
-                return create_response(False, error='User already has face registered', status_code=409)
+            if existing_samples + len(face_images) > max_samples:
+                return create_response(
+                    False,
+                    error=f'User already has {existing_samples} face samples (maximum {max_samples})',
+                    status_code=409
+                )
             
-            # Process face image from camera
+            # Process every sample before storing any of them
             try:
-                # Decode base64 image
-                face_image = decode_base64_image(face_image_base64)
-                
-                # Generate face encoding
-                import face_recognition
-                import cv2
-                
-                # Convert BGR to RGB for face_recognition
-                rgb_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-                
-                # Find face locations
-                face_locations = face_recognition.face_locations(rgb_image)
-                
-                if not face_locations:
-                    return create_response(False, error='No face detected in image', status_code=400)
-                
-                if len(face_locations) > 1:
-                    return create_response(False, error='Multiple faces detected. Please ensure only one face is visible.', status_code=400)
-                
-                # Generate face encoding
-                face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
-                
-                if not face_encodings:
-                    return create_response(False, error='Could not generate face encoding', status_code=400)
-                
-                face_encoding = face_encodings[0]
-                
-                # Convert encoding to JSON string for storage
-                encoding_json = json.dumps(face_encoding.tolist())
-                
-                # Store face encoding in database
-                cursor.execute("""
-                    INSERT INTO faces (user_id, face_encoding, is_active) 
-                    VALUES (%s, %s, %s)
-                """, (user_id, encoding_json, True))
-                
-                log_activity('INFO', f'Face captured and linked to user: {user[0]}', 'face_enrollment')
-                
-                return create_response(True, {
-                    'user_id': user_id,
-                    'username': user[0],
-                    'full_name': user[1],
-                    'message': 'Face captured and registered successfully!',
-                    'status': 'completed'
-                })
-                
+                face_encodings = [_encode_camera_face(image) for image in face_images]
             except Exception as face_error:
                 return create_response(False, error=f'Face processing failed: {str(face_error)}', status_code=400)
             
+            # Store face encodings in database (binary float32 format)
+            now = datetime.now()
+            get_dialect().bulk_insert(
+                cursor, 'faces', ('user_id', 'face_embedding', 'is_active', 'updated_at'),
+                [(user_id, encode_embedding(encoding), True, now) for encoding in face_encodings]
+            )
+            publish_face_change('face_added', user_id)
+            
+            sample_count = existing_samples + len(face_encodings)
+            log_activity('INFO', f'Face captured and linked to user: {user[0]} ({sample_count} samples)', 'face_enrollment')
+            
+            return create_response(True, {
+                'user_id': user_id,
+                'username': user[0],
+                'full_name': user[1],
+                'sample_count': sample_count,
+                'max_samples': max_samples,
+                'message': 'Face captured and registered successfully!',
+                'status': 'completed'
+            })
+            
     except ValueError as e:
         return create_response(False, error=str(e), status_code=400)
     except Exception as e:
@@ -230,10 +224,11 @@ def get_user_enrollment_status(current_user_id, user_id):
         with get_db_cursor() as cursor:
             cursor.execute("""
                 SELECT u.id, u.username, u.full_name, u.email, u.role, u.is_active,
-                       f.id as face_id, f.created_at as face_registered_at
+                       COUNT(f.id) as face_count, MIN(f.created_at) as face_registered_at
                 FROM users u
                 LEFT JOIN faces f ON u.id = f.user_id
                 WHERE u.id = %s
+                GROUP BY u.id, u.username, u.full_name, u.email, u.role, u.is_active
             """, (user_id,))
             
             result = cursor.fetchone()
@@ -241,7 +236,7 @@ def get_user_enrollment_status(current_user_id, user_id):
             if not result:
                 return create_response(False, error='User not found', status_code=404)
             
-            has_face = result[6] is not None
+            has_face = result[6] > 0
             
             return create_response(True, {
                 'user_id': result[0],
@@ -251,6 +246,7 @@ def get_user_enrollment_status(current_user_id, user_id):
                 'role': result[4],
                 'is_active': result[5],
                 'has_face': has_face,
+                'face_count': result[6],
                 'face_registered_at': result[7].isoformat() if result[7] else None,
                 'enrollment_status': 'completed' if has_face else 'pending_face_capture'
             })
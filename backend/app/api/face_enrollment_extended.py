@@ -2,8 +2,10 @@
 from flask import Blueprint, request, jsonify, g
 from datetime import datetime
 from ..core.database import get_db_cursor
-from ..core.utils import create_response, require_admin, validate_required_fields, decode_base64_image, log_activity
+from ..core.utils import create_response, require_admin, validate_required_fields, get_request_image, log_activity
+from ..core.dialect import get_dialect
 from ..face_user_register.face_enroll import capture_and_store_face_temp
+from ..face_gallery import publish_face_change
 import json
 
 face_enrollment_extended_bp = Blueprint('face_enrollment_extended', __name__)
@@ -11,13 +13,10 @@ face_enrollment_extended_bp = Blueprint('face_enrollment_extended', __name__)
 @face_enrollment_extended_bp.route('/enroll-base64', methods=['POST'])
 @require_admin
 def enroll_face_base64(current_user_id):
-    """Face enrollment with base64 image (admin only)"""
+    """Face enrollment with an uploaded or base64 image (admin only)"""
     try:
-        data = request.get_json()
-        validate_required_fields(data, ['image'])
-        
-        # Decode base64 image
-        image = decode_base64_image(data['image'])
+        # Multipart / raw image upload, or base64 `image` in JSON
+        image = get_request_image('image')
         
         # Process face enrollment (admin only)
         pending_id = capture_and_store_face_temp(image)
@@ -65,7 +64,7 @@ def bulk_register_users(current_user_id):
                     
                     # Check if pending face exists
                     cursor.execute(
-                        "SELECT face_encoding FROM pending_faces WHERE id = %s",
+                        "SELECT face_embedding, face_encoding FROM pending_faces WHERE id = %s",
                         (pending_id,)
                     )
                     pending_face = cursor.fetchone()
@@ -86,18 +85,17 @@ def bulk_register_users(current_user_id):
                         continue
                     
                     # Create new user
-                    cursor.execute("""
+                    user_id = get_dialect().insert_returning_id(cursor, """
                         INSERT INTO users (username, full_name, email, role) 
-                        VALUES (%s, %s, %s, %s) RETURNING id
+                        VALUES (%s, %s, %s, %s)
                     """, (username, full_name, email, role))
                     
-                    user_id = cursor.fetchone()[0]
-                    
                     # Move face encoding from pending to faces table
                     cursor.execute("""
-                        INSERT INTO faces (user_id, face_encoding) 
-                        VALUES (%s, %s)
-                    """, (user_id, pending_face[0]))
+                        INSERT INTO faces (user_id, face_embedding, face_encoding, updated_at) 
+                        VALUES (%s, %s, %s, %s)
+                    """, (user_id, pending_face[0], pending_face[1], datetime.now()))
+                    publish_face_change('face_added', user_id)
                     
                     # Delete pending face
                     cursor.execute("DELETE FROM pending_faces WHERE id = %s", (pending_id,))
@@ -212,6 +210,7 @@ def delete_user_face(current_user_id, user_id, face_id):
             
             # Delete the face
             cursor.execute("DELETE FROM faces WHERE id = %s", (face_id,))
+            publish_face_change('face_removed', user_id, face_id)
             
             log_activity('INFO', f'Face {face_id} deleted for user {user_id} by admin {current_user_id}', 'face_enrollment')
             
@@ -3,6 +3,8 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, date
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_external_auth, validate_required_fields, log_activity
+from ..core.principal import get_principal
+from ..core.dialect import get_dialect
 
 leave_request_bp = Blueprint('leave_request', __name__)
 
@@ -22,13 +24,11 @@ def submit_leave_request(current_user_id):
             return create_response(False, error='Start date cannot be after end date', status_code=400)
         
         with get_db_cursor() as cursor:
-            cursor.execute("""
+            request_id = get_dialect().insert_returning_id(cursor, """
                 INSERT INTO leave_requests (user_id, start_date, end_date, reason, status) 
-                VALUES (%s, %s, %s, %s, 'pending') RETURNING id
+                VALUES (%s, %s, %s, %s, 'pending')
             """, (current_user_id, start_date, end_date, reason))
             
-            request_id = cursor.fetchone()[0]
-            
             log_activity('INFO', f'Leave request submitted by user {current_user_id}', 'leave_request')
             
             return create_response(True, {
@@ -87,10 +87,9 @@ def approve_leave_request(current_user_id, request_id):
     try:
         # Check if user is admin
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if not user_role or user_role[0] != 'admin':
+            if not principal or not principal.is_admin:
                 return create_response(False, error='Admin access required', status_code=403)
             
             # Update leave request status
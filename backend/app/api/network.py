@@ -32,7 +32,8 @@ def get_network_config():
     try:
         config = {
             'internal_ranges': network_detector.internal_ranges,
-            'default_ranges': network_detector.default_internal_ranges
+            'default_ranges': network_detector.default_internal_ranges,
+            'classifier': network_detector.classifier.stats()
         }
         
         return create_response(True, config)
@@ -3,6 +3,8 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_external_auth, validate_required_fields, log_activity
+from ..core.principal import get_principal
+from ..core.pagination import KeysetPage
 import json
 
 notifications_bp = Blueprint('notifications', __name__)
@@ -12,36 +14,24 @@ notifications_bp = Blueprint('notifications', __name__)
 def get_notifications(current_user_id):
     """Lấy danh sách thông báo của user"""
     try:
-        page = request.args.get('page', type=int, default=1)
-        limit = request.args.get('limit', type=int, default=20)
         unread_only = request.args.get('unread_only', type=bool, default=False)
-        
-        offset = (page - 1) * limit
+        try:
+            page = KeysetPage.from_request(request.args, 'notifications', 'created_at', 'id')
+        except ValueError as e:
+            return create_response(False, error=str(e), status_code=400)
         
         with get_db_cursor() as cursor:
             # Build query
-            base_query = """
-                SELECT id, title, message, type, is_read, created_at, data
-                FROM notifications 
-                WHERE user_id = %s
-            """
-            count_query = "SELECT COUNT(*) FROM notifications WHERE user_id = %s"
+            source = "FROM notifications WHERE user_id = %s"
             params = [current_user_id]
             
             if unread_only:
-                base_query += " AND is_read = FALSE"
-                count_query += " AND is_read = FALSE"
-            
-            # Get total count
-            cursor.execute(count_query, params)
-            total_notifications = cursor.fetchone()[0]
-            
-            # Get notifications with pagination
-            base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
+                source += " AND is_read = FALSE"
             
-            cursor.execute(base_query, params)
-            notifications = cursor.fetchall()
+            # Trang mới nhất trước, tìm tiếp theo (created_at, id) thay vì OFFSET
+            notifications = page.fetch(cursor, "SELECT id, title, message, type, is_read, created_at, data",
+                                       source, params, key_index=(5, 0))
+            total_notifications = page.count(cursor, source, params, 'notifications')
             
             notifications_data = []
             for notif in notifications:
@@ -57,12 +47,7 @@ def get_notifications(current_user_id):
             
             return create_response(True, {
                 'notifications': notifications_data,
-                'pagination': {
-                    'page': page,
-                    'limit': limit,
-                    'total': total_notifications,
-                    'pages': (total_notifications + limit - 1) // limit
-                }
+                'pagination': page.pagination(total_notifications)
             })
             
     except Exception as e:
@@ -160,10 +145,9 @@ def send_notification(current_user_id):
     """Gửi thông báo (admin only)"""
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if not user_role or user_role[0] != 'admin':
+            if not principal or not principal.is_admin:
                 return create_response(False, error='Admin access required', status_code=403)
             
             data = request.get_json()
@@ -223,10 +207,9 @@ def cleanup_old_notifications(current_user_id):
     """Dọn dẹp thông báo cũ (admin only)"""
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if not user_role or user_role[0] != 'admin':
+            if not principal or not principal.is_admin:
                 return create_response(False, error='Admin access required', status_code=403)
             
             # Xóa thông báo cũ hơn 90 ngày và đã đọc
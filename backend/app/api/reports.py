@@ -1,13 +1,16 @@
 # Reports API routes
 from flask import Blueprint, request, jsonify, send_file
 from datetime import datetime, date, timedelta
-from ..core.database import get_db_cursor
+from ..core.database import get_db_cursor, stream_query
 from ..core.utils import create_response, require_external_auth, validate_required_fields, log_activity
-import pandas as pd
-import io
+from ..core.principal import get_principal
+from ..core.periods import Period
+from ..report import attendance_watermark, get_report_job_queue, ReportJobBusyError
+from ..report.export import (csv_chunks, xlsx_chunks, export_filename, streaming_download,
+                             CSV_MIMETYPE, XLSX_MIMETYPE)
+from ..report.jobs import counted, JOB_DONE
 import json
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+import os
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -22,54 +25,36 @@ def get_attendance_report(current_user_id):
         user_id = request.args.get('user_id')
         format_type = request.args.get('format', 'json')  # json, excel, csv
         
+        if format_type not in ('json', 'excel', 'csv'):
+            return create_response(False, error='Invalid format type', status_code=400)
+        
         # Kiểm tra quyền admin nếu xem báo cáo của user khác
+        scope_user_id, error = report_scope(current_user_id, user_id)
+        if error:
+            return error
+        
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
-            
-            if user_id and user_id != str(current_user_id):
-                if not user_role or user_role[0] != 'admin':
-                    return create_response(False, error='Admin access required', status_code=403)
-            
-            # Xây dựng query
-            base_query = """
-                SELECT a.id, a.date, a.check_in_time, a.check_out_time, 
-                       a.total_hours, a.status, u.username, u.full_name
-                FROM attendance a
-                JOIN users u ON a.user_id = u.id
-                WHERE 1=1
-            """
-            params = []
+            source, params = attendance_report_source(scope_user_id, start_date, end_date)
+            base_query = f"{ATTENDANCE_REPORT_SELECT} {source} {ATTENDANCE_REPORT_ORDER}"
             
-            if user_id:
-                base_query += " AND a.user_id = %s"
-                params.append(user_id)
-            elif user_role and user_role[0] != 'admin':
-                # Non-admin users can only see their own data
-                base_query += " AND a.user_id = %s"
-                params.append(current_user_id)
+            # Excel/CSV: đọc theo luồng từ server-side cursor, không fetchall()
+            if format_type == 'csv':
+                return generate_csv_report(stream_attendance_records(base_query, params), 'attendance_report')
             
-            if start_date:
-                base_query += " AND a.date >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                base_query += " AND a.date <= %s"
-                params.append(end_date)
-            
-            base_query += " ORDER BY a.date DESC, u.full_name"
+            if format_type == 'excel':
+                return generate_excel_report(stream_attendance_records(base_query, params), 'attendance_report')
             
             cursor.execute(base_query, params)
-            records = cursor.fetchall()
+            records = [attendance_record(record) for record in cursor.fetchall()]
             
             # Tính toán thống kê
             total_days = len(records)
-            total_hours = sum(float(record[4] or 0) for record in records)
-            present_days = len([r for r in records if r[5] == 'present'])
-            late_days = len([r for r in records if r[5] == 'late'])
-            absent_days = len([r for r in records if r[5] == 'absent'])
+            total_hours = sum(record['total_hours'] for record in records)
+            present_days = len([r for r in records if r['status'] == 'present'])
+            late_days = len([r for r in records if r['status'] == 'late'])
+            absent_days = len([r for r in records if r['status'] == 'absent'])
             
-            report_data = {
+            return create_response(True, {
                 'summary': {
                     'total_days': total_days,
                     'total_hours': round(total_hours, 2),
@@ -78,37 +63,13 @@ def get_attendance_report(current_user_id):
                     'absent_days': absent_days,
                     'attendance_rate': round((present_days + late_days) / total_days * 100, 2) if total_days > 0 else 0
                 },
-                'records': [
-                    {
-                        'id': record[0],
-                        'date': record[1].strftime('%Y-%m-%d'),
-                        'check_in_time': record[2].strftime('%H:%M:%S') if record[2] else None,
-                        'check_out_time': record[3].strftime('%H:%M:%S') if record[3] else None,
-                        'total_hours': float(record[4]) if record[4] else 0,
-                        'status': record[5],
-                        'username': record[6],
-                        'full_name': record[7]
-                    }
-                    for record in records
-                ],
+                'records': records,
                 'generated_at': datetime.now().isoformat(),
                 'period': {
                     'start_date': start_date,
                     'end_date': end_date
                 }
-            }
-            
-            if format_type == 'json':
-                return create_response(True, report_data)
-            
-            elif format_type == 'excel':
-                return generate_excel_report(report_data, 'attendance_report')
-            
-            elif format_type == 'csv':
-                return generate_csv_report(report_data['records'], 'attendance_report')
-            
-            else:
-                return create_response(False, error='Invalid format type', status_code=400)
+            })
                 
     except Exception as e:
         log_activity('ERROR', f'Attendance report error: {str(e)}', 'reports')
@@ -127,96 +88,17 @@ def get_salary_report(current_user_id):
         if not month or not year:
             return create_response(False, error='Month and year are required', status_code=400)
         
+        scope_user_id, error = report_scope(current_user_id, user_id)
+        if error:
+            return error
+        
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
-            
-            if user_id and user_id != str(current_user_id):
-                if not user_role or user_role[0] != 'admin':
-                    return create_response(False, error='Admin access required', status_code=403)
-            
-            # Lấy dữ liệu chấm công cho tháng
-            query = """
-                SELECT u.id, u.username, u.full_name, u.email,
-                       COUNT(a.id) as total_days,
-                       SUM(CASE WHEN a.total_hours IS NOT NULL THEN a.total_hours ELSE 0 END) as total_hours,
-                       COUNT(CASE WHEN a.status = 'present' THEN 1 END) as present_days,
-                       COUNT(CASE WHEN a.status = 'late' THEN 1 END) as late_days,
-                       COUNT(CASE WHEN a.status = 'absent' THEN 1 END) as absent_days
-                FROM users u
-                LEFT JOIN attendance a ON u.id = a.user_id 
-                    AND EXTRACT(MONTH FROM a.date) = %s 
-                    AND EXTRACT(YEAR FROM a.date) = %s
-                WHERE u.role = 'user'
-            """
-            params = [month, year]
-            
-            if user_id:
-                query += " AND u.id = %s"
-                params.append(user_id)
-            elif user_role and user_role[0] != 'admin':
-                query += " AND u.id = %s"
-                params.append(current_user_id)
-            
-            query += " GROUP BY u.id, u.username, u.full_name, u.email ORDER BY u.full_name"
-            
-            cursor.execute(query, params)
-            users_data = cursor.fetchall()
-            
-            # Tính lương (công thức cơ bản)
-            base_salary = 5000000  # 5 triệu VND cơ bản
-            hourly_rate = 50000   # 50k/giờ
-            
-            salary_data = []
-            for user in users_data:
-                total_hours = float(user[5] or 0)
-                present_days = user[6]
-                late_days = user[7]
-                
-                # Tính lương cơ bản theo ngày công
-                working_days = present_days + late_days
-                daily_salary = base_salary / 22  # 22 ngày làm việc/tháng
-                base_amount = working_days * daily_salary
-                
-                # Thưởng giờ làm thêm
-                overtime_hours = max(0, total_hours - (working_days * 8))
-                overtime_amount = overtime_hours * hourly_rate
-                
-                # Phạt đi trễ
-                late_penalty = late_days * 50000  # 50k/lần trễ
-                
-                total_salary = base_amount + overtime_amount - late_penalty
-                
-                salary_data.append({
-                    'user_id': user[0],
-                    'username': user[1],
-                    'full_name': user[2],
-                    'email': user[3],
-                    'working_days': working_days,
-                    'total_hours': total_hours,
-                    'present_days': present_days,
-                    'late_days': late_days,
-                    'base_amount': round(base_amount, 0),
-                    'overtime_hours': round(overtime_hours, 2),
-                    'overtime_amount': round(overtime_amount, 0),
-                    'late_penalty': round(late_penalty, 0),
-                    'total_salary': round(total_salary, 0)
-                })
-            
-            report_data = {
-                'period': f"{month:02d}/{year}",
-                'generated_at': datetime.now().isoformat(),
-                'salary_data': salary_data,
-                'summary': {
-                    'total_employees': len(salary_data),
-                    'total_payroll': sum(s['total_salary'] for s in salary_data)
-                }
-            }
+            report_data = salary_report_data(cursor, month, year, scope_user_id)
             
             if format_type == 'json':
                 return create_response(True, report_data)
             elif format_type == 'excel':
-                return generate_excel_salary_report(report_data)
+                return generate_excel_salary_report(report_data, month, year)
             else:
                 return create_response(False, error='Invalid format type', status_code=400)
                 
@@ -230,12 +112,11 @@ def get_dashboard_stats(current_user_id):
     """Lấy thống kê cho dashboard"""
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
-            is_admin = user_role and user_role[0] == 'admin'
+            principal = get_principal(current_user_id)
+            is_admin = principal is not None and principal.is_admin
             
             today = date.today()
-            this_month_start = today.replace(day=1)
+            this_month_start = Period.containing('month', today).start
             
             if is_admin:
                 # Admin dashboard - toàn bộ hệ thống
@@ -247,14 +128,15 @@ def get_dashboard_stats(current_user_id):
                 
                 # Chấm công hôm nay
                 cursor.execute("""
-                    SELECT COUNT(DISTINCT user_id) FROM attendance 
+                    SELECT unique_users FROM attendance_daily_stats 
                     WHERE date = %s
                 """, (today,))
-                stats['today_checkins'] = cursor.fetchone()[0]
+                row = cursor.fetchone()
+                stats['today_checkins'] = row[0] if row else 0
                 
                 # Tổng giờ làm tháng này
                 cursor.execute("""
-                    SELECT COALESCE(SUM(total_hours), 0) FROM attendance 
+                    SELECT COALESCE(SUM(total_hours), 0) FROM attendance_daily_stats 
                     WHERE date >= %s
                 """, (this_month_start,))
                 stats['month_total_hours'] = float(cursor.fetchone()[0] or 0)
@@ -268,11 +150,10 @@ def get_dashboard_stats(current_user_id):
                 
                 # Top 5 nhân viên chăm chỉ tháng này
                 cursor.execute("""
-                    SELECT u.full_name, COALESCE(SUM(a.total_hours), 0) as total_hours
+                    SELECT u.full_name, COALESCE(m.total_hours, 0) as total_hours
                     FROM users u
-                    LEFT JOIN attendance a ON u.id = a.user_id AND a.date >= %s
+                    LEFT JOIN attendance_user_monthly_stats m ON u.id = m.user_id AND m.month_start = %s
                     WHERE u.role = 'user'
-                    GROUP BY u.id, u.full_name
                     ORDER BY total_hours DESC
                     LIMIT 5
                 """, (this_month_start,))
@@ -294,26 +175,21 @@ def get_dashboard_stats(current_user_id):
                 stats['today_hours'] = float(result[0]) if result and result[0] else 0
                 
                 # Giờ làm tuần này
-                week_start = today - timedelta(days=today.weekday())
+                week_start = Period.containing('week', today).start
                 cursor.execute("""
                     SELECT COALESCE(SUM(total_hours), 0) FROM attendance 
                     WHERE user_id = %s AND date >= %s
                 """, (current_user_id, week_start))
                 stats['week_hours'] = float(cursor.fetchone()[0] or 0)
                 
-                # Giờ làm tháng này
-                cursor.execute("""
-                    SELECT COALESCE(SUM(total_hours), 0) FROM attendance 
-                    WHERE user_id = %s AND date >= %s
-                """, (current_user_id, this_month_start))
-                stats['month_hours'] = float(cursor.fetchone()[0] or 0)
-                
-                # Số ngày đi làm tháng này
+                # Giờ làm và số ngày đi làm tháng này
                 cursor.execute("""
-                    SELECT COUNT(*) FROM attendance 
-                    WHERE user_id = %s AND date >= %s AND status IN ('present', 'late')
+                    SELECT total_hours, present_days + late_days FROM attendance_user_monthly_stats 
+                    WHERE user_id = %s AND month_start = %s
                 """, (current_user_id, this_month_start))
-                stats['month_working_days'] = cursor.fetchone()[0]
+                row = cursor.fetchone()
+                stats['month_hours'] = float(row[0] or 0) if row else 0
+                stats['month_working_days'] = int(row[1] or 0) if row else 0
                 
                 # Đơn xin nghỉ của user
                 cursor.execute("""
@@ -330,7 +206,7 @@ def get_dashboard_stats(current_user_id):
             
             return create_response(True, {
                 'stats': stats,
-                'user_role': user_role[0] if user_role else 'user',
+                'user_role': principal.role if principal else 'user',
                 'generated_at': datetime.now().isoformat()
             })
             
@@ -338,85 +214,341 @@ def get_dashboard_stats(current_user_id):
         log_activity('ERROR', f'Dashboard stats error: {str(e)}', 'reports')
         return create_response(False, error=f'Failed to get dashboard stats: {str(e)}', status_code=500)
 
-def generate_excel_report(data, filename):
-    """Tạo file Excel từ dữ liệu báo cáo"""
-    output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Attendance Report"
+@reports_bp.route('/jobs', methods=['POST'])
+@require_external_auth
+def submit_report_job(current_user_id):
+    """Tạo file báo cáo chạy nền; trả về job id để theo dõi tiến độ và tải file"""
+    try:
+        data = request.get_json(silent=True) or {}
+        report_type = data.get('report_type')
+        format_type = data.get('format', 'excel')
+        
+        scope_user_id, error = report_scope(current_user_id, str(data['user_id']) if data.get('user_id') else None)
+        if error:
+            return error
+        
+        with get_db_cursor() as cursor:
+            if report_type == 'attendance':
+                if format_type not in ('excel', 'csv'):
+                    return create_response(False, error='Invalid format type', status_code=400)
+                params = {
+                    'user_id': scope_user_id,
+                    'start_date': data.get('start_date'),
+                    'end_date': data.get('end_date')
+                }
+                watermark = [attendance_watermark(cursor, params['start_date'], params['end_date']), users_watermark(cursor)]
+                producer = attendance_report_job(format_type)
+                extension = 'csv' if format_type == 'csv' else 'xlsx'
+                filename = export_filename('attendance_report', extension)
+                mimetype = CSV_MIMETYPE if format_type == 'csv' else XLSX_MIMETYPE
+            
+            elif report_type == 'salary':
+                if format_type != 'excel':
+                    return create_response(False, error='Invalid format type', status_code=400)
+                try:
+                    month, year = int(data.get('month')), int(data.get('year'))
+                    period = Period.month(year, month)
+                except (TypeError, ValueError):
+                    return create_response(False, error='Month and year are required', status_code=400)
+                params = {'user_id': scope_user_id, 'month': month, 'year': year}
+                watermark = [attendance_watermark(cursor, period.start, period.end - timedelta(days=1)), users_watermark(cursor)]
+                producer = salary_report_job
+                extension = 'xlsx'
+                filename = salary_report_filename(month, year)
+                mimetype = XLSX_MIMETYPE
+            
+            else:
+                return create_response(False, error='Invalid report type', status_code=400)
+        
+        try:
+            job, cached = get_report_job_queue().submit(
+                report_type, extension, params, watermark, producer, filename, mimetype
+            )
+        except ReportJobBusyError as e:
+            return create_response(False, error=str(e), status_code=503)
+        
+        return create_response(True, report_job_payload(job, cached),
+                               status_code=200 if job.status == JOB_DONE else 202)
+        
+    except Exception as e:
+        log_activity('ERROR', f'Report job submit error: {str(e)}', 'reports')
+        return create_response(False, error=f'Failed to submit report job: {str(e)}', status_code=500)
+
+@reports_bp.route('/jobs/<job_id>', methods=['GET'])
+@require_external_auth
+def get_report_job(current_user_id, job_id):
+    """Trạng thái và tiến độ của job báo cáo"""
+    try:
+        job, error = accessible_report_job(current_user_id, job_id)
+        if error:
+            return error
+        return create_response(True, report_job_payload(job))
+    except Exception as e:
+        return create_response(False, error=f'Failed to get report job: {str(e)}', status_code=500)
+
+@reports_bp.route('/jobs/<job_id>/download', methods=['GET'])
+@require_external_auth
+def download_report_job(current_user_id, job_id):
+    """Tải file của job báo cáo đã xong"""
+    try:
+        job, error = accessible_report_job(current_user_id, job_id)
+        if error:
+            return error
+        
+        path = get_report_job_queue().artifact_path(job)
+        if job.status != JOB_DONE or not os.path.exists(path):
+            return create_response(False, error=f'Report is not ready (status: {job.status})', status_code=409)
+        
+        return send_file(os.path.abspath(path), mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+    except Exception as e:
+        return create_response(False, error=f'Failed to download report: {str(e)}', status_code=500)
+
+def report_scope(current_user_id, user_id):
+    """(user_id mà báo cáo bị giới hạn, lỗi); None = toàn bộ nhân viên (chỉ admin)"""
+    principal = get_principal(current_user_id)
+    is_admin = principal is not None and principal.is_admin
     
-    # Header
-    headers = ['Date', 'Full Name', 'Check In', 'Check Out', 'Total Hours', 'Status']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, col=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    if user_id and user_id != str(current_user_id) and not is_admin:
+        return None, create_response(False, error='Admin access required', status_code=403)
     
-    # Data
-    for row, record in enumerate(data['records'], 2):
-        ws.cell(row=row, col=1, value=record['date'])
-        ws.cell(row=row, col=2, value=record['full_name'])
-        ws.cell(row=row, col=3, value=record['check_in_time'])
-        ws.cell(row=row, col=4, value=record['check_out_time'])
-        ws.cell(row=row, col=5, value=record['total_hours'])
-        ws.cell(row=row, col=6, value=record['status'])
+    if user_id:
+        try:
+            return int(user_id), None
+        except (TypeError, ValueError):
+            return None, create_response(False, error='Invalid user_id', status_code=400)
     
-    wb.save(output)
-    output.seek(0)
+    # Non-admin users can only see their own data
+    return (None if is_admin else current_user_id), None
+
+ATTENDANCE_REPORT_SELECT = """
+    SELECT a.id, a.date, a.check_in_time, a.check_out_time, 
+           a.total_hours, a.status, u.username, u.full_name
+"""
+ATTENDANCE_REPORT_ORDER = "ORDER BY a.date DESC, u.full_name"
+
+def attendance_report_source(scope_user_id, start_date, end_date):
+    """Phần FROM ... WHERE của báo cáo chấm công và tham số"""
+    source = """
+        FROM attendance a
+        JOIN users u ON a.user_id = u.id
+        WHERE 1=1
+    """
+    params = []
     
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'{filename}_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    )
+    if scope_user_id is not None:
+        source += " AND a.user_id = %s"
+        params.append(scope_user_id)
+    
+    if start_date:
+        source += " AND a.date >= %s"
+        params.append(start_date)
+    
+    if end_date:
+        source += " AND a.date <= %s"
+        params.append(end_date)
+    
+    return source, params
 
-def generate_csv_report(records, filename):
-    """Tạo file CSV từ dữ liệu báo cáo"""
-    df = pd.DataFrame(records)
-    output = io.StringIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
+def salary_report_data(cursor, month, year, scope_user_id):
+    """Bảng lương tháng month/year (từ bảng tổng hợp user-tháng)"""
+    # Lấy dữ liệu chấm công cho tháng
+    query = """
+        SELECT u.id, u.username, u.full_name, u.email,
+               COALESCE(m.total_days, 0) as total_days,
+               COALESCE(m.total_hours, 0) as total_hours,
+               COALESCE(m.present_days, 0) as present_days,
+               COALESCE(m.late_days, 0) as late_days,
+               COALESCE(m.absent_days, 0) as absent_days
+        FROM users u
+        LEFT JOIN attendance_user_monthly_stats m ON u.id = m.user_id 
+            AND m.month_start = %s
+        WHERE u.role = 'user'
+    """
+    params = [Period.month(year, month).start]
+    
+    if scope_user_id is not None:
+        query += " AND u.id = %s"
+        params.append(scope_user_id)
+    
+    query += " ORDER BY u.full_name"
+    
+    cursor.execute(query, params)
+    users_data = cursor.fetchall()
+    
+    # Tính lương (công thức cơ bản)
+    base_salary = 5000000  # 5 triệu VND cơ bản
+    hourly_rate = 50000   # 50k/giờ
+    
+    salary_data = []
+    for user in users_data:
+        total_hours = float(user[5] or 0)
+        present_days = user[6]
+        late_days = user[7]
+        
+        # Tính lương cơ bản theo ngày công
+        working_days = present_days + late_days
+        daily_salary = base_salary / 22  # 22 ngày làm việc/tháng
+        base_amount = working_days * daily_salary
+        
+        # Thưởng giờ làm thêm
+        overtime_hours = max(0, total_hours - (working_days * 8))
+        overtime_amount = overtime_hours * hourly_rate
+        
+        # Phạt đi trễ
+        late_penalty = late_days * 50000  # 50k/lần trễ
+        
+        total_salary = base_amount + overtime_amount - late_penalty
+        
+        salary_data.append({
+            'user_id': user[0],
+            'username': user[1],
+            'full_name': user[2],
+            'email': user[3],
+            'working_days': working_days,
+            'total_hours': total_hours,
+            'present_days': present_days,
+            'late_days': late_days,
+            'base_amount': round(base_amount, 0),
+            'overtime_hours': round(overtime_hours, 2),
+            'overtime_amount': round(overtime_amount, 0),
+            'late_penalty': round(late_penalty, 0),
+            'total_salary': round(total_salary, 0)
+        })
+        
+    report_data = {
+        'period': f"{month:02d}/{year}",
+        'generated_at': datetime.now().isoformat(),
+        'salary_data': salary_data,
+        'summary': {
+            'total_employees': len(salary_data),
+            'total_payroll': sum(s['total_salary'] for s in salary_data)
+        }
+    }
     
-    return send_file(
-        io.BytesIO(output.getvalue().encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'{filename}_{datetime.now().strftime("%Y%m%d")}.csv'
+    return report_data
+
+def attendance_record(record):
+    """Một dòng báo cáo chấm công (id, date, giờ vào/ra, tổng giờ, trạng thái, user)"""
+    return {
+        'id': record[0],
+        'date': record[1].strftime('%Y-%m-%d'),
+        'check_in_time': record[2].strftime('%H:%M:%S') if record[2] else None,
+        'check_out_time': record[3].strftime('%H:%M:%S') if record[3] else None,
+        'total_hours': float(record[4]) if record[4] else 0,
+        'status': record[5],
+        'username': record[6],
+        'full_name': record[7]
+    }
+
+def stream_attendance_records(query, params):
+    """Đọc bản ghi chấm công theo luồng; lỗi giữa chừng được ghi log trước khi ngắt download"""
+    try:
+        for record in stream_query(query, params):
+            yield attendance_record(record)
+    except Exception as e:
+        log_activity('ERROR', f'Attendance report export error: {str(e)}', 'reports')
+        raise
+
+def attendance_excel_chunks(records):
+    """Các khối bytes của file Excel báo cáo chấm công (write-only)"""
+    headers = ['Date', 'Full Name', 'Check In', 'Check Out', 'Total Hours', 'Status']
+    rows = (
+        (record['date'], record['full_name'], record['check_in_time'],
+         record['check_out_time'], record['total_hours'], record['status'])
+        for record in records
     )
+    return xlsx_chunks("Attendance Report", headers, rows)
 
-def generate_excel_salary_report(data):
-    """Tạo file Excel báo cáo lương"""
-    output = io.BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Salary Report"
-    
-    # Header
+def attendance_csv_chunks(records):
+    """Các khối bytes của file CSV báo cáo chấm công"""
+    headers = ['id', 'date', 'check_in_time', 'check_out_time', 'total_hours', 'status', 'username', 'full_name']
+    rows = ([record[key] for key in headers] for record in records)
+    return csv_chunks(headers, rows)
+
+def salary_excel_chunks(data):
+    """Các khối bytes của file Excel báo cáo lương"""
     headers = ['Full Name', 'Working Days', 'Total Hours', 'Base Amount', 
                'Overtime Hours', 'Overtime Amount', 'Late Penalty', 'Total Salary']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, col=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-    
-    # Data
-    for row, record in enumerate(data['salary_data'], 2):
-        ws.cell(row=row, col=1, value=record['full_name'])
-        ws.cell(row=row, col=2, value=record['working_days'])
-        ws.cell(row=row, col=3, value=record['total_hours'])
-        ws.cell(row=row, col=4, value=record['base_amount'])
-        ws.cell(row=row, col=5, value=record['overtime_hours'])
-        ws.cell(row=row, col=6, value=record['overtime_amount'])
-        ws.cell(row=row, col=7, value=record['late_penalty'])
-        ws.cell(row=row, col=8, value=record['total_salary'])
+    rows = (
+        (record['full_name'], record['working_days'], record['total_hours'], record['base_amount'],
+         record['overtime_hours'], record['overtime_amount'], record['late_penalty'], record['total_salary'])
+        for record in data['salary_data']
+    )
+    return xlsx_chunks("Salary Report", headers, rows)
+
+def salary_report_filename(month, year):
+    return f'salary_report_{month:02d}_{year}.xlsx'
+
+def generate_excel_report(records, filename):
+    """Tạo file Excel (write-only) từ các bản ghi báo cáo"""
+    return streaming_download(attendance_excel_chunks(records), XLSX_MIMETYPE, export_filename(filename, 'xlsx'))
+
+def generate_csv_report(records, filename):
+    """Tạo file CSV từ các bản ghi báo cáo, gửi từng khối"""
+    return streaming_download(attendance_csv_chunks(records), CSV_MIMETYPE, export_filename(filename, 'csv'))
+
+def generate_excel_salary_report(data, month, year):
+    """Tạo file Excel báo cáo lương"""
+    return streaming_download(salary_excel_chunks(data), XLSX_MIMETYPE, salary_report_filename(month, year))
+
+def attendance_report_job(format_type):
+    """Producer của job báo cáo chấm công (chạy trong thread nền, ngoài request)"""
+    def produce(params, progress):
+        source, query_params = attendance_report_source(params['user_id'], params['start_date'], params['end_date'])
+        with get_db_cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) {source}", query_params)
+            progress(0, cursor.fetchone()[0])
+        records = counted(stream_attendance_records(
+            f"{ATTENDANCE_REPORT_SELECT} {source} {ATTENDANCE_REPORT_ORDER}", query_params
+        ), progress)
+        return attendance_csv_chunks(records) if format_type == 'csv' else attendance_excel_chunks(records)
+    return produce
+
+def salary_report_job(params, progress):
+    """Producer của job báo cáo lương"""
+    with get_db_cursor() as cursor:
+        data = salary_report_data(cursor, params['month'], params['year'], params['user_id'])
+    progress(len(data['salary_data']), len(data['salary_data']))
+    return salary_excel_chunks(data)
+
+def users_watermark(cursor):
+    """Tên/danh sách nhân viên cũng nằm trong file báo cáo nên thay đổi ở users cũng làm mới cache"""
+    cursor.execute("SELECT MAX(updated_at), COUNT(*) FROM users")
+    row = cursor.fetchone()
+    return f"{row[0]}|{row[1]}"
+
+def report_job_payload(job, cached=False):
+    """Trạng thái job trả về cho client"""
+    def timestamp(value):
+        return datetime.fromtimestamp(value).isoformat() if value else None
     
-    wb.save(output)
-    output.seek(0)
+    payload = {
+        'job_id': job.job_id,
+        'report_type': job.report_type,
+        'format': job.format,
+        'status': job.status,
+        'progress': job.progress,
+        'rows': job.rows,
+        'total_rows': job.total_rows,
+        'error': job.error,
+        'cached': cached,
+        'created_at': timestamp(job.created_at),
+        'started_at': timestamp(job.started_at),
+        'finished_at': timestamp(job.finished_at),
+        'status_url': f'/api/reports/jobs/{job.job_id}'
+    }
+    if job.status == JOB_DONE:
+        payload['size'] = job.size
+        payload['download_url'] = f'/api/reports/jobs/{job.job_id}/download'
+    return payload
+
+def accessible_report_job(current_user_id, job_id):
+    """(job, lỗi): job chỉ được xem bởi admin hoặc user mà báo cáo giới hạn vào"""
+    job = get_report_job_queue().get(job_id)
+    if job is None:
+        return None, create_response(False, error='Report job not found', status_code=404)
     
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'salary_report_{data["period"].replace("/", "_")}.xlsx'
-    )
+    principal = get_principal(current_user_id)
+    if not (principal is not None and principal.is_admin) and job.params.get('user_id') != current_user_id:
+        return None, create_response(False, error='Report job not found', status_code=404)
+    return job, None
@@ -3,6 +3,9 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, date, timedelta
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_external_auth, validate_required_fields, log_activity
+from ..core.principal import get_principal
+from ..core.periods import Period, PERIOD_TYPES
+from ..report import user_totals
 import calendar
 
 statistics_bp = Blueprint('statistics', __name__)
@@ -17,59 +20,82 @@ def get_monthly_attendance_stats(current_user_id):
         user_id = request.args.get('user_id')
         
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
             if user_id and user_id != str(current_user_id):
-                if not user_role or user_role[0] != 'admin':
+                if not principal or not principal.is_admin:
                     return create_response(False, error='Admin access required', status_code=403)
             
             # Lấy số ngày trong tháng
             days_in_month = calendar.monthrange(year, month)[1]
+            month_start, month_end = Period.month(year, month).bounds()
             
-            # Query cơ bản
-            base_query = """
-                SELECT 
-                    DATE(a.date) as attendance_date,
-                    COUNT(DISTINCT a.user_id) as total_checkins,
-                    AVG(CASE WHEN a.total_hours IS NOT NULL THEN a.total_hours ELSE 0 END) as avg_hours,
-                    COUNT(CASE WHEN a.status = 'present' THEN 1 END) as present_count,
-                    COUNT(CASE WHEN a.status = 'late' THEN 1 END) as late_count,
-                    COUNT(CASE WHEN a.status = 'absent' THEN 1 END) as absent_count
-                FROM attendance a
-                WHERE EXTRACT(MONTH FROM a.date) = %s 
-                AND EXTRACT(YEAR FROM a.date) = %s
-            """
-            params = [month, year]
+            if not user_id and principal is not None and not principal.is_admin:
+                user_id = current_user_id
             
             if user_id:
-                base_query += " AND a.user_id = %s"
-                params.append(user_id)
-            elif user_role and user_role[0] != 'admin':
-                base_query += " AND a.user_id = %s"
-                params.append(current_user_id)
-            
-            base_query += " GROUP BY DATE(a.date) ORDER BY attendance_date"
-            
-            cursor.execute(base_query, params)
-            daily_stats = cursor.fetchall()
+                # Một user: tối đa một bản ghi mỗi ngày, đọc theo idx_attendance_user_date
+                cursor.execute("""
+                    SELECT 
+                        date,
+                        COUNT(DISTINCT user_id) as total_checkins,
+                        AVG(CASE WHEN total_hours IS NOT NULL THEN total_hours ELSE 0 END) as avg_hours,
+                        COUNT(CASE WHEN status = 'present' THEN 1 END) as present_count,
+                        COUNT(CASE WHEN status = 'late' THEN 1 END) as late_count,
+                        COUNT(CASE WHEN status = 'absent' THEN 1 END) as absent_count
+                    FROM attendance
+                    WHERE user_id = %s AND date >= %s AND date < %s
+                    GROUP BY date ORDER BY date
+                """, (user_id, month_start, month_end))
+                daily_stats = cursor.fetchall()
+                
+                cursor.execute("""
+                    SELECT total_hours, present_days, late_days, absent_days, total_days
+                    FROM attendance_user_monthly_stats
+                    WHERE user_id = %s AND month_start = %s
+                """, (user_id, month_start))
+                row = cursor.fetchone()
+                unique_users = 1 if row and row[4] else 0
+            else:
+                # Toàn hệ thống: đọc bảng tổng hợp theo ngày
+                cursor.execute("""
+                    SELECT 
+                        date,
+                        unique_users as total_checkins,
+                        CASE WHEN total_records > 0 THEN total_hours / total_records ELSE 0 END as avg_hours,
+                        present_count,
+                        late_count,
+                        absent_count
+                    FROM attendance_daily_stats
+                    WHERE date >= %s AND date < %s AND total_records > 0
+                    ORDER BY date
+                """, (month_start, month_end))
+                daily_stats = cursor.fetchall()
+                
+                cursor.execute("""
+                    SELECT SUM(total_hours), SUM(present_count), SUM(late_count), SUM(absent_count), SUM(total_records)
+                    FROM attendance_daily_stats
+                    WHERE date >= %s AND date < %s
+                """, (month_start, month_end))
+                row = cursor.fetchone()
+                
+                cursor.execute("""
+                    SELECT COUNT(*) FROM attendance_user_monthly_stats
+                    WHERE month_start = %s AND total_days > 0
+                """, (month_start,))
+                unique_users = cursor.fetchone()[0]
             
             # Thống kê tổng quan
-            cursor.execute("""
-                SELECT 
-                    COUNT(DISTINCT user_id) as unique_users,
-                    SUM(CASE WHEN total_hours IS NOT NULL THEN total_hours ELSE 0 END) as total_hours,
-                    COUNT(CASE WHEN status = 'present' THEN 1 END) as total_present,
-                    COUNT(CASE WHEN status = 'late' THEN 1 END) as total_late,
-                    COUNT(CASE WHEN status = 'absent' THEN 1 END) as total_absent,
-                    AVG(CASE WHEN total_hours IS NOT NULL THEN total_hours ELSE 0 END) as avg_daily_hours
-                FROM attendance
-                WHERE EXTRACT(MONTH FROM date) = %s 
-                AND EXTRACT(YEAR FROM date) = %s
-            """ + (" AND user_id = %s" if (user_id or (user_role and user_role[0] != 'admin')) else ""), 
-            params)
-            
-            summary = cursor.fetchone()
+            summary = None
+            if row and row[4]:
+                summary = (
+                    unique_users,
+                    row[0],
+                    int(row[1] or 0),
+                    int(row[2] or 0),
+                    int(row[3] or 0),
+                    float(row[0] or 0) / int(row[4])
+                )
             
             # Tạo dữ liệu cho tất cả các ngày trong tháng
             daily_data = {}
@@ -127,77 +153,88 @@ def get_attendance_trends(current_user_id):
         user_id = request.args.get('user_id')
         
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
             if user_id and user_id != str(current_user_id):
-                if not user_role or user_role[0] != 'admin':
+                if not principal or not principal.is_admin:
                     return create_response(False, error='Admin access required', status_code=403)
             
-            # Xây dựng query theo period
-            if period == 'week':
-                date_format = "DATE_TRUNC('week', date)"
-                date_label = "TO_CHAR(DATE_TRUNC('week', date), 'YYYY-\"W\"WW')"
-            elif period == 'month':
-                date_format = "DATE_TRUNC('month', date)"
-                date_label = "TO_CHAR(DATE_TRUNC('month', date), 'YYYY-MM')"
-            elif period == 'quarter':
-                date_format = "DATE_TRUNC('quarter', date)"
-                date_label = "TO_CHAR(DATE_TRUNC('quarter', date), 'YYYY-\"Q\"Q')"
-            elif period == 'year':
-                date_format = "DATE_TRUNC('year', date)"
-                date_label = "TO_CHAR(DATE_TRUNC('year', date), 'YYYY')"
-            else:
+            if period not in PERIOD_TYPES:
                 return create_response(False, error='Invalid period', status_code=400)
             
-            query = f"""
-                SELECT 
-                    {date_label} as period_label,
-                    {date_format} as period_date,
-                    COUNT(DISTINCT user_id) as unique_users,
-                    COUNT(*) as total_records,
-                    SUM(CASE WHEN total_hours IS NOT NULL THEN total_hours ELSE 0 END) as total_hours,
-                    AVG(CASE WHEN total_hours IS NOT NULL THEN total_hours ELSE 0 END) as avg_hours,
-                    COUNT(CASE WHEN status = 'present' THEN 1 END) as present_count,
-                    COUNT(CASE WHEN status = 'late' THEN 1 END) as late_count,
-                    COUNT(CASE WHEN status = 'absent' THEN 1 END) as absent_count
-                FROM attendance
-                WHERE 1=1
-            """
-            params = []
+            if not user_id and principal is not None and not principal.is_admin:
+                user_id = current_user_id
             
+            # Dòng theo ngày: (ngày, số bản ghi, present, late, absent, giờ), mới nhất trước
             if user_id:
-                query += " AND user_id = %s"
-                params.append(user_id)
-            elif user_role and user_role[0] != 'admin':
-                query += " AND user_id = %s"
-                params.append(current_user_id)
-            
-            query += f"""
-                GROUP BY {date_format}, {date_label}
-                ORDER BY period_date DESC
-                LIMIT %s
-            """
-            params.append(limit)
-            
-            cursor.execute(query, params)
-            trends = cursor.fetchall()
+                cursor.execute("""
+                    SELECT date, 1,
+                           CASE WHEN status = 'present' THEN 1 ELSE 0 END,
+                           CASE WHEN status = 'late' THEN 1 ELSE 0 END,
+                           CASE WHEN status = 'absent' THEN 1 ELSE 0 END,
+                           COALESCE(total_hours, 0)
+                    FROM attendance
+                    WHERE user_id = %s
+                    ORDER BY date DESC
+                """, (user_id,))
+            else:
+                cursor.execute("""
+                    SELECT date, total_records, present_count, late_count, absent_count, total_hours
+                    FROM attendance_daily_stats
+                    WHERE total_records > 0
+                    ORDER BY date DESC
+                """)
+            
+            # Gom theo period, giữ `limit` period gần nhất
+            buckets = {}
+            for row in cursor.fetchall():
+                bucket = Period.containing(period, row[0])
+                if bucket not in buckets:
+                    if len(buckets) >= limit:
+                        break
+                    buckets[bucket] = [0, 0, 0, 0, 0.0]
+                counts = buckets[bucket]
+                for i, value in enumerate(row[1:]):
+                    counts[i] += float(value or 0) if i == 4 else int(value or 0)
+            
+            # Số user khác nhau trong mỗi period
+            if user_id:
+                unique_users = {bucket: 1 for bucket in buckets}
+            elif period in ('day', 'week'):
+                unique_users = {}
+                for bucket in buckets:
+                    where, params = bucket.sql('date')
+                    cursor.execute(f"SELECT COUNT(DISTINCT user_id) FROM attendance WHERE {where}", params)
+                    unique_users[bucket] = cursor.fetchone()[0]
+            else:
+                users_by_period = {bucket: set() for bucket in buckets}
+                if buckets:
+                    cursor.execute("""
+                        SELECT month_start, user_id FROM attendance_user_monthly_stats
+                        WHERE month_start >= %s AND total_days > 0
+                    """, (min(bucket.start for bucket in buckets),))
+                    for month_start, member in cursor.fetchall():
+                        bucket = Period.containing(period, month_start)
+                        if bucket in users_by_period:
+                            users_by_period[bucket].add(member)
+                unique_users = {bucket: len(members) for bucket, members in users_by_period.items()}
             
             trend_data = []
-            for trend in trends:
+            for bucket, counts in buckets.items():
+                total_records, present_count, late_count, absent_count, total_hours = counts
                 attendance_rate = 0
-                if trend[1]:  # total_records
-                    attendance_rate = round((trend[6] + trend[7]) / trend[3] * 100, 2)  # (present + late) / total
+                if total_records:
+                    attendance_rate = round((present_count + late_count) / total_records * 100, 2)  # (present + late) / total
                 
                 trend_data.append({
-                    'period': trend[0],
-                    'unique_users': trend[2],
-                    'total_records': trend[3],
-                    'total_hours': round(float(trend[4] or 0), 2),
-                    'avg_hours': round(float(trend[5] or 0), 2),
-                    'present_count': trend[6],
-                    'late_count': trend[7],
-                    'absent_count': trend[8],
+                    'period': bucket.label,
+                    'unique_users': unique_users.get(bucket, 0),
+                    'total_records': total_records,
+                    'total_hours': round(total_hours, 2),
+                    'avg_hours': round(total_hours / total_records, 2) if total_records else 0,
+                    'present_count': present_count,
+                    'late_count': late_count,
+                    'absent_count': absent_count,
                     'attendance_rate': attendance_rate
                 })
             
@@ -219,55 +256,37 @@ def get_user_performance_stats(current_user_id):
         limit = request.args.get('limit', type=int, default=10)
         
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if not user_role or user_role[0] != 'admin':
+            if not principal or not principal.is_admin:
                 return create_response(False, error='Admin access required', status_code=403)
             
             end_date = date.today()
             start_date = end_date - timedelta(days=period_days)
             
-            cursor.execute("""
-                SELECT 
-                    u.id,
-                    u.username,
-                    u.full_name,
-                    COUNT(a.id) as total_days,
-                    SUM(CASE WHEN a.total_hours IS NOT NULL THEN a.total_hours ELSE 0 END) as total_hours,
-                    AVG(CASE WHEN a.total_hours IS NOT NULL THEN a.total_hours ELSE 0 END) as avg_daily_hours,
-                    COUNT(CASE WHEN a.status = 'present' THEN 1 END) as present_days,
-                    COUNT(CASE WHEN a.status = 'late' THEN 1 END) as late_days,
-                    COUNT(CASE WHEN a.status = 'absent' THEN 1 END) as absent_days,
-                    CASE 
-                        WHEN COUNT(a.id) > 0 THEN 
-                            ROUND((COUNT(CASE WHEN a.status IN ('present', 'late') THEN 1 END) * 100.0 / COUNT(a.id)), 2)
-                        ELSE 0 
-                    END as attendance_rate
-                FROM users u
-                LEFT JOIN attendance a ON u.id = a.user_id 
-                    AND a.date >= %s AND a.date <= %s
-                WHERE u.role = 'user'
-                GROUP BY u.id, u.username, u.full_name
-                ORDER BY total_hours DESC, attendance_rate DESC
-                LIMIT %s
-            """, (start_date, end_date, limit))
+            cursor.execute("SELECT id, username, full_name FROM users WHERE role = 'user'")
+            users = cursor.fetchall()
+            totals = user_totals(cursor, start_date, end_date + timedelta(days=1))
             
             performance_data = []
-            for user in cursor.fetchall():
+            for user in users:
+                total_days, present_days, late_days, absent_days, total_hours = totals.get(user[0], (0, 0, 0, 0, 0.0))
                 performance_data.append({
                     'user_id': user[0],
                     'username': user[1],
                     'full_name': user[2],
-                    'total_days': user[3],
-                    'total_hours': round(float(user[4] or 0), 2),
-                    'avg_daily_hours': round(float(user[5] or 0), 2),
-                    'present_days': user[6],
-                    'late_days': user[7],
-                    'absent_days': user[8],
-                    'attendance_rate': float(user[9] or 0)
+                    'total_days': total_days,
+                    'total_hours': round(total_hours, 2),
+                    'avg_daily_hours': round(total_hours / total_days, 2) if total_days else 0,
+                    'present_days': present_days,
+                    'late_days': late_days,
+                    'absent_days': absent_days,
+                    'attendance_rate': round((present_days + late_days) * 100.0 / total_days, 2) if total_days else 0
                 })
             
+            performance_data.sort(key=lambda item: (item['total_hours'], item['attendance_rate']), reverse=True)
+            performance_data = performance_data[:limit]
+            
             return create_response(True, {
                 'period': f"{start_date} to {end_date}",
                 'period_days': period_days,
@@ -284,44 +303,40 @@ def get_system_overview(current_user_id):
     """Tổng quan hệ thống"""
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if not user_role or user_role[0] != 'admin':
+            if not principal or not principal.is_admin:
                 return create_response(False, error='Admin access required', status_code=403)
             
             today = date.today()
-            this_month = today.replace(day=1)
-            last_month = (this_month - timedelta(days=1)).replace(day=1)
+            this_month = Period.containing('month', today).start
+            last_month = Period.containing('month', today).previous().start
             
             # Tổng số người dùng
             cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'user'")
             total_users = cursor.fetchone()[0]
             
             # Người dùng hoạt động (có chấm công trong 30 ngày)
-            cursor.execute("""
-                SELECT COUNT(DISTINCT user_id) FROM attendance 
-                WHERE date >= %s
-            """, (today - timedelta(days=30),))
-            active_users = cursor.fetchone()[0]
+            active_users = sum(1 for counts in user_totals(cursor, today - timedelta(days=30), today + timedelta(days=1)).values() if counts[0])
             
             # Chấm công hôm nay
             cursor.execute("""
-                SELECT COUNT(DISTINCT user_id) FROM attendance 
+                SELECT unique_users FROM attendance_daily_stats 
                 WHERE date = %s
             """, (today,))
-            today_checkins = cursor.fetchone()[0]
+            row = cursor.fetchone()
+            today_checkins = row[0] if row else 0
             
             # Tổng giờ làm tháng này
             cursor.execute("""
-                SELECT COALESCE(SUM(total_hours), 0) FROM attendance 
+                SELECT COALESCE(SUM(total_hours), 0) FROM attendance_daily_stats 
                 WHERE date >= %s
             """, (this_month,))
             month_hours = float(cursor.fetchone()[0] or 0)
             
             # So sánh với tháng trước
             cursor.execute("""
-                SELECT COALESCE(SUM(total_hours), 0) FROM attendance 
+                SELECT COALESCE(SUM(total_hours), 0) FROM attendance_daily_stats 
                 WHERE date >= %s AND date < %s
             """, (last_month, this_month))
             last_month_hours = float(cursor.fetchone()[0] or 0)
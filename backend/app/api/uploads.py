@@ -7,6 +7,9 @@ from werkzeug.utils import secure_filename
 from PIL import Image
 from ..core.database import get_db_cursor
 from ..core.utils import create_response, require_external_auth, validate_required_fields, log_activity
+from ..core.principal import get_principal
+from ..core.dialect import get_dialect
+from ..core.pagination import KeysetPage
 from ..config.settings import Config
 
 uploads_bp = Blueprint('uploads', __name__)
@@ -85,16 +88,13 @@ def upload_image(current_user_id):
         relative_path = os.path.join('images', upload_date, unique_filename).replace('\\', '/')
         
         with get_db_cursor() as cursor:
-            cursor.execute("""
+            file_id = get_dialect().insert_returning_id(cursor, """
                 INSERT INTO uploaded_files (user_id, original_filename, stored_filename, 
                                           file_path, file_size, file_type, upload_date)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
             """, (current_user_id, filename, unique_filename, relative_path, 
                   file_size, file_ext, datetime.now()))
             
-            file_id = cursor.fetchone()[0]
-            
             log_activity('INFO', f'Image uploaded: {filename} -> {unique_filename}', 'uploads')
             
             return create_response(True, {
@@ -146,49 +146,39 @@ def get_file(file_id):
 def list_user_files(current_user_id):
     """Liệt kê files của user"""
     try:
-        page = request.args.get('page', type=int, default=1)
-        limit = request.args.get('limit', type=int, default=20)
         file_type = request.args.get('type')  # image, document, etc.
-        
-        offset = (page - 1) * limit
+        try:
+            page = KeysetPage.from_request(request.args, 'uploaded_files', 'f.upload_date', 'f.id')
+        except ValueError as e:
+            return create_response(False, error=str(e), status_code=400)
         
         with get_db_cursor() as cursor:
             # Kiểm tra quyền admin
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
-            is_admin = user_role and user_role[0] == 'admin'
+            principal = get_principal(current_user_id)
+            is_admin = principal is not None and principal.is_admin
             
             # Build query
-            base_query = """
-                SELECT f.id, f.original_filename, f.stored_filename, f.file_path,
-                       f.file_size, f.file_type, f.upload_date, u.username, u.full_name
+            source = """
                 FROM uploaded_files f
                 JOIN users u ON f.user_id = u.id
                 WHERE 1=1
             """
-            count_query = "SELECT COUNT(*) FROM uploaded_files f WHERE 1=1"
             params = []
             
             if not is_admin:
-                base_query += " AND f.user_id = %s"
-                count_query += " AND user_id = %s"
+                source += " AND f.user_id = %s"
                 params.append(current_user_id)
             
             if file_type:
-                base_query += " AND f.file_type = %s"
-                count_query += " AND file_type = %s"
+                source += " AND f.file_type = %s"
                 params.append(file_type)
             
-            # Get total count
-            cursor.execute(count_query, params)
-            total_files = cursor.fetchone()[0]
-            
-            # Get files with pagination
-            base_query += " ORDER BY f.upload_date DESC LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
-            
-            cursor.execute(base_query, params)
-            files = cursor.fetchall()
+            # Mới nhất trước, tìm tiếp theo (upload_date, id) thay vì OFFSET
+            files = page.fetch(cursor, """
+                SELECT f.id, f.original_filename, f.stored_filename, f.file_path,
+                       f.file_size, f.file_type, f.upload_date, u.username, u.full_name
+            """, source, params, key_index=(6, 0))
+            total_files = page.count(cursor, source, params, 'uploaded_files', filtered=bool(params))
             
             files_data = []
             for file in files:
@@ -209,12 +199,7 @@ def list_user_files(current_user_id):
             
             return create_response(True, {
                 'files': files_data,
-                'pagination': {
-                    'page': page,
-                    'limit': limit,
-                    'total': total_files,
-                    'pages': (total_files + limit - 1) // limit
-                }
+                'pagination': page.pagination(total_files)
             })
             
     except Exception as e:
@@ -228,9 +213,8 @@ def delete_file(current_user_id, file_id):
     try:
         with get_db_cursor() as cursor:
             # Kiểm tra quyền
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
-            is_admin = user_role and user_role[0] == 'admin'
+            principal = get_principal(current_user_id)
+            is_admin = principal is not None and principal.is_admin
             
             # Lấy thông tin file
             cursor.execute("""
@@ -269,10 +253,9 @@ def cleanup_orphaned_files(current_user_id):
     """Dọn dẹp files không còn được sử dụng (admin only)"""
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-            user_role = cursor.fetchone()
+            principal = get_principal(current_user_id)
             
-            if not user_role or user_role[0] != 'admin':
+            if not principal or not principal.is_admin:
                 return create_response(False, error='Admin access required', status_code=403)
             
             # Tìm files cũ hơn 30 ngày và không được reference
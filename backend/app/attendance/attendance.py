@@ -1,34 +1,38 @@
 # Module chấm công bằng khuôn mặt (attendance)
 # Chỉ xử lý nhận diện, so sánh với embedding đã lưu, ghi nhận check-in/out
-import cv2
-import numpy as np
-import face_recognition
+from ..face_encoding import FaceFrame, get_face_encoder
 from ..liveness_detection.liveness_detection import check_liveness_from_image
+from ..face_gallery.index import FaceIndex, FlatIndex
 
 def encode_face(image):
-    rgb_img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    boxes = face_recognition.face_locations(rgb_img)
-    if not boxes:
-        raise ValueError("Không tìm thấy khuôn mặt trong ảnh.")
-    encodings = face_recognition.face_encodings(rgb_img, boxes)
-    return encodings[0]
+    return get_face_encoder().encode(image)
 
 def match_face(encoding, known_encodings, threshold=0.5):
-    if not known_encodings:
+    """So khớp encoding với danh sách encoding hoặc một FaceIndex đã build sẵn
+
+    Với danh sách, chỉ số trả về là vị trí trong danh sách; với FaceIndex là id đã lưu trong index
+    """
+    index = known_encodings
+    if not isinstance(index, FaceIndex):
+        if len(known_encodings) == 0:
+            return None, 0.0
+        index = FlatIndex.from_vectors(known_encodings)
+    if len(index) == 0:
         return None, 0.0
-    distances = face_recognition.face_distance(known_encodings, encoding)
-    min_dist = np.min(distances)
-    idx = np.argmin(distances)
-    if min_dist < threshold:
-        confidence = 1 - min_dist
-        return idx, confidence
+    ids, distances = index.search(encoding, k=1)
+    if len(ids) and distances[0] < threshold:
+        confidence = 1 - float(distances[0])
+        return int(ids[0]), confidence
     return None, 0.0
 
 def process_attendance_image(image, enable_liveness_check=True):
     """Xử lý ảnh chấm công với liveness detection"""
+    # Liveness và encoding dùng chung kết quả phát hiện khuôn mặt trên cùng một frame
+    frame = FaceFrame.of(image)
+    
     # Kiểm tra liveness detection nếu được bật
     if enable_liveness_check:
-        is_live, liveness_score, message = check_liveness_from_image(image)
+        is_live, liveness_score, message = check_liveness_from_image(frame)
         if not is_live:
             return {
                 'success': False,
@@ -39,7 +43,7 @@ def process_attendance_image(image, enable_liveness_check=True):
     
     try:
         # Encode khuôn mặt
-        encoding = encode_face(image)
+        encoding = encode_face(frame)
         
         return {
             'success': True,
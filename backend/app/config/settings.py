@@ -38,6 +38,15 @@ class Config:
             SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool (per process); a request reuses one pooled connection for all its queries
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))  # extra connections under load
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    PAGINATION_MAX_LIMIT = int(os.getenv('PAGINATION_MAX_LIMIT', 500))  # largest page a listing endpoint returns
+    DB_STREAM_BATCH_SIZE = int(os.getenv('DB_STREAM_BATCH_SIZE', 1000))  # rows fetched per round-trip by streamed exports
+    
     # Upload settings
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '../uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -46,6 +55,8 @@ class Config:
     # JWT settings
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    AUTH_PRINCIPAL_CACHE_TTL = float(os.getenv('AUTH_PRINCIPAL_CACHE_TTL', 30))  # seconds a cached role/active flag is trusted
+    AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv('AUTH_PRINCIPAL_CACHE_SIZE', 1024))  # max cached users per process
     
     # AI API Keys
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
@@ -54,10 +65,45 @@ class Config:
     
     # Face recognition settings
     FACE_MATCH_THRESHOLD = float(os.getenv('FACE_MATCH_THRESHOLD', 0.5))
+    FACE_GALLERY_POLL_INTERVAL = float(os.getenv('FACE_GALLERY_POLL_INTERVAL', 5))  # seconds between cross-worker syncs
+    FACE_INDEX_TYPE = os.getenv('FACE_INDEX_TYPE', 'flat')  # 'flat' (exact) or 'ivf' (approximate)
+    FACE_INDEX_MIN_SIZE = int(os.getenv('FACE_INDEX_MIN_SIZE', 20000))  # below this the gallery always scans exactly
+    FACE_INDEX_NLIST = int(os.getenv('FACE_INDEX_NLIST', 0))  # 0 = sqrt(gallery size)
+    FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', 16))
+    FACE_INDEX_PATH = os.getenv('FACE_INDEX_PATH', '')  # directory for the persisted (memory-mapped) index
+    FACE_MAX_SAMPLES_PER_USER = int(os.getenv('FACE_MAX_SAMPLES_PER_USER', 5))
+    FACE_CENTROID_CANDIDATES = int(os.getenv('FACE_CENTROID_CANDIDATES', 5))  # users refined per match
+    FACE_DETECTION_MODEL = os.getenv('FACE_DETECTION_MODEL', 'hog')  # 'hog' (CPU) or 'cnn' (GPU)
+    FACE_DETECTION_UPSAMPLE = int(os.getenv('FACE_DETECTION_UPSAMPLE', 1))
+    FACE_ENCODING_MODEL = os.getenv('FACE_ENCODING_MODEL', 'small')  # 'small' (5 landmarks) or 'large' (68)
+    FACE_ENCODING_JITTERS = int(os.getenv('FACE_ENCODING_JITTERS', 1))
+    FACE_MAX_IMAGE_DIMENSION = int(os.getenv('FACE_MAX_IMAGE_DIMENSION', 0))  # 0 = no pre-scaling
+    FACE_DETECTION_MAX_DIMENSION = int(os.getenv('FACE_DETECTION_MAX_DIMENSION', 480))  # detector input size, 0 = full frame
+    FACE_ROI_MARGIN = float(os.getenv('FACE_ROI_MARGIN', 0.25))  # crop padding around a box, relative to its size
+    FACE_BATCH_MAX_FRAMES = int(os.getenv('FACE_BATCH_MAX_FRAMES', 10))
+    FACE_DECODE_REDUCE = int(os.getenv('FACE_DECODE_REDUCE', 1))  # 1, 2, 4 or 8: JPEG decode scale for recognition uploads
+    
+    # Inference worker pool settings (0 workers = run recognition on the request thread)
+    INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 0))
+    INFERENCE_MAX_PENDING = int(os.getenv('INFERENCE_MAX_PENDING', 32))  # queued + running tasks before 503
+    INFERENCE_QUEUE_TIMEOUT = float(os.getenv('INFERENCE_QUEUE_TIMEOUT', 2))  # seconds to wait for a free slot
+    INFERENCE_TASK_TIMEOUT = float(os.getenv('INFERENCE_TASK_TIMEOUT', 30))
+    
+    # Background report jobs (files generated off the request thread, reused while fresh)
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))  # report generator threads per process
+    REPORT_JOB_MAX_PENDING = int(os.getenv('REPORT_JOB_MAX_PENDING', 16))  # queued + running jobs before 503
+    REPORT_JOB_STALE_AFTER = float(os.getenv('REPORT_JOB_STALE_AFTER', 300))  # seconds without progress before a job is treated as dead
+    REPORT_ARTIFACT_DIR = os.getenv('REPORT_ARTIFACT_DIR', '../report_artifacts')
+    REPORT_ARTIFACT_TTL = float(os.getenv('REPORT_ARTIFACT_TTL', 900))  # seconds a finished file is reused for identical requests
     
     # Liveness detection settings
     LIVENESS_MODEL_PATH = os.getenv('LIVENESS_MODEL_PATH', '../models/liveness.model')
     LIVENESS_ENABLED = os.getenv('LIVENESS_ENABLED', 'true').lower() == 'true'
+    LIVENESS_VIDEO_FPS = float(os.getenv('LIVENESS_VIDEO_FPS', 0))  # frames sampled per second of video, 0 = every frame
+    LIVENESS_VIDEO_MAX_FRAMES = int(os.getenv('LIVENESS_VIDEO_MAX_FRAMES', 180))  # 0 = whole clip
+    LIVENESS_SESSION_TTL = float(os.getenv('LIVENESS_SESSION_TTL', 30))  # seconds without a frame before eviction
+    LIVENESS_SESSION_MAX = int(os.getenv('LIVENESS_SESSION_MAX', 200))  # open streaming sessions per process
+    LIVENESS_SESSION_MAX_FRAMES = int(os.getenv('LIVENESS_SESSION_MAX_FRAMES', 60))  # verdict is forced after this
     
     # Internal network settings
     INTERNAL_NETWORKS = [
@@ -67,6 +113,7 @@ class Config:
         '127.0.0.1',
         'localhost'
     ]
+    NETWORK_CLASSIFIER_CACHE_SIZE = int(os.getenv('NETWORK_CLASSIFIER_CACHE_SIZE', 4096))  # client IPs memoized by the network classifier
     
     # Security
     ENCRYPT_KEY = os.getenv('ENCRYPT_KEY', 'your-encrypt-key')
@@ -74,6 +121,9 @@ class Config:
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # pending activity log rows before dropping
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 200))  # rows per multi-row INSERT
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 1.0))  # max seconds a row waits in the queue
 
 # ----> ADD THESE CLASSES 👇
 class DevelopmentConfig(Config):
@@ -0,0 +1,134 @@
+# Background writer for the activity log (logs table)
+# log_activity() only enqueues; a daemon thread flushes batches with one multi-row INSERT
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from ..config.settings import Config
+
+_STOP = object()
+
+
+class ActivityLogWriter:
+    """Bounded queue of log rows flushed to the database by one background thread
+
+    Rows are written when `batch_size` rows are pending or `flush_interval` seconds have passed.
+    When the queue is full new rows are dropped and counted instead of blocking the request.
+    """
+
+    def __init__(self, max_queue=None, batch_size=None, flush_interval=None):
+        self.max_queue = max_queue or Config.LOG_QUEUE_SIZE
+        self.batch_size = batch_size or Config.LOG_BATCH_SIZE
+        self.flush_interval = Config.LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'flushes': 0}
+
+    def _ensure_started(self):
+        # Restart the thread in a forked child (threads do not survive fork)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def log(self, level, message, module=None):
+        """Queue one log row; never blocks and never raises"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((level, message, module, datetime.now()))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return
+        with self._lock:
+            self._stats['enqueued'] += 1
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, rows):
+        from .database import get_db_cursor
+
+        try:
+            with get_db_cursor() as cursor:
+                placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+                cursor.execute(
+                    f"INSERT INTO logs (level, message, module, created_at) VALUES {placeholders}",
+                    [value for row in rows for value in row]
+                )
+        except Exception:
+            with self._lock:
+                self._stats['failed'] += len(rows)
+            return
+        with self._lock:
+            self._stats['written'] += len(rows)
+            self._stats['flushes'] += 1
+
+    def stop(self, timeout=5.0):
+        """Flush everything queued so far and stop the writer thread"""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def stats(self):
+        """Queue depth and write/drop counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'queued': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval
+        })
+        return stats
+
+
+# Singleton instance
+_activity_log_writer = None
+_activity_log_writer_lock = threading.Lock()
+
+def get_activity_log_writer():
+    """Get the process-wide activity log writer"""
+    global _activity_log_writer
+    if _activity_log_writer is None:
+        with _activity_log_writer_lock:
+            if _activity_log_writer is None:
+                _activity_log_writer = ActivityLogWriter()
+    return _activity_log_writer
@@ -1,12 +1,26 @@
 # Database connection and models
+import threading
+import time
+import uuid
+from collections import deque
 import mysql.connector
 import psycopg2
 from urllib.parse import urlparse
+from flask import g, has_app_context
 from ..config.settings import Config
 from contextlib import contextmanager
 
+def get_db_dialect():
+    """Return 'mysql' or 'postgresql' for the configured database"""
+    scheme = urlparse(Config.SQLALCHEMY_DATABASE_URI).scheme
+    if scheme.startswith('mysql'):
+        return 'mysql'
+    elif scheme.startswith('postgresql'):
+        return 'postgresql'
+    raise ValueError(f"Unsupported database scheme: {scheme}")
+
 def get_db_connection():
-    """Get database connection - supports both MySQL and PostgreSQL"""
+    """Open a new (unpooled) database connection - supports both MySQL and PostgreSQL"""
     result = urlparse(Config.SQLALCHEMY_DATABASE_URI)
     
     # Determine database type from scheme
@@ -30,20 +44,274 @@ def get_db_connection():
     else:
         raise ValueError(f"Unsupported database scheme: {result.scheme}")
 
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection became free within DB_POOL_TIMEOUT seconds"""
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections (MySQL or PostgreSQL)
+
+    `size` connections are kept open; up to `max_overflow` extra ones are opened under load
+    and closed when returned. Connections older than `recycle` seconds are replaced, and with
+    `pre_ping` each checkout verifies the connection is still alive.
+    """
+
+    def __init__(self, connect=None, size=None, max_overflow=None, recycle=None, pre_ping=None, timeout=None):
+        self._connect = connect or get_db_connection
+        self.size = Config.DB_POOL_SIZE if size is None else size
+        self.max_overflow = Config.DB_POOL_MAX_OVERFLOW if max_overflow is None else max_overflow
+        self.recycle = Config.DB_POOL_RECYCLE if recycle is None else recycle
+        self.pre_ping = Config.DB_POOL_PRE_PING if pre_ping is None else pre_ping
+        self.timeout = Config.DB_POOL_TIMEOUT if timeout is None else timeout
+        self._idle = deque()          # (connection, created_at); LIFO keeps hot connections in use
+        self._created = {}            # id(connection) -> created_at for checked-out connections
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {'checkouts': 0, 'connects': 0, 'recycled': 0, 'ping_failures': 0,
+                       'discarded': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _ping(conn):
+        """True if the server still answers on this connection"""
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        """Borrow a connection; raises PoolTimeoutError when the pool stays exhausted"""
+        start = time.perf_counter()
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    conn, created_at = None, None
+                    break
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._open >= self.size + self.max_overflow:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError('Database connection pool exhausted')
+            waited = time.perf_counter() - start
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+
+        # Kết nối / ping nằm ngoài lock để không chặn các thread khác
+        try:
+            if conn is not None and self.recycle and time.time() - created_at > self.recycle:
+                self._close(conn)
+                conn = None
+                self._count('recycled')
+            if conn is not None and self.pre_ping and not self._ping(conn):
+                self._close(conn)
+                conn = None
+                self._count('ping_failures')
+            if conn is None:
+                conn = self._connect()
+                created_at = time.time()
+                self._count('connects')
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created[id(conn)] = created_at
+        return conn
+
+    def checkin(self, conn, discard=False):
+        """Return a connection; broken ones (discard=True) and overflow connections are closed"""
+        if not discard:
+            try:
+                # Không để transaction dở dang sang request khác
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            created_at = self._created.pop(id(conn), time.time())
+            if discard or len(self._idle) >= self.size:
+                self._open -= 1
+                self._stats['discarded'] += 1
+                close = True
+            else:
+                self._idle.append((conn, created_at))
+                close = False
+            self._cond.notify()
+        if close:
+            self._close(conn)
+
+    def _count(self, name):
+        with self._cond:
+            self._stats[name] += 1
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones are closed when returned)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Checkout counts, wait times and current occupancy"""
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            in_use = self._open - idle
+        checkouts = stats['checkouts']
+        return {
+            'size': self.size,
+            'max_overflow': self.max_overflow,
+            'open': in_use + idle,
+            'in_use': in_use,
+            'idle': idle,
+            'overflow': max(in_use + idle - self.size, 0),
+            'checkouts': checkouts,
+            'connects': stats['connects'],
+            'recycled': stats['recycled'],
+            'ping_failures': stats['ping_failures'],
+            'discarded': stats['discarded'],
+            'timeouts': stats['timeouts'],
+            'avg_wait_ms': round(stats['wait_seconds'] * 1000 / checkouts, 3) if checkouts else 0.0,
+            'max_wait_ms': round(stats['max_wait_seconds'] * 1000, 3)
+        }
+
+
+# Singleton instance
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """Lấy connection pool dùng chung của tiến trình"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool()
+    return _db_pool
+
+
+def _release_request_connection(exc=None):
+    """Trả kết nối của request về pool khi app context kết thúc"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        get_db_pool().checkin(conn, discard=g.pop('_db_conn_broken', False))
+
+def init_app(app):
+    """Return the request-scoped connection to the pool at the end of every request"""
+    app.teardown_appcontext(_release_request_connection)
+
 @contextmanager
 def get_db_cursor():
-    """Context manager for database operations"""
-    conn = get_db_connection()
+    """Context manager for database operations
+
+    Inside a request all calls share one pooled connection (stored on flask.g); the outermost
+    block commits or rolls back and nested blocks run inside a savepoint. Outside a request
+    each call borrows its own connection from the pool.
+    """
+    pool = get_db_pool()
+    request_scoped = has_app_context()
+    if request_scoped:
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = g._db_conn = pool.checkout()
+        depth = g.get('_db_depth', 0)
+        g._db_depth = depth + 1
+    else:
+        conn = pool.checkout()
+        depth = 0
+
+    # Với autocommit (MySQL) mỗi câu lệnh đã tự commit nên không cần savepoint
+    savepoint = f"db_cursor_{depth}" if depth and not getattr(conn, 'autocommit', False) else None
+    cursor = None
+    broken = False
     try:
         cursor = conn.cursor()
+        if savepoint:
+            cursor.execute(f"SAVEPOINT {savepoint}")
         yield cursor
-        conn.commit()
+        if savepoint:
+            cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+        elif depth == 0:
+            conn.commit()
     except Exception as e:
-        conn.rollback()
+        try:
+            if savepoint:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            elif depth == 0:
+                conn.rollback()
+        except Exception:
+            broken = True
         raise e
     finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                broken = True
+        if request_scoped:
+            g._db_depth = depth
+            if broken:
+                g._db_conn_broken = True
+        else:
+            pool.checkin(conn, discard=broken)
+
+def stream_query(query, params=(), batch_size=None):
+    """Yield the rows of a SELECT without loading the result set into memory
+
+    Uses a server-side cursor (PostgreSQL named cursor / MySQL unbuffered cursor) on a pooled
+    connection of its own, so the generator can outlive the request context while a streamed
+    response is being sent; the connection is returned when the generator finishes or is closed.
+    """
+    batch_size = batch_size or Config.DB_STREAM_BATCH_SIZE
+    pool = get_db_pool()
+    conn = pool.checkout()
+    cursor = None
+    broken = True
+    try:
+        if get_db_dialect() == 'postgresql':
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
+        else:
+            cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
         cursor.close()
-        conn.close()
+        cursor = None
+        broken = False
+    finally:
+        if cursor is not None:
+            # Dừng giữa chừng: MySQL còn dòng chưa đọc trên kết nối nên đóng hẳn kết nối đó
+            try:
+                cursor.close()
+                broken = get_db_dialect() == 'mysql'
+            except Exception:
+                broken = True
+        pool.checkin(conn, discard=broken)
 
 # DatabaseModels class removed - use database.sql for schema creation
 
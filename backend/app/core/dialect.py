@@ -0,0 +1,145 @@
+# SQL dialect helpers for MySQL / PostgreSQL parity
+# Renders the statements whose syntax differs between the two backends (upsert, insert-if-missing, keyset
+# conditions, returning the inserted id, multi-row insert, date truncation, row-count estimates) so callers
+# keep a single-statement form on both
+import json
+import threading
+from .database import get_db_dialect
+
+UPSERT_NEW = None  # marker in `updates`: set the column to the value being inserted
+
+TRUNC_UNITS = ('day', 'week', 'month', 'quarter', 'year')
+
+
+class Dialect:
+    """SQL renderer for one backend ('mysql' or 'postgresql')"""
+
+    def __init__(self, name):
+        if name not in ('mysql', 'postgresql'):
+            raise ValueError(f"Unsupported SQL dialect: {name}")
+        self.name = name
+
+    @property
+    def is_mysql(self):
+        return self.name == 'mysql'
+
+    def excluded(self, column):
+        """Reference to the value that the conflicting INSERT tried to write"""
+        return f"VALUES({column})" if self.is_mysql else f"EXCLUDED.{column}"
+
+    def upsert(self, table, columns, keys, updates=None, select=None):
+        """INSERT that updates the existing row on a primary/unique key conflict
+
+        `updates` maps column -> SQL expression (UPSERT_NEW = the inserted value); by default every
+        non-key column takes the inserted value. `select` replaces the VALUES clause (INSERT ... SELECT).
+        """
+        if updates is None:
+            updates = {column: UPSERT_NEW for column in columns if column not in keys}
+        assignments = ', '.join(
+            f"{column} = {self.excluded(column) if expression is UPSERT_NEW else expression}"
+            for column, expression in updates.items()
+        )
+        source = select or f"VALUES ({', '.join(['%s'] * len(columns))})"
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) {source}"
+        if self.is_mysql:
+            return f"{sql} ON DUPLICATE KEY UPDATE {assignments}"
+        return f"{sql} ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {assignments}"
+
+    def insert_missing(self, table, columns, keys):
+        """INSERT that leaves an existing row with the same primary/unique key untouched"""
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        if self.is_mysql:
+            # Not INSERT IGNORE, which would also swallow unrelated errors
+            return f"{sql} ON DUPLICATE KEY UPDATE {keys[0]} = {keys[0]}"
+        return f"{sql} ON CONFLICT ({', '.join(keys)}) DO NOTHING"
+
+    def keyset_before(self, sort_column, id_column, sort_value, row_id):
+        """Condition for rows ordered before (sort_value, row_id) in (sort_column, id_column) DESC order
+
+        PostgreSQL matches a row comparison against a (sort_column, id) btree as one Index Cond;
+        MySQL's range optimizer handles the expanded OR form instead. Returns (sql, params).
+        """
+        if self.is_mysql:
+            return (f"({sort_column} < %s OR ({sort_column} = %s AND {id_column} < %s))",
+                    [sort_value, sort_value, row_id])
+        return f"({sort_column}, {id_column}) < (%s, %s)", [sort_value, row_id]
+
+    def insert_returning_id(self, cursor, sql, params=(), id_column='id'):
+        """Run a single-row INSERT and return the generated id in the same round-trip"""
+        if self.is_mysql:
+            cursor.execute(sql, params)
+            return cursor.lastrowid
+        cursor.execute(f"{sql} RETURNING {id_column}", params)
+        return cursor.fetchone()[0]
+
+    def bulk_insert(self, cursor, table, columns, rows, page_size=500):
+        """Insert rows with one multi-row INSERT per page; returns the number of rows"""
+        rows = list(rows)
+        placeholder = f"({', '.join(['%s'] * len(columns))})"
+        for offset in range(0, len(rows), page_size):
+            page = rows[offset:offset + page_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholder] * len(page))}",
+                [value for row in page for value in row]
+            )
+        return len(rows)
+
+    def date_trunc(self, unit, column):
+        """Expression for the first day (as DATE) of the day/week/month/quarter/year containing `column`
+
+        Weeks start on Monday on both backends; no '%' format strings, so it is safe next to DB-API parameters.
+        """
+        if unit not in TRUNC_UNITS:
+            raise ValueError(f"Invalid truncation unit: {unit}")
+        if not self.is_mysql:
+            return f"CAST(DATE_TRUNC('{unit}', {column}) AS DATE)"
+        if unit == 'day':
+            return f"DATE({column})"
+        if unit == 'week':
+            return f"DATE_SUB(DATE({column}), INTERVAL WEEKDAY({column}) DAY)"
+        if unit == 'month':
+            return f"DATE_SUB(DATE({column}), INTERVAL DAYOFMONTH({column}) - 1 DAY)"
+        if unit == 'quarter':
+            return f"DATE_ADD(MAKEDATE(YEAR({column}), 1), INTERVAL QUARTER({column}) - 1 QUARTER)"
+        return f"MAKEDATE(YEAR({column}), 1)"
+
+    def table_rows(self, cursor, table):
+        """Row count of `table` from the catalog statistics (no table scan); None when unknown"""
+        if self.is_mysql:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                (table,)
+            )
+        else:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+        # reltuples is -1 until the table has been vacuumed/analyzed
+        if not row or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def estimated_rows(self, cursor, sql, params=()):
+        """Planner estimate of the rows a SELECT returns (EXPLAIN, nothing is executed)"""
+        if self.is_mysql:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+            return int((row.get('rows') or 0) * float(row.get('filtered') or 100) / 100)
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+_dialects = {}
+_dialects_lock = threading.Lock()
+
+def get_dialect(name=None):
+    """Dialect of the configured database (or of `name`)"""
+    name = name or get_db_dialect()
+    dialect = _dialects.get(name)
+    if dialect is None:
+        with _dialects_lock:
+            dialect = _dialects.setdefault(name, Dialect(name))
+    return dialect
@@ -0,0 +1,136 @@
+# Keyset (seek) pagination for newest-first listings
+# Pages are ordered by (sort column, id) DESC and continued with an opaque cursor holding the last
+# row's key, so page N is `WHERE key < cursor ORDER BY key LIMIT n` on the same index as page 1
+# instead of reading and discarding N * limit rows with OFFSET
+import base64
+import json
+from datetime import date, datetime
+from ..config.settings import Config
+from .dialect import get_dialect
+
+COUNT_MODES = ('exact', 'approx', 'none')
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'t': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 't' in value:
+            return datetime.fromisoformat(value['t'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError("Invalid cursor value")
+    return value
+
+
+def encode_cursor(scope, sort_value, row_id):
+    """Opaque token for the position after (sort_value, row_id) in listing `scope`"""
+    payload = json.dumps({'s': scope, 'k': [_encode_value(sort_value), row_id]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(scope, token):
+    """(sort_value, row_id) from a token of listing `scope`; ValueError if malformed or from another listing"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        sort_value, row_id = payload['k']
+        if payload['s'] != scope or not isinstance(row_id, int):
+            raise ValueError
+        return _decode_value(sort_value), row_id
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+class KeysetPage:
+    """One page of a listing ordered by (sort_column, id_column) DESC
+
+    `cursor` continues after a previous page; without it `page` > 1 falls back to OFFSET for old clients.
+    `count` is 'exact' (COUNT(*)), 'approx' (table statistics / planner estimate) or 'none'.
+    """
+
+    def __init__(self, scope, sort_column, id_column, limit, cursor=None, page=1, count=None):
+        self.scope = scope
+        self.sort_column = sort_column
+        self.id_column = id_column
+        self.limit = max(1, min(limit, Config.PAGINATION_MAX_LIMIT))
+        self.after = decode_cursor(scope, cursor) if cursor else None
+        self.page = max(page, 1) if self.after is None else None
+        # The total is only needed on the first page; continuation pages skip COUNT(*) unless asked
+        self.count_mode = count or ('none' if self.after else 'exact')
+        if self.count_mode not in COUNT_MODES:
+            raise ValueError(f"Invalid count mode: {self.count_mode}")
+        self.next_cursor = None
+
+    @classmethod
+    def from_request(cls, args, scope, sort_column, id_column, limit_arg='limit', default_limit=20):
+        """Read cursor / page / <limit_arg> / count from request.args"""
+        return cls(
+            scope, sort_column, id_column,
+            limit=args.get(limit_arg, type=int, default=default_limit),
+            cursor=args.get('cursor') or None,
+            page=args.get('page', type=int, default=1),
+            count=args.get('count') or None
+        )
+
+    def fetch(self, cursor, select, source, params, key_index):
+        """Run `select source` for this page; `source` is the FROM ... WHERE part
+
+        key_index: positions of the sort column and the id in the selected row.
+        """
+        query = f"{select} {source}"
+        params = list(params)
+        if self.after is not None:
+            condition, condition_params = get_dialect().keyset_before(
+                self.sort_column, self.id_column, self.after[0], self.after[1])
+            query += f" AND {condition}"
+            params.extend(condition_params)
+        query += f" ORDER BY {self.sort_column} DESC, {self.id_column} DESC LIMIT %s"
+        # One extra row tells whether a next page exists without counting
+        params.append(self.limit + 1)
+        if self.page and self.page > 1:
+            query += " OFFSET %s"
+            params.append((self.page - 1) * self.limit)
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            self.next_cursor = encode_cursor(self.scope, last[key_index[0]], last[key_index[1]])
+        return rows
+
+    def count(self, cursor, source, params, table, filtered=True):
+        """Total rows matched by `source` according to count_mode (None for 'none')"""
+        if self.count_mode == 'none':
+            return None
+        if self.count_mode == 'exact':
+            cursor.execute(f"SELECT COUNT(*) {source}", params)
+            return cursor.fetchone()[0]
+
+        dialect = get_dialect()
+        if not filtered:
+            total = dialect.table_rows(cursor, table)
+            if total is not None:
+                return total
+        return dialect.estimated_rows(cursor, f"SELECT 1 {source}", params)
+
+    def pagination(self, total, limit_key='limit'):
+        """`pagination` block of the response; page/pages are kept for page-based clients"""
+        result = {
+            limit_key: self.limit,
+            'next_cursor': self.next_cursor,
+            'has_more': self.next_cursor is not None,
+            'total': total,
+            'count_mode': self.count_mode
+        }
+        if self.page is not None:
+            result['page'] = self.page
+        if total is not None:
+            result['pages'] = (total + self.limit - 1) // self.limit
+        return result
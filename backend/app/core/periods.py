@@ -0,0 +1,95 @@
+# Calendar periods as half-open [start, end) date ranges
+# Statistics and report queries filter with `column >= start AND column < end` so the
+# (date) and (user_id, date) indexes stay usable; EXTRACT()/DATE() on the column defeats them
+from datetime import date, datetime, time, timedelta
+
+PERIOD_TYPES = ('day', 'week', 'month', 'quarter', 'year')
+
+_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def _add_months(day, months):
+    index = day.month - 1 + months
+    return day.replace(year=day.year + index // 12, month=index % 12 + 1, day=1)
+
+
+class Period:
+    """One calendar day/week/month/quarter/year; weeks start on Monday"""
+    __slots__ = ('kind', 'start', 'end')
+
+    def __init__(self, kind, start, end):
+        self.kind = kind
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def containing(cls, kind, day):
+        """The `kind` period that contains `day`"""
+        if isinstance(day, datetime):
+            day = day.date()
+        if kind == 'day':
+            return cls(kind, day, day + timedelta(days=1))
+        if kind == 'week':
+            start = day - timedelta(days=day.weekday())
+            return cls(kind, start, start + timedelta(days=7))
+        if kind not in _MONTHS:
+            raise ValueError(f"Invalid period: {kind}")
+        months = _MONTHS[kind]
+        start = day.replace(month=(day.month - 1) // months * months + 1, day=1)
+        return cls(kind, start, _add_months(start, months))
+
+    @classmethod
+    def month(cls, year, month):
+        return cls.containing('month', date(year, month, 1))
+
+    @classmethod
+    def current(cls, kind):
+        return cls.containing(kind, date.today())
+
+    def next(self):
+        return Period.containing(self.kind, self.end)
+
+    def previous(self):
+        return Period.containing(self.kind, self.start - timedelta(days=1))
+
+    @property
+    def label(self):
+        """2024-03-05, 2024-W10 (week of year counted from Jan 1), 2024-03, 2024-Q1, 2024"""
+        if self.kind == 'day':
+            return self.start.isoformat()
+        if self.kind == 'week':
+            return f"{self.start.year}-W{(self.start.timetuple().tm_yday - 1) // 7 + 1:02d}"
+        if self.kind == 'month':
+            return f"{self.start.year}-{self.start.month:02d}"
+        if self.kind == 'quarter':
+            return f"{self.start.year}-Q{(self.start.month - 1) // 3 + 1}"
+        return f"{self.start.year}"
+
+    def bounds(self, timestamps=False):
+        """(start, end) as dates, or as midnight datetimes for TIMESTAMP columns"""
+        if timestamps:
+            return datetime.combine(self.start, time.min), datetime.combine(self.end, time.min)
+        return self.start, self.end
+
+    def sql(self, column='date', timestamps=False):
+        """Sargable filter `column >= %s AND column < %s` and its parameters"""
+        return f"{column} >= %s AND {column} < %s", self.bounds(timestamps)
+
+    def __contains__(self, day):
+        if isinstance(day, datetime):
+            day = day.date()
+        return self.start <= day < self.end
+
+    def __eq__(self, other):
+        return isinstance(other, Period) and (self.kind, self.start) == (other.kind, other.start)
+
+    def __hash__(self):
+        return hash((self.kind, self.start))
+
+    def __repr__(self):
+        return f"Period({self.kind!r}, {self.start.isoformat()} -> {self.end.isoformat()})"
+
+
+def month_bounds(day):
+    """(first day of the month, first day of the next month) for the month containing `day`"""
+    return Period.containing('month', day).bounds()
@@ -0,0 +1,150 @@
+# Principal resolution for authenticated requests
+# The JWT is decoded once per request; role/active flags come from a short-TTL LRU cache
+# instead of a `SELECT role FROM users` in every decorator and handler
+import threading
+import time
+from collections import OrderedDict
+import jwt
+from flask import request, current_app, g, has_request_context, after_this_request
+from ..config.settings import Config
+
+
+class Principal:
+    """The authenticated user of a request"""
+    __slots__ = ('user_id', 'username', 'role', 'is_active')
+
+    def __init__(self, user_id, username, role, is_active):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.is_active = is_active
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __repr__(self):
+        return f"Principal(user_id={self.user_id!r}, role={self.role!r}, is_active={self.is_active!r})"
+
+
+class PrincipalCache:
+    """Thread-safe LRU of user_id -> Principal (or None for unknown users) with a TTL"""
+
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = Config.AUTH_PRINCIPAL_CACHE_TTL if ttl is None else ttl
+        self.max_size = max_size or Config.AUTH_PRINCIPAL_CACHE_SIZE
+        self._entries = OrderedDict()  # user_id -> (principal, loaded_at)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _load(user_id):
+        from .database import get_db_cursor
+
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT id, username, role, is_active FROM users WHERE id = %s", (user_id,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return Principal(user_id, row[1], row[2], bool(row[3]) if row[3] is not None else True)
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        principal = self._load(user_id)
+        with self._lock:
+            self._entries[user_id] = (principal, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id=None):
+        """Drop one user (or everything when user_id is None)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats.update({'max_size': self.max_size, 'ttl_seconds': self.ttl})
+        return stats
+
+
+# Singleton instance
+_principal_cache = None
+_principal_cache_lock = threading.Lock()
+
+def get_principal_cache():
+    """Get the process-wide principal cache"""
+    global _principal_cache
+    if _principal_cache is None:
+        with _principal_cache_lock:
+            if _principal_cache is None:
+                _principal_cache = PrincipalCache()
+    return _principal_cache
+
+
+def decode_request_token():
+    """user_id from the request's Bearer token, decoded once per request
+
+    Returns None when no token is sent; raises jwt.ExpiredSignatureError / jwt.InvalidTokenError
+    """
+    if '_token_user_id' in g:
+        return g._token_user_id
+    token = request.headers.get('Authorization')
+    if not token:
+        return None
+    if token.startswith('Bearer '):
+        token = token[7:]
+    data = jwt.decode(token, current_app.config.get('JWT_SECRET_KEY', current_app.config['SECRET_KEY']), algorithms=['HS256'])
+    g._token_user_id = data['user_id']
+    return g._token_user_id
+
+
+def get_principal(user_id):
+    """Principal for `user_id` (None if the user does not exist); the request's own principal is reused"""
+    if user_id is None:
+        return None
+    principal = g.get('principal') if has_request_context() else None
+    if principal is not None and principal.user_id == user_id:
+        return principal
+    return get_principal_cache().get(user_id)
+
+
+def attach_principal(user_id):
+    """Resolve the principal of the current request and store it on g.principal"""
+    g.principal = get_principal_cache().get(user_id)
+    return g.principal
+
+
+def current_principal():
+    """Principal attached by the auth decorators, or None (e.g. unauthenticated internal-network requests)"""
+    return g.get('principal')
+
+
+def invalidate_principal(user_id=None):
+    """Forget cached role/active flags after a user is changed or deleted
+
+    Inside a request the entry is dropped again once the response is ready, after the
+    handler's transaction has committed, so a concurrent reload cannot cache the old row.
+    """
+    cache = get_principal_cache()
+    cache.invalidate(user_id)
+    if has_request_context():
+        @after_this_request
+        def _invalidate(response):
+            cache.invalidate(user_id)
+            return response
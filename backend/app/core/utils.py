@@ -9,27 +9,76 @@ import io
 from datetime import datetime, date
 from functools import wraps
 import jwt
-from flask import request, jsonify, current_app
+from flask import request, jsonify, g
 
-def decode_base64_image(base64_string):
-    """Decode base64 string to OpenCV image"""
+# cv2.imdecode flags; JPEG is decoded directly at 1/2, 1/4 or 1/8 scale (DCT scaling), without a resize pass
+IMAGE_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+def decode_image_bytes(data, reduce=1):
+    """Decode encoded image bytes (JPEG/PNG/...) straight to a BGR OpenCV image"""
+    if reduce not in IMAGE_DECODE_FLAGS:
+        raise ValueError(f"Unsupported image reduction: {reduce}")
+    buffer = np.frombuffer(memoryview(data), dtype=np.uint8)
+    if buffer.size == 0:
+        raise ValueError("Invalid image data: empty payload")
+    image = cv2.imdecode(buffer, IMAGE_DECODE_FLAGS[reduce])
+    if image is None:
+        raise ValueError("Invalid image data: unsupported or corrupt image")
+    return image
+
+def decode_base64_image(base64_string, reduce=1):
+    """Decode base64 string to OpenCV image (compatibility path for JSON clients)"""
     try:
         # Remove data URL prefix if present
         if ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode base64
+            base64_string = base64_string.split(',', 1)[1]
         image_data = base64.b64decode(base64_string)
-        
-        # Convert to PIL Image
-        pil_image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        
-        return opencv_image
-    except Exception as e:
+    except (TypeError, ValueError) as e:
         raise ValueError(f"Invalid image data: {str(e)}")
+    return decode_image_bytes(image_data, reduce)
+
+def decode_image(payload, reduce=1):
+    """Decode an image payload: raw bytes or a base64 string"""
+    if isinstance(payload, str):
+        return decode_base64_image(payload, reduce)
+    return decode_image_bytes(payload, reduce)
+
+def _is_raw_image_body():
+    return request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream'
+
+def request_fields():
+    """Non-image request fields: the JSON body, multipart form fields, or the query string for raw image bodies"""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        return data if isinstance(data, dict) else {}
+    if request.form:
+        return request.form.to_dict()
+    return request.args.to_dict()
+
+def request_image_payloads(field):
+    """Encoded images sent under `field`: multipart files (bytes), a raw image body, or base64 JSON value(s)"""
+    files = request.files.getlist(field)
+    if files:
+        return [f.read() for f in files]
+    if _is_raw_image_body():
+        data = request.get_data(cache=False)
+        return [data] if data else []
+    value = request_fields().get(field)
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def get_request_image(field='image', reduce=1):
+    """Decode the single image sent under `field` (multipart file, raw image/* body or base64 JSON)"""
+    payloads = request_image_payloads(field)
+    if not payloads:
+        raise ValueError('No image data provided')
+    return decode_image(payloads[0], reduce)
 
 def encode_image_to_base64(image):
     """Encode OpenCV image to base64 string"""
@@ -47,59 +96,49 @@ def encode_image_to_base64(image):
         raise ValueError(f"Failed to encode image: {str(e)}")
 
 def is_internal_network(ip_address):
-    """Check if IP address is from internal network"""
-    internal_ranges = [
-        '192.168.',
-        '10.',
-        '172.16.',
-        '172.17.',
-        '172.18.',
-        '172.19.',
-        '172.20.',
-        '172.21.',
-        '172.22.',
-        '172.23.',
-        '172.24.',
-        '172.25.',
-        '172.26.',
-        '172.27.',
-        '172.28.',
-        '172.29.',
-        '172.30.',
-        '172.31.',
-        '127.0.0.1',
-        'localhost'
-    ]
-    
-    return any(ip_address.startswith(range_) for range_ in internal_ranges)
+    """Check if IP address is from internal network (same ranges as the network middleware)"""
+    from ..middleware.network_detection import network_detector
+    return network_detector.is_internal_network(ip_address)
 
 def get_client_ip():
     """Get client IP address from request"""
-    if request.environ.get('HTTP_X_FORWARDED_FOR') is None:
-        return request.environ['REMOTE_ADDR']
-    else:
-        return request.environ['HTTP_X_FORWARDED_FOR']
+    from ..middleware.network_detection import network_detector
+    return network_detector.get_client_ip()
+
+def _resolve_principal(current_user_id, missing_status=401):
+    """Attach the cached principal to g; returns an error response for unknown or disabled users"""
+    from .principal import attach_principal
+    
+    try:
+        principal = attach_principal(current_user_id)
+    except Exception as e:
+        return jsonify({'error': f'Authorization failed: {str(e)}'}), 500
+    if principal is None:
+        return jsonify({'error': 'User not found'}), missing_status
+    if not principal.is_active:
+        return jsonify({'error': 'Account is disabled'}), 403
+    return None
 
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
+        from .principal import decode_request_token
         
         try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
-            data = jwt.decode(token, current_app.config.get('JWT_SECRET_KEY', current_app.config['SECRET_KEY']), algorithms=['HS256'])
-            current_user_id = data['user_id']
+            current_user_id = decode_request_token()
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Token is invalid'}), 401
         
+        if current_user_id is None:
+            return jsonify({'error': 'Token is missing'}), 401
+        
+        denied = _resolve_principal(current_user_id)
+        if denied:
+            return denied
+        
         return f(current_user_id, *args, **kwargs)
     
     return decorated
@@ -108,41 +147,28 @@ def require_admin(f):
     """Decorator to require admin role"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        from .database import get_db_cursor
-        
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
+        from .principal import decode_request_token
         
         try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
-            data = jwt.decode(token, current_app.config.get('JWT_SECRET_KEY', current_app.config['SECRET_KEY']), algorithms=['HS256'])
-            current_user_id = data['user_id']
-            
-            # Check if user is admin
-            with get_db_cursor() as cursor:
-                cursor.execute("SELECT role FROM users WHERE id = %s", (current_user_id,))
-                result = cursor.fetchone()
-                
-                if not result:
-                    return jsonify({'error': 'User not found'}), 404
-                
-                user_role = result[0]
-                if user_role != 'admin':
-                    return jsonify({
-                        'error': 'Admin access required',
-                        'message': 'Only administrators can perform this action'
-                    }), 403
-                    
+            current_user_id = decode_request_token()
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Token is invalid'}), 401
-        except Exception as e:
-            return jsonify({'error': f'Authorization failed: {str(e)}'}), 500
+        
+        if current_user_id is None:
+            return jsonify({'error': 'Token is missing'}), 401
+        
+        # Role comes from the principal cache instead of a query per request
+        denied = _resolve_principal(current_user_id, missing_status=404)
+        if denied:
+            return denied
+        
+        if not g.principal.is_admin:
+            return jsonify({
+                'error': 'Admin access required',
+                'message': 'Only administrators can perform this action'
+            }), 403
         
         return f(current_user_id, *args, **kwargs)
     
@@ -152,12 +178,14 @@ def require_internal_network(f):
     """Decorator to require internal network access"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        client_ip = get_client_ip()
+        if not hasattr(g, 'network_info'):
+            from ..middleware.network_detection import detect_network
+            detect_network()
         
-        if not is_internal_network(client_ip):
+        if not g.is_internal_network:
             return jsonify({
                 'error': 'Access denied. Internal network required.',
-                'client_ip': client_ip
+                'client_ip': g.client_ip
             }), 403
         
         return f(*args, **kwargs)
@@ -180,28 +208,27 @@ def require_external_auth(f):
             return f(*args, **kwargs)
         
         # If external network, require authentication
-        token = request.headers.get('Authorization')
+        from .principal import decode_request_token
+        
+        try:
+            current_user_id = decode_request_token()
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Token is invalid'}), 401
         
-        if not token:
+        if current_user_id is None:
             return jsonify({
                 'error': 'Authentication required for external network access',
                 'message': 'Please provide valid JWT token',
                 'network_type': 'external'
             }), 401
         
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
-            data = jwt.decode(token, current_app.config.get('JWT_SECRET_KEY', current_app.config['SECRET_KEY']), algorithms=['HS256'])
-            current_user_id = data['user_id']
-            
-            return f(current_user_id, *args, **kwargs)
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token is invalid'}), 401
+        denied = _resolve_principal(current_user_id)
+        if denied:
+            return denied
+        
+        return f(current_user_id, *args, **kwargs)
     
     return decorated
 
@@ -247,9 +274,16 @@ def external_network_limited_auth(f):
             return f(*args, **kwargs)
         
         # External network - require authentication for limited features
-        token = request.headers.get('Authorization')
+        from .principal import decode_request_token
+        
+        try:
+            current_user_id = decode_request_token()
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Token is invalid'}), 401
         
-        if not token:
+        if current_user_id is None:
             return jsonify({
                 'error': 'Authentication required for external network access',
                 'message': 'External network requires login for limited features only.',
@@ -258,35 +292,20 @@ def external_network_limited_auth(f):
                 'available_features': ['leave_requests', 'attendance_history', 'reports']
             }), 401
         
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
-            data = jwt.decode(token, current_app.config.get('JWT_SECRET_KEY', current_app.config['SECRET_KEY']), algorithms=['HS256'])
-            current_user_id = data['user_id']
-            
-            # Pass user_id as first argument for external network users
-            return f(current_user_id, *args, **kwargs)
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token is invalid'}), 401
+        denied = _resolve_principal(current_user_id)
+        if denied:
+            return denied
+        
+        # Pass user_id as first argument for external network users
+        return f(current_user_id, *args, **kwargs)
     
     return decorated
 
 def log_activity(level, message, module=None):
-    """Log activity to database"""
-    from .database import get_db_cursor
+    """Log activity to database (queued; written in batches by a background thread)"""
+    from .activity_log import get_activity_log_writer
     
-    try:
-        with get_db_cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO logs (level, message, module) VALUES (%s, %s, %s)",
-                (level, message, module)
-            )
-    except Exception:
-        pass  # Silent fail for logging
+    get_activity_log_writer().log(level, message, module)
 
 def json_serial(obj):
     """JSON serializer for objects not serializable by default json code"""
@@ -0,0 +1,3 @@
+# Face encoding module
+from .encoder import FaceEncoder, get_face_encoder, NoFaceDetectedError, MultipleFacesError
+from .frame import FaceFrame
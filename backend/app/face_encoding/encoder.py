@@ -0,0 +1,300 @@
+# Module encode khuôn mặt dùng chung
+# Một đường xử lý duy nhất: thu nhỏ ảnh, phát hiện khuôn mặt trên bản thu nhỏ,
+# ánh xạ box về độ phân giải gốc rồi chỉ encode vùng khuôn mặt (ROI)
+# Mọi API (đăng nhập, chấm công, đăng ký) đều gọi qua FaceEncoder để tinh chỉnh và đo đạc ở một chỗ
+
+import threading
+import time
+import cv2
+import dlib
+import face_recognition
+from ..config.settings import Config
+from .frame import FaceFrame, downscale
+
+
+class NoFaceDetectedError(ValueError):
+    pass
+
+
+class MultipleFacesError(ValueError):
+    pass
+
+
+class FaceEncoder:
+    """Detect faces and compute encodings with one configurable, instrumented pipeline"""
+
+    STAGES = ('prescale', 'detect', 'encode')
+
+    # Chấm điểm chất lượng khuôn mặt (dùng để chọn frame tốt nhất trong một loạt ảnh)
+    QUALITY_WEIGHTS = {'size': 0.3, 'sharpness': 0.4, 'confidence': 0.3}
+    QUALITY_FULL_SIZE = 160          # cạnh box (px) được coi là đủ lớn
+    QUALITY_FULL_SHARPNESS = 300.0   # phương sai Laplacian trên crop 128x128 được coi là đủ nét
+    QUALITY_FULL_CONFIDENCE = {'hog': 2.0, 'cnn': 1.0}
+    QUALITY_CROP_SIZE = 128
+
+    def __init__(self, detection_model=None, upsample=None, encoding_model=None, num_jitters=None, max_dimension=None,
+                 detection_max_dimension=None, roi_margin=None):
+        self.detection_model = detection_model or Config.FACE_DETECTION_MODEL      # 'hog' hoặc 'cnn'
+        self.upsample = Config.FACE_DETECTION_UPSAMPLE if upsample is None else upsample
+        self.encoding_model = encoding_model or Config.FACE_ENCODING_MODEL         # 'small' hoặc 'large'
+        self.num_jitters = Config.FACE_ENCODING_JITTERS if num_jitters is None else num_jitters
+        # Cạnh dài tối đa của ảnh trước khi xử lý (0 = giữ nguyên kích thước)
+        self.max_dimension = Config.FACE_MAX_IMAGE_DIMENSION if max_dimension is None else max_dimension
+        # Cạnh dài của bản thu nhỏ dùng để phát hiện khuôn mặt (0 = phát hiện trên ảnh đầy đủ)
+        self.detection_max_dimension = (Config.FACE_DETECTION_MAX_DIMENSION
+                                        if detection_max_dimension is None else detection_max_dimension)
+        # Lề thêm quanh box khi cắt ROI, tính theo tỉ lệ kích thước box
+        self.roi_margin = Config.FACE_ROI_MARGIN if roi_margin is None else roi_margin
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.reset_stats()
+
+    # ------------------------------------------------------------------
+    # Instrumentation
+    # ------------------------------------------------------------------
+    def reset_stats(self):
+        with self._stats_lock:
+            self._calls = 0
+            self._no_face = 0
+            self._stage_seconds = dict.fromkeys(self.STAGES, 0.0)
+
+    def _record(self, timings, found):
+        with self._stats_lock:
+            self._calls += 1
+            if not found:
+                self._no_face += 1
+            for stage, seconds in timings.items():
+                self._stage_seconds[stage] += seconds
+
+    def stats(self):
+        """Call count and average milliseconds per stage"""
+        with self._stats_lock:
+            calls = self._calls
+            return {
+                'calls': calls,
+                'no_face': self._no_face,
+                'avg_ms': {
+                    stage: round(seconds * 1000 / calls, 3) if calls else 0.0
+                    for stage, seconds in self._stage_seconds.items()
+                },
+                'config': {
+                    'detection_model': self.detection_model,
+                    'upsample': self.upsample,
+                    'encoding_model': self.encoding_model,
+                    'num_jitters': self.num_jitters,
+                    'max_dimension': self.max_dimension,
+                    'detection_max_dimension': self.detection_max_dimension,
+                    'roi_margin': self.roi_margin
+                }
+            }
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+    _downscale = staticmethod(downscale)
+
+    @staticmethod
+    def _scale_box(box, scale, shape):
+        """Ánh xạ box (top, right, bottom, left) về ảnh có kích thước `shape`, giới hạn trong biên ảnh"""
+        height, width = shape[:2]
+        top, right, bottom, left = (int(round(v / scale)) for v in box)
+        return max(top, 0), min(right, width), min(bottom, height), max(left, 0)
+
+    @staticmethod
+    def _box_area(box):
+        top, right, bottom, left = box
+        return (bottom - top) * (right - left)
+
+    def _roi(self, box, shape):
+        """Vùng cắt quanh box (có lề) để landmark/encoding không phải đụng tới cả khung hình"""
+        height, width = shape[:2]
+        top, right, bottom, left = box
+        pad_y = int((bottom - top) * self.roi_margin)
+        pad_x = int((right - left) * self.roi_margin)
+        return max(top - pad_y, 0), min(right + pad_x, width), min(bottom + pad_y, height), max(left - pad_x, 0)
+
+    @staticmethod
+    def _rect_to_box(rect, shape):
+        height, width = shape[:2]
+        return max(rect.top(), 0), min(rect.right(), width), min(rect.bottom(), height), max(rect.left(), 0)
+
+    def _detector(self):
+        """dlib face detector (HOG hoặc CNN) của thread hiện tại
+
+        Detector của dlib không an toàn khi nhiều thread request gọi đồng thời, còn detector dùng chung
+        của face_recognition là biến toàn cục; mỗi thread giữ một instance riêng thay vì dùng lock
+        """
+        detector = getattr(self._local, 'detector', None)
+        if detector is None:
+            if self.detection_model == 'cnn':
+                import face_recognition_models
+                detector = dlib.cnn_face_detection_model_v1(face_recognition_models.cnn_face_detector_model_location())
+            else:
+                detector = dlib.get_frontal_face_detector()
+            self._local.detector = detector
+        return detector
+
+    def detect_scored(self, image):
+        """(box, detector score) for each face in `image` coordinates, detected on a downscaled copy
+
+        Cùng mô hình dlib với face_recognition.face_locations nhưng mỗi thread một detector và giữ lại điểm tin cậy
+        """
+        small, scale = self._downscale(image, self.detection_max_dimension)
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        if self.detection_model == 'cnn':
+            detections = self._detector()(rgb_small, self.upsample)
+            scored = [(self._rect_to_box(d.rect, rgb_small.shape), float(d.confidence)) for d in detections]
+        else:
+            rects, scores, _ = self._detector().run(rgb_small, self.upsample, 0.0)
+            scored = [(self._rect_to_box(rect, rgb_small.shape), float(score)) for rect, score in zip(rects, scores)]
+        if scale == 1.0:
+            return scored
+        return [(self._scale_box(box, scale, image.shape), score) for box, score in scored]
+
+    def detect(self, image):
+        """Face boxes (top, right, bottom, left) in `image` coordinates, detected on a downscaled copy"""
+        return [box for box, _ in self.detect_scored(image)]
+
+    def _detections(self, frame):
+        """(ảnh làm việc, scale, [(box, score)] theo toạ độ ảnh làm việc); detection được cache trên frame"""
+        working, scale = frame.scaled(self.max_dimension)
+        key = ('faces', self.detection_model, self.upsample, self.detection_max_dimension, self.max_dimension)
+        return working, scale, frame.cached(key, lambda: self.detect_scored(working))
+
+    def face_boxes(self, image):
+        """(box, score) for every face in original image coordinates
+
+        Accepts a BGR array or a FaceFrame; with a FaceFrame the detection is shared with later encode() calls
+        """
+        frame = FaceFrame.of(image)
+        _, scale, detections = self._detections(frame)
+        if scale == 1.0:
+            return list(detections)
+        return [(self._scale_box(box, scale, frame.shape), score) for box, score in detections]
+
+    def face_quality(self, image, box, score):
+        """Điểm chất lượng 0..1 từ kích thước box, độ nét (Laplacian) và điểm tin cậy của detector"""
+        top, right, bottom, left = box
+        side = min(bottom - top, right - left)
+        if side <= 0:
+            return {'score': 0.0, 'size': 0.0, 'sharpness': 0.0, 'confidence': 0.0}
+
+        gray = cv2.cvtColor(image[top:bottom, left:right], cv2.COLOR_BGR2GRAY)
+        # Chuẩn hoá kích thước crop để độ nét so sánh được giữa các box to/nhỏ
+        gray = cv2.resize(gray, (self.QUALITY_CROP_SIZE, self.QUALITY_CROP_SIZE), interpolation=cv2.INTER_AREA)
+        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+        components = {
+            'size': min(side / self.QUALITY_FULL_SIZE, 1.0),
+            'sharpness': min(sharpness / self.QUALITY_FULL_SHARPNESS, 1.0),
+            'confidence': min(max(score, 0.0) / self.QUALITY_FULL_CONFIDENCE.get(self.detection_model, 1.0), 1.0)
+        }
+        components['score'] = sum(weight * components[name] for name, weight in self.QUALITY_WEIGHTS.items())
+        return {name: round(float(value), 4) for name, value in components.items()}
+
+    def _encode_box(self, image, box):
+        roi_top, roi_right, roi_bottom, roi_left = self._roi(box, image.shape)
+        crop = cv2.cvtColor(image[roi_top:roi_bottom, roi_left:roi_right], cv2.COLOR_BGR2RGB)
+        top, right, bottom, left = box
+        local_box = (top - roi_top, right - roi_left, bottom - roi_top, left - roi_left)
+        encodings = face_recognition.face_encodings(
+            crop, known_face_locations=[local_box], num_jitters=self.num_jitters, model=self.encoding_model
+        )
+        return encodings[0] if encodings else None
+
+    def _run(self, image, single_face=False, all_faces=False):
+        """Hot path dùng chung; trả về list (box theo toạ độ ảnh gốc, encoding)"""
+        timings = {}
+        frame = FaceFrame.of(image)
+        start = time.perf_counter()
+        working, scale = frame.scaled(self.max_dimension)
+        timings['prescale'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, _, detections = self._detections(frame)
+        boxes = [box for box, _ in detections]
+        timings['detect'] = time.perf_counter() - start
+
+        if not boxes:
+            self._record(timings, found=False)
+            raise NoFaceDetectedError('No face detected in image')
+        if single_face and len(boxes) > 1:
+            self._record(timings, found=True)
+            raise MultipleFacesError('Multiple faces detected. Please ensure only one face is visible.')
+
+        # Chỉ encode khuôn mặt lớn nhất khi không cần tất cả (encode là bước tốn nhất)
+        if not all_faces:
+            boxes = [max(boxes, key=self._box_area)]
+
+        start = time.perf_counter()
+        results = []
+        for box in boxes:
+            encoding = self._encode_box(working, box)
+            if encoding is not None:
+                original_box = box if scale == 1.0 else self._scale_box(box, scale, frame.shape)
+                results.append((original_box, encoding))
+        timings['encode'] = time.perf_counter() - start
+        self._record(timings, found=True)
+
+        if not results:
+            raise NoFaceDetectedError('Could not extract face encoding')
+        return results
+
+    def encode_best(self, images):
+        """Detect faces in every frame of a burst and encode only the best-quality one
+
+        Returns (encoding, info) with the frame index, box and quality components of the chosen face
+        """
+        timings = dict.fromkeys(self.STAGES, 0.0)
+        best = None
+        for frame_index, image in enumerate(images):
+            start = time.perf_counter()
+            working, scale = self._downscale(image, self.max_dimension)
+            timings['prescale'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for box, score in self.detect_scored(working):
+                quality = self.face_quality(working, box, score)
+                if best is None or quality['score'] > best[0]['score']:
+                    best = (quality, frame_index, working, scale, box)
+            timings['detect'] += time.perf_counter() - start
+
+        if best is None:
+            self._record(timings, found=False)
+            raise NoFaceDetectedError('No face detected in any frame')
+
+        quality, frame_index, working, scale, box = best
+        start = time.perf_counter()
+        encoding = self._encode_box(working, box)
+        timings['encode'] = time.perf_counter() - start
+        self._record(timings, found=True)
+
+        if encoding is None:
+            raise NoFaceDetectedError('Could not extract face encoding')
+        original_box = box if scale == 1.0 else self._scale_box(box, scale, images[frame_index].shape)
+        return encoding, {'frame_index': frame_index, 'box': original_box, 'quality': quality}
+
+    def encode(self, image, single_face=False):
+        """Encoding of the largest face in a BGR image (or FaceFrame)
+
+        Raises NoFaceDetectedError, or MultipleFacesError when single_face is set and several faces are visible
+        """
+        return self._run(image, single_face=single_face)[0][1]
+
+    def encode_all(self, image):
+        """(box, encoding) for every face in a BGR image (or FaceFrame); boxes are (top, right, bottom, left)"""
+        return self._run(image, all_faces=True)
+
+
+# Singleton instance
+_face_encoder = None
+_face_encoder_lock = threading.Lock()
+
+def get_face_encoder():
+    """Lấy instance của FaceEncoder dùng chung"""
+    global _face_encoder
+    if _face_encoder is None:
+        with _face_encoder_lock:
+            if _face_encoder is None:
+                _face_encoder = FaceEncoder()
+    return _face_encoder
@@ -0,0 +1,62 @@
+# Ngữ cảnh ảnh của một request
+# Giữ ảnh đã giải mã cùng các kết quả dẫn xuất (ảnh xám, RGB, bản thu nhỏ, box, landmark)
+# để liveness và encoding trong cùng một lượt chấm công không phải phát hiện khuôn mặt hai lần
+
+import cv2
+
+
+def downscale(image, max_dimension):
+    """Thu nhỏ ảnh nếu cạnh dài vượt max_dimension; trả về (ảnh, hệ số scale)"""
+    height, width = image.shape[:2]
+    if not max_dimension or max(height, width) <= max_dimension:
+        return image, 1.0
+    scale = max_dimension / float(max(height, width))
+    resized = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+
+class FaceFrame:
+    """A decoded BGR image plus lazily computed views and detection results
+
+    Every derived value is computed at most once; a FaceFrame lives for one request and is not thread-safe.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self._gray = None
+        self._rgb = None
+        self._scaled = {}
+        self._cache = {}
+
+    @classmethod
+    def of(cls, image):
+        """Wrap a BGR array, or return `image` unchanged if it already is a FaceFrame"""
+        return image if isinstance(image, cls) else cls(image)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    def scaled(self, max_dimension):
+        """(ảnh, hệ số scale) với cạnh dài tối đa max_dimension, cache theo kích thước"""
+        if max_dimension not in self._scaled:
+            self._scaled[max_dimension] = downscale(self.image, max_dimension)
+        return self._scaled[max_dimension]
+
+    def cached(self, key, compute):
+        """Kết quả của compute() lưu theo `key` (vd. box theo cấu hình detector, landmark)"""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
@@ -0,0 +1,5 @@
+# Face gallery module
+from .gallery import FaceGallery, get_face_gallery
+from .events import FaceChangeEvent, face_change_bus, publish_face_change
+from .codec import encode_embedding, decode_embedding, load_embedding
+from .index import FaceIndex, FlatIndex, IVFIndex, create_index, load_index
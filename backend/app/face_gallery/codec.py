@@ -0,0 +1,79 @@
+# Face embedding binary codec
+# Định dạng: header 6 byte (magic, version, dtype, dim) + dữ liệu float little-endian thô
+#
+#   offset  size  field
+#   0       2     magic b'FE'
+#   2       1     version (1)
+#   3       1     dtype code (1 = float32, 2 = float64)
+#   4       2     dim (uint16, little-endian)
+#   6       ...   dim * itemsize bytes
+
+import ast
+import json
+import struct
+import numpy as np
+
+MAGIC = b'FE'
+VERSION = 1
+HEADER = struct.Struct('<2sBBH')
+HEADER_SIZE = HEADER.size
+
+DTYPE_CODES = {1: np.dtype('<f4'), 2: np.dtype('<f8')}
+FLOAT32 = 1
+
+ENCODING_DIM = 128
+
+
+def encode_embedding(embedding):
+    """Encode a face embedding to the versioned binary format (always float32)"""
+    vector = np.ascontiguousarray(embedding, dtype='<f4').reshape(-1)
+    return HEADER.pack(MAGIC, VERSION, FLOAT32, vector.shape[0]) + vector.tobytes()
+
+
+def is_binary_embedding(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == MAGIC
+
+
+def decode_embedding(data):
+    """Decode a binary embedding without copying (read-only view over `data`)"""
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Embedding data too short")
+    magic, version, dtype_code, dim = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a binary face embedding")
+    if version != VERSION:
+        raise ValueError(f"Unsupported embedding version: {version}")
+    dtype = DTYPE_CODES.get(dtype_code)
+    if dtype is None:
+        raise ValueError(f"Unsupported embedding dtype code: {dtype_code}")
+    if len(data) != HEADER_SIZE + dim * dtype.itemsize:
+        raise ValueError("Embedding length does not match header")
+    return np.frombuffer(data, dtype=dtype, count=dim, offset=HEADER_SIZE)
+
+
+def parse_legacy_encoding(text):
+    """Parse a legacy TEXT face_encoding (JSON or Python list literal)"""
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        text = bytes(text).decode('utf-8')
+    try:
+        values = json.loads(text)
+    except ValueError:
+        values = ast.literal_eval(text)
+    return np.asarray(values, dtype=np.float32)
+
+
+def load_embedding(embedding_blob, legacy_text=None, dim=ENCODING_DIM):
+    """Single reader entry point for stored embeddings
+
+    Prefer the binary `face_embedding` column and fall back to the legacy
+    `face_encoding` text for rows that have not been migrated yet.
+    """
+    if embedding_blob is not None:
+        vector = decode_embedding(embedding_blob)
+    elif legacy_text is not None:
+        vector = parse_legacy_encoding(legacy_text)
+    else:
+        raise ValueError("Face row has no stored embedding")
+    if vector.shape != (dim,):
+        raise ValueError(f"Invalid face encoding shape: {vector.shape}")
+    return vector
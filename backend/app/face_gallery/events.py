@@ -0,0 +1,68 @@
+# Face change notifications
+# In-process bus cho các thay đổi bảng faces/users; worker khác đồng bộ qua watermark DB
+
+import threading
+from flask import after_this_request, has_request_context
+
+FACE_EVENT_KINDS = ('face_added', 'face_removed', 'user_updated', 'user_removed')
+
+
+class FaceChangeEvent:
+    """A single add/remove/deactivate delta for the face gallery"""
+
+    __slots__ = ('kind', 'user_id', 'face_id')
+
+    def __init__(self, kind, user_id, face_id=None):
+        if kind not in FACE_EVENT_KINDS:
+            raise ValueError(f"Unknown face change event: {kind}")
+        self.kind = kind
+        self.user_id = int(user_id)
+        self.face_id = int(face_id) if face_id is not None else None
+
+    def __repr__(self):
+        return f"FaceChangeEvent({self.kind!r}, user_id={self.user_id}, face_id={self.face_id})"
+
+
+class FaceChangeBus:
+    """Synchronous in-process publish/subscribe bus"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Face change subscriber failed for {event}: {e}")
+
+
+# Global bus instance
+face_change_bus = FaceChangeBus()
+
+
+def publish_face_change(kind, user_id, face_id=None):
+    """Publish a face change once the current request (and its DB transaction) has finished"""
+    event = FaceChangeEvent(kind, user_id, face_id)
+    if not has_request_context():
+        face_change_bus.publish(event)
+        return
+
+    @after_this_request
+    def _publish(response):
+        if response.status_code < 400:
+            face_change_bus.publish(event)
+        return response
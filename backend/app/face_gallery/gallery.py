@@ -0,0 +1,493 @@
+# Module gallery khuôn mặt dùng chung trong tiến trình
+# Giữ toàn bộ encoding đang hoạt động trong một ma trận float32 liên tục
+# để so khớp 1:N bằng một phép tính vector hóa duy nhất
+
+import os
+import threading
+import time
+import numpy as np
+from ..core.database import get_db_cursor
+from ..config.settings import Config
+from .codec import load_embedding, ENCODING_DIM
+from .index import create_index, load_index, top_k
+
+GALLERY_COLUMNS = """
+    SELECT f.id, f.face_embedding, f.face_encoding, u.id, u.username, u.full_name, u.email, u.role,
+           u.employee_id, u.department, u.position, u.allow_face_only
+    FROM faces f
+    JOIN users u ON f.user_id = u.id
+    WHERE u.is_active = true AND f.is_active = true
+"""
+
+WATERMARK_QUERY = """
+    SELECT
+        (SELECT MAX(updated_at) FROM faces),
+        (SELECT MAX(updated_at) FROM users),
+        (SELECT COUNT(*) FROM faces f JOIN users u ON f.user_id = u.id
+         WHERE u.is_active = true AND f.is_active = true)
+"""
+
+USER_FIELDS = ('username', 'full_name', 'email', 'role', 'employee_id', 'department', 'position')
+
+
+class _Buffers:
+    """Preallocated gallery arrays; rows beyond `size` are spare capacity
+
+    Also used for the per-user centroid table (face_ids unused there)
+    """
+
+    def __init__(self, capacity, dim):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        # ||x||^2 tính sẵn; dòng đã xóa có giá trị inf nên không bao giờ được chọn
+        self.sq_norms = np.full(capacity, np.inf, dtype=np.float32)
+        self.face_ids = np.zeros(capacity, dtype=np.int64)
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.face_only = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self.sq_norms)
+
+    def grow(self, capacity):
+        grown = _Buffers(capacity, self.matrix.shape[1])
+        n = len(self)
+        grown.matrix[:n] = self.matrix
+        grown.sq_norms[:n] = self.sq_norms
+        grown.face_ids[:n] = self.face_ids
+        grown.user_ids[:n] = self.user_ids
+        grown.face_only[:n] = self.face_only
+        return grown
+
+
+class FaceGallery:
+    MIN_CAPACITY = 256
+    # Nén lại ma trận khi số dòng đã xóa vượt quá tỉ lệ này
+    COMPACT_RATIO = 0.25
+    # Build lại ANN index khi số dòng chưa được index vượt quá tỉ lệ này
+    INDEX_REBUILD_RATIO = 0.1
+    # Số ứng viên (còn hiệu lực, đúng bộ lọc face-only) cần lấy từ ANN index
+    INDEX_CANDIDATES = 10
+    # Lấy dư tối đa bấy nhiêu lần INDEX_CANDIDATES; vẫn chưa đủ thì chuyển sang lọc theo centroid
+    INDEX_OVERFETCH = 16
+    # Số user (theo centroid) được so khớp chi tiết trên từng mẫu ở bước 2
+    CENTROID_CANDIDATES = Config.FACE_CENTROID_CANDIDATES
+
+    def __init__(self, dim=ENCODING_DIM, poll_interval=None, index_type=None):
+        self.dim = dim
+        self.poll_interval = Config.FACE_GALLERY_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.index_type = index_type or Config.FACE_INDEX_TYPE
+        self.index_min_size = Config.FACE_INDEX_MIN_SIZE
+        self.index_path = Config.FACE_INDEX_PATH
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._index = None
+        self._index_faces = frozenset()
+        self._reset_rows()
+        self._users = {}
+        self._watermark = (None, None)
+        self._last_poll = 0.0
+        self._loaded = False
+
+    def _reset_rows(self, capacity=MIN_CAPACITY):
+        self._buffers = _Buffers(capacity, self.dim)
+        self._size = 0
+        self._tombstones = 0
+        self._rows_by_face = {}
+        self._rows_by_user = {}
+        # Các dòng mà ANN index chưa bao phủ; luôn được so khớp chính xác
+        self._unindexed = []
+        # Số face trong ANN index không còn trong gallery (đã xóa); vẫn chiếm chỗ trong kết quả search
+        self._index_missing = len(self._index_faces)
+        # Bảng centroid theo user: trung bình các mẫu của user, dùng cho bước lọc thô
+        self._centroids = _Buffers(self.MIN_CAPACITY, self.dim)
+        self._centroid_slots = 0
+        self._slot_by_user = {}
+        self._free_slots = []
+
+    # ------------------------------------------------------------------
+    # Row-level mutations (caller holds self._lock)
+    # ------------------------------------------------------------------
+    def _append_row(self, face_id, user_id, encoding, allow_face_only, update_centroid=True):
+        if face_id in self._rows_by_face:
+            self._remove_row(self._rows_by_face[face_id])
+        if self._size == len(self._buffers):
+            self._buffers = self._buffers.grow(max(self.MIN_CAPACITY, 2 * len(self._buffers)))
+        buf = self._buffers
+        row = self._size
+        buf.matrix[row] = encoding
+        buf.face_ids[row] = face_id
+        buf.user_ids[row] = user_id
+        buf.face_only[row] = bool(allow_face_only)
+        # Ghi sq_norms sau cùng để query đồng thời không thấy dòng dở dang
+        buf.sq_norms[row] = np.dot(encoding, encoding)
+        self._size += 1
+        self._rows_by_face[face_id] = row
+        self._rows_by_user.setdefault(user_id, set()).add(row)
+        if self._index is not None:
+            if face_id in self._index_faces:
+                self._index_missing -= 1
+            else:
+                self._unindexed.append(row)
+        if update_centroid:
+            self._update_centroid(user_id)
+
+    def _remove_row(self, row):
+        buf = self._buffers
+        buf.sq_norms[row] = np.inf
+        face_id = int(buf.face_ids[row])
+        user_id = int(buf.user_ids[row])
+        self._rows_by_face.pop(face_id, None)
+        if face_id in self._index_faces:
+            self._index_missing += 1
+        rows = self._rows_by_user.get(user_id)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self._rows_by_user[user_id]
+                self._users.pop(user_id, None)
+        self._tombstones += 1
+        self._update_centroid(user_id)
+
+    def _update_centroid(self, user_id):
+        rows = self._rows_by_user.get(user_id)
+        slot = self._slot_by_user.get(user_id)
+        cents = self._centroids
+        if not rows:
+            if slot is not None:
+                cents.sq_norms[slot] = np.inf
+                del self._slot_by_user[user_id]
+                self._free_slots.append(slot)
+            return
+
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                if self._centroid_slots == len(cents):
+                    self._centroids = cents = cents.grow(2 * len(cents))
+                slot = self._centroid_slots
+                self._centroid_slots += 1
+            self._slot_by_user[user_id] = slot
+
+        samples = list(rows)
+        centroid = self._buffers.matrix[samples].mean(axis=0)
+        cents.matrix[slot] = centroid
+        cents.user_ids[slot] = user_id
+        cents.face_only[slot] = self._buffers.face_only[samples[0]]
+        cents.sq_norms[slot] = np.dot(centroid, centroid)
+
+    def _compact_if_needed(self):
+        if self._tombstones <= max(self.MIN_CAPACITY // 4, self.COMPACT_RATIO * self._size):
+            return
+        old = self._buffers
+        live = np.flatnonzero(np.isfinite(old.sq_norms[:self._size]))
+        self._reset_rows(max(self.MIN_CAPACITY, 2 * len(live)))
+        for row in live:
+            self._append_row(int(old.face_ids[row]), int(old.user_ids[row]), old.matrix[row], old.face_only[row],
+                             update_centroid=False)
+        for user_id in self._rows_by_user:
+            self._update_centroid(user_id)
+
+    def _apply_db_rows(self, db_rows):
+        touched = set()
+        for face_id, embedding_blob, legacy_text, user_id, *user_data in db_rows:
+            try:
+                encoding = load_embedding(embedding_blob, legacy_text, self.dim)
+            except Exception as e:
+                print(f"Error processing face encoding {face_id} for user {user_id}: {e}")
+                continue
+            self._append_row(face_id, user_id, encoding, user_data[-1], update_centroid=False)
+            self._users[user_id] = dict(zip(USER_FIELDS, user_data[:-1]), user_id=user_id)
+            touched.add(user_id)
+        for user_id in touched:
+            self._update_centroid(user_id)
+
+    def _drop_user(self, user_id):
+        for row in list(self._rows_by_user.get(user_id, ())):
+            self._remove_row(row)
+        self._users.pop(user_id, None)
+
+    def _attach_index(self, index):
+        self._index = index
+        self._index_faces = frozenset(index.ids.tolist()) if index is not None else frozenset()
+        self._unindexed = []
+        if index is not None:
+            self._unindexed = [row for face_id, row in self._rows_by_face.items() if face_id not in self._index_faces]
+        self._index_missing = sum(1 for face_id in self._index_faces if face_id not in self._rows_by_face)
+
+    # ------------------------------------------------------------------
+    # Approximate nearest-neighbour index
+    # ------------------------------------------------------------------
+    def _build_index(self):
+        with self._lock:
+            rows = np.fromiter(self._rows_by_face.values(), dtype=np.int64)
+            vectors = self._buffers.matrix[rows]
+            face_ids = self._buffers.face_ids[rows]
+        index = create_index(
+            self.index_type, self.dim,
+            nlist=Config.FACE_INDEX_NLIST or None,
+            nprobe=Config.FACE_INDEX_NPROBE
+        ).build(vectors, face_ids)
+        if self.index_path:
+            try:
+                index.save(self.index_path)
+            except OSError as e:
+                print(f"Failed to save face index to {self.index_path}: {e}")
+        return index
+
+    def _load_saved_index(self):
+        if not self.index_path or not os.path.isdir(self.index_path):
+            return None
+        try:
+            index = load_index(self.index_path)
+        except Exception as e:
+            print(f"Failed to load face index from {self.index_path}: {e}")
+            return None
+        if index.kind != self.index_type or index.dim != self.dim:
+            return None
+        index.nprobe = Config.FACE_INDEX_NPROBE
+        return index
+
+    def update_index(self):
+        """Attach, load or rebuild the ANN index according to the gallery size"""
+        if self.index_type == 'flat':
+            return
+        with self._lock:
+            live = self._size - self._tombstones
+        if live < self.index_min_size:
+            if self._index is not None:
+                with self._lock:
+                    self._attach_index(None)
+            return
+
+        if self._index is None:
+            index = self._load_saved_index()
+            if index is not None:
+                with self._lock:
+                    self._attach_index(index)
+
+        index = self._index
+        # Dòng mới chưa index và face đã xóa còn trong index đều tính vào ngưỡng build lại
+        if index is None or len(self._unindexed) + self._index_missing > self.INDEX_REBUILD_RATIO * len(index):
+            index = self._build_index()
+            with self._lock:
+                self._attach_index(index)
+
+    # ------------------------------------------------------------------
+    # Loading and delta synchronisation
+    # ------------------------------------------------------------------
+    def load(self):
+        """Load every active face encoding from the database"""
+        with get_db_cursor() as cursor:
+            cursor.execute(WATERMARK_QUERY)
+            faces_mark, users_mark, _ = cursor.fetchone()
+            cursor.execute(GALLERY_COLUMNS)
+            db_rows = cursor.fetchall()
+
+        with self._lock:
+            self._reset_rows(max(self.MIN_CAPACITY, 2 * len(db_rows)))
+            self._users = {}
+            self._apply_db_rows(db_rows)
+            self._watermark = (faces_mark, users_mark)
+            self._last_poll = time.monotonic()
+            self._loaded = True
+        try:
+            self.update_index()
+        except Exception as e:
+            print(f"Face index update failed, using exact search: {e}")
+        return self._size - self._tombstones
+
+    def refresh_users(self, user_ids):
+        """Re-read the active faces of the given users (add/update/deactivate delta)"""
+        user_ids = list({int(u) for u in user_ids})
+        if not user_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        with get_db_cursor() as cursor:
+            cursor.execute(GALLERY_COLUMNS + f" AND u.id IN ({placeholders})", user_ids)
+            db_rows = cursor.fetchall()
+        with self._lock:
+            for user_id in user_ids:
+                self._drop_user(user_id)
+            self._apply_db_rows(db_rows)
+            self._compact_if_needed()
+
+    def remove_faces(self, face_ids):
+        with self._lock:
+            for face_id in face_ids:
+                row = self._rows_by_face.get(face_id)
+                if row is not None:
+                    self._remove_row(row)
+            self._compact_if_needed()
+
+    def remove_users(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._drop_user(user_id)
+            self._compact_if_needed()
+
+    def apply_event(self, event):
+        """Apply one change event published by the enrollment/admin endpoints"""
+        if not self._loaded:
+            return  # Lần query tới sẽ load toàn bộ
+        if event.kind == 'face_removed' and event.face_id is not None:
+            self.remove_faces([event.face_id])
+        elif event.kind == 'user_removed':
+            self.remove_users([event.user_id])
+        else:
+            self.refresh_users([event.user_id])
+
+    def poll_changes(self):
+        """Pick up changes written by other workers since the last DB watermark"""
+        with get_db_cursor() as cursor:
+            cursor.execute(WATERMARK_QUERY)
+            faces_mark, users_mark, active_count = cursor.fetchone()
+            last_faces, last_users = self._watermark
+
+            changed_users = set()
+            if faces_mark is not None and (last_faces is None or faces_mark > last_faces):
+                cursor.execute(
+                    "SELECT DISTINCT user_id FROM faces WHERE updated_at >= %s",
+                    (last_faces or faces_mark,)
+                )
+                changed_users.update(row[0] for row in cursor.fetchall())
+            if users_mark is not None and (last_users is None or users_mark > last_users):
+                cursor.execute(
+                    "SELECT id FROM users WHERE updated_at >= %s",
+                    (last_users or users_mark,)
+                )
+                changed_users.update(row[0] for row in cursor.fetchall())
+
+        self.refresh_users(changed_users)
+
+        # Xóa cứng (DELETE) không để lại updated_at; đối chiếu số dòng để phát hiện
+        with self._lock:
+            local_count = self._size - self._tombstones
+            self._watermark = (faces_mark, users_mark)
+            self._last_poll = time.monotonic()
+        if local_count != active_count:
+            self._reconcile()
+        self.update_index()
+
+    def _reconcile(self):
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT f.id, f.user_id FROM faces f JOIN users u ON f.user_id = u.id
+                WHERE u.is_active = true AND f.is_active = true
+            """)
+            active = dict(cursor.fetchall())
+        with self._lock:
+            stale = [face_id for face_id in self._rows_by_face if face_id not in active]
+            missing_users = {active[face_id] for face_id in active if face_id not in self._rows_by_face}
+        self.remove_faces(stale)
+        self.refresh_users(missing_users)
+
+    def invalidate(self):
+        """Force a full reload on the next query"""
+        with self._lock:
+            self._loaded = False
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+        elif time.monotonic() - self._last_poll >= self.poll_interval:
+            # Chỉ một thread poll; các request khác dùng dữ liệu hiện có
+            if self._poll_lock.acquire(blocking=False):
+                try:
+                    self.poll_changes()
+                except Exception as e:
+                    print(f"Face gallery poll failed: {e}")
+                finally:
+                    self._poll_lock.release()
+
+    def __len__(self):
+        self.ensure_loaded()
+        return self._size - self._tombstones
+
+    def _index_candidate_rows(self, query, require_face_only):
+        """Bước lọc bằng ANN index: các dòng ứng viên + các dòng chưa được index
+
+        Face đã xóa và (với require_face_only) user không được đăng nhập chỉ bằng khuôn mặt bị bỏ khỏi
+        kết quả search, nên lấy dư dần cho đến khi đủ INDEX_CANDIDATES dòng hợp lệ. None nếu không đủ
+        (hoặc index vừa bị thay) để bên gọi chuyển sang lọc theo centroid.
+        """
+        index = self._index
+        k = self.INDEX_CANDIDATES
+        while True:
+            candidates = index.search(query, k=k)[0]
+            with self._lock:
+                if index is not self._index:
+                    return None
+                buf = self._buffers
+                found = [row for row in (self._rows_by_face.get(int(face_id)) for face_id in candidates)
+                         if row is not None and (buf.face_only[row] or not require_face_only)]
+                if len(found) >= self.INDEX_CANDIDATES:
+                    return buf, self._users, found + self._unindexed
+            # Index (hoặc các list được probe) đã hết ứng viên, hoặc đã lấy dư tới giới hạn
+            if len(candidates) < k or k >= self.INDEX_CANDIDATES * self.INDEX_OVERFETCH:
+                return None
+            k *= 4
+
+    def _centroid_candidate_rows(self, query, require_face_only):
+        """Bước lọc thô theo centroid: mọi mẫu của top-k user gần nhất"""
+        with self._lock:
+            cents, slots = self._centroids, self._centroid_slots
+        coarse = cents.sq_norms[:slots] - 2.0 * (cents.matrix[:slots] @ query)
+        if require_face_only:
+            coarse = np.where(cents.face_only[:slots], coarse, np.inf)
+        top = top_k(coarse, self.CENTROID_CANDIDATES)
+        user_ids = cents.user_ids[top[np.isfinite(coarse[top])]]
+
+        with self._lock:
+            rows = []
+            for user_id in user_ids:
+                rows.extend(self._rows_by_user.get(int(user_id), ()))
+            return self._buffers, self._users, rows
+
+    def match(self, encoding, threshold=0.6, require_face_only=False):
+        """Tìm user gần nhất cho một encoding (1:N)
+
+        Hai bước: lọc thô theo centroid của từng user (hoặc ANN index với gallery lớn),
+        sau đó lấy khoảng cách nhỏ nhất trên các mẫu của những user ứng viên (best-of-k).
+        Trả về (user_info, distance); user_info là None nếu không có khoảng cách nào < threshold
+        """
+        self.ensure_loaded()
+        query = np.asarray(encoding, dtype=np.float32)
+
+        candidates = self._index_candidate_rows(query, require_face_only) if self._index is not None else None
+        if candidates is None:
+            candidates = self._centroid_candidate_rows(query, require_face_only)
+        buf, users, rows = candidates
+        if not rows:
+            return None, float('inf')
+
+        rows = np.array(rows, dtype=np.int64)
+        sq_dist = buf.sq_norms[rows] - 2.0 * (buf.matrix[rows] @ query) + np.dot(query, query)
+        if require_face_only:
+            sq_dist = np.where(buf.face_only[rows], sq_dist, np.inf)
+
+        best = int(np.argmin(sq_dist))
+        distance = float(np.sqrt(max(sq_dist[best], 0.0)))
+        row = int(rows[best])
+        user_info = users.get(int(buf.user_ids[row]))
+        if distance >= threshold or user_info is None:
+            return None, distance
+
+        user_info = dict(user_info)
+        user_info['face_id'] = int(buf.face_ids[row])
+        return user_info, distance
+
+
+# Singleton instance
+_face_gallery = None
+_face_gallery_lock = threading.Lock()
+
+def get_face_gallery():
+    """Lấy instance của FaceGallery dùng chung trong tiến trình"""
+    global _face_gallery
+    if _face_gallery is None:
+        with _face_gallery_lock:
+            if _face_gallery is None:
+                from .events import face_change_bus
+                _face_gallery = FaceGallery()
+                face_change_bus.subscribe(_face_gallery.apply_event)
+    return _face_gallery
@@ -0,0 +1,247 @@
+# Module chỉ mục tìm kiếm láng giềng gần nhất cho encoding khuôn mặt
+# FlatIndex: duyệt toàn bộ (chính xác); IVFIndex: chia cụm bằng k-means, chỉ duyệt nprobe cụm gần nhất
+#
+# Index được lưu thành một thư mục gồm meta.json và các file .npy,
+# nên khi khởi động có thể nạp bằng np.load(mmap_mode='r') mà không đọc hết vào RAM
+
+import json
+import os
+import shutil
+import numpy as np
+from .codec import ENCODING_DIM
+
+INDEX_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+
+def _squared_distances(vectors, sq_norms, query):
+    """||x - q||^2 = ||x||^2 - 2 x·q + ||q||^2 cho mọi dòng của `vectors`"""
+    return sq_norms - 2.0 * (vectors @ query) + np.dot(query, query)
+
+
+def top_k(sq_dist, k):
+    """Chỉ số của k khoảng cách nhỏ nhất, đã sắp xếp tăng dần"""
+    k = min(k, len(sq_dist))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(sq_dist):
+        part = np.argpartition(sq_dist, k - 1)[:k]
+    else:
+        part = np.arange(len(sq_dist))
+    return part[np.argsort(sq_dist[part], kind='stable')]
+
+
+class FaceIndex:
+    """Base class for face encoding indexes
+
+    Subclasses implement build(), search() and the array set used by save()/load().
+    Distances returned by search() are Euclidean, like face_recognition.face_distance.
+    """
+    kind = None
+    ARRAYS = ()
+
+    def __init__(self, dim=ENCODING_DIM):
+        self.dim = dim
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def params(self):
+        return {}
+
+    def build(self, vectors, ids=None):
+        raise NotImplementedError
+
+    def search(self, query, k=1):
+        raise NotImplementedError
+
+    @staticmethod
+    def _prepare(vectors, ids, dim):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, dim)
+        if ids is None:
+            ids = np.arange(len(vectors), dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        return vectors, ids
+
+    def save(self, path):
+        """Write the index to directory `path` (replaces an existing index)"""
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        meta = {
+            'version': INDEX_FORMAT_VERSION,
+            'kind': self.kind,
+            'dim': self.dim,
+            'count': len(self),
+            'params': self.params()
+        }
+        with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        # Reader đang mmap file cũ vẫn giữ được inode sau khi thư mục bị xóa
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _from_saved(cls, path, meta, mmap):
+        index = cls(dim=meta['dim'], **meta['params'])
+        mode = 'r' if mmap else None
+        for name in cls.ARRAYS:
+            setattr(index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+        return index
+
+
+class FlatIndex(FaceIndex):
+    """Exact search over every stored encoding"""
+    kind = 'flat'
+    ARRAYS = ('vectors', 'sq_norms', 'ids')
+
+    def __init__(self, dim=ENCODING_DIM):
+        super().__init__(dim)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def from_vectors(cls, vectors, ids=None, dim=ENCODING_DIM):
+        index = cls(dim)
+        index.build(vectors, ids)
+        return index
+
+    def build(self, vectors, ids=None):
+        self.vectors, self.ids = self._prepare(vectors, ids, self.dim)
+        self.sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        return self
+
+    def search(self, query, k=1):
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        sq_dist = _squared_distances(self.vectors, self.sq_norms, query)
+        top = top_k(sq_dist, k)
+        return self.ids[top], np.sqrt(np.maximum(sq_dist[top], 0.0))
+
+
+class IVFIndex(FaceIndex):
+    """Inverted-file index: k-means coarse quantizer + exact distances inside probed lists
+
+    Vectors are stored grouped by list (list i is rows offsets[i]:offsets[i+1]),
+    so probing a list is a contiguous slice. Recall is tuned with `nprobe`.
+    """
+    kind = 'ivf'
+    ARRAYS = ('centroids', 'centroid_sq_norms', 'offsets', 'vectors', 'sq_norms', 'ids')
+
+    def __init__(self, dim=ENCODING_DIM, nlist=None, nprobe=8, train_iters=10, train_size=None, seed=0):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.train_size = train_size
+        self.seed = seed
+        self.centroids = np.empty((0, dim), dtype=np.float32)
+        self.centroid_sq_norms = np.empty(0, dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+
+    def params(self):
+        return {
+            'nlist': self.nlist,
+            'nprobe': self.nprobe,
+            'train_iters': self.train_iters,
+            'train_size': self.train_size,
+            'seed': self.seed
+        }
+
+    @staticmethod
+    def _assign(vectors, centroids, centroid_sq_norms, chunk=8192):
+        """Cụm gần nhất cho từng vector, xử lý theo chunk để giới hạn bộ nhớ tạm"""
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start:start + chunk]
+            labels[start:start + chunk] = np.argmin(centroid_sq_norms - 2.0 * (block @ centroids.T), axis=1)
+        return labels
+
+    def _train(self, vectors, nlist):
+        rng = np.random.default_rng(self.seed)
+        train_size = self.train_size or 64 * nlist
+        sample = vectors
+        if len(vectors) > train_size:
+            sample = vectors[rng.choice(len(vectors), train_size, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.train_iters):
+            sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+            labels = self._assign(sample, centroids, sq_norms)
+            counts = np.bincount(labels, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Cụm rỗng: khởi tạo lại bằng một điểm ngẫu nhiên
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        return centroids
+
+    def build(self, vectors, ids=None):
+        vectors, ids = self._prepare(vectors, ids, self.dim)
+        if len(vectors) == 0:
+            raise ValueError("Cannot build an IVF index without vectors")
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        self.centroids = self._train(vectors, nlist)
+        self.centroid_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        labels = self._assign(vectors, self.centroids, self.centroid_sq_norms)
+
+        order = np.argsort(labels, kind='stable')
+        self.vectors = vectors[order]
+        self.ids = ids[order]
+        self.sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.offsets = np.searchsorted(labels[order], np.arange(nlist + 1)).astype(np.int64)
+        self.nlist = nlist
+        return self
+
+    def search(self, query, k=1, nprobe=None):
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        if nprobe <= 0 or len(self) == 0:
+            return self.ids[:0], np.empty(0, dtype=np.float32)
+
+        coarse = self.centroid_sq_norms - 2.0 * (self.centroids @ query)
+        probe = top_k(coarse, nprobe)
+        offsets = self.offsets
+        slices = [np.arange(offsets[c], offsets[c + 1]) for c in probe if offsets[c + 1] > offsets[c]]
+        if not slices:
+            return self.ids[:0], np.empty(0, dtype=np.float32)
+        rows = np.concatenate(slices)
+
+        sq_dist = _squared_distances(self.vectors[rows], self.sq_norms[rows], query)
+        top = top_k(sq_dist, k)
+        return self.ids[rows[top]], np.sqrt(np.maximum(sq_dist[top], 0.0))
+
+
+INDEX_TYPES = {
+    FlatIndex.kind: FlatIndex,
+    IVFIndex.kind: IVFIndex
+}
+
+
+def create_index(kind, dim=ENCODING_DIM, **params):
+    """Tạo index rỗng theo loại ('flat' hoặc 'ivf')"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown face index type: {kind}")
+    return INDEX_TYPES[kind](dim=dim, **params)
+
+
+def load_index(path, mmap=True):
+    """Load an index written by FaceIndex.save(); arrays are memory-mapped by default"""
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('version') != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported face index version: {meta.get('version')}")
+    if meta.get('kind') not in INDEX_TYPES:
+        raise ValueError(f"Unknown face index type: {meta.get('kind')}")
+    return INDEX_TYPES[meta['kind']]._from_saved(path, meta, mmap)
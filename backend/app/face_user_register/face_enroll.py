@@ -3,13 +3,14 @@
 
 import cv2
 import numpy as np
-import face_recognition
-import json
 import psycopg2
 from urllib.parse import urlparse
 from ..config.settings import Config
+from ..face_gallery.codec import encode_embedding
+from ..face_encoding import get_face_encoder
 # Removed liveness detection import - not needed for admin face registration
 from ..core.database import get_db_cursor
+from ..core.dialect import get_dialect
 
 # ---------------------------
 # Kết nối database
@@ -37,27 +38,18 @@ def capture_face_from_webcam():
 # Encode khuôn mặt thành vector embedding
 # ---------------------------
 def encode_face(image):
-    rgb_img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    boxes = face_recognition.face_locations(rgb_img)
-
-    if not boxes:
-        raise ValueError("Không tìm thấy khuôn mặt trong ảnh.")
-
-    encodings = face_recognition.face_encodings(rgb_img, boxes)
-    return encodings[0]  # Lấy khuôn mặt đầu tiên (nếu có nhiều)
+    return get_face_encoder().encode(image)  # Lấy khuôn mặt lớn nhất (nếu có nhiều)
 
 # ---------------------------
 # Lưu embedding tạm thởi vào pending_faces
 # ---------------------------
 def save_pending_embedding(embedding):
     with get_db_cursor() as cursor:
-        embedding_json = json.dumps(embedding.tolist())
-        cursor.execute(
-            "INSERT INTO pending_faces (face_encoding) VALUES (%s) RETURNING id",
-            (embedding_json,)
+        return get_dialect().insert_returning_id(
+            cursor,
+            "INSERT INTO pending_faces (face_embedding) VALUES (%s)",
+            (encode_embedding(embedding),)
         )
-        pending_id = cursor.fetchone()[0]
-        return pending_id
 
 # ---------------------------
 # Tích hợp: Chụp ảnh + tạo embedding + lưu vào DB tạm thởi
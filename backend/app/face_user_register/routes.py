@@ -3,6 +3,7 @@
 
 from flask import Blueprint, request, jsonify
 from .face_enroll import get_db_connection
+from ..core.dialect import get_dialect
 
 face_register_bp = Blueprint('face_register', __name__)
 
@@ -19,25 +20,23 @@ def register_face_user():
     try:
         with conn.cursor() as cur:
             # Lấy embedding từ pending_faces
-            cur.execute("SELECT face_encoding FROM pending_faces WHERE id = %s", (pending_id,))
+            cur.execute("SELECT face_embedding, face_encoding FROM pending_faces WHERE id = %s", (pending_id,))
             result = cur.fetchone()
             if not result:
                 return jsonify({'error': 'Pending face not found'}), 404
-            embedding = result[0]
+            embedding, legacy_encoding = result
 
             # Tạo user mới
-            cur.execute("""
+            user_id = get_dialect().insert_returning_id(cur, """
                 INSERT INTO users (username, email)
                 VALUES (%s, %s)
-                RETURNING id
             """, (username, email))
-            user_id = cur.fetchone()[0]
 
             # Lưu embedding vào bảng faces, liên kết với user
             cur.execute("""
-                INSERT INTO faces (user_id, face_encoding)
-                VALUES (%s, %s)
-            """, (user_id, embedding))
+                INSERT INTO faces (user_id, face_embedding, face_encoding)
+                VALUES (%s, %s, %s)
+            """, (user_id, embedding, legacy_encoding))
 
             # Xóa bản ghi tạm
             cur.execute("DELETE FROM pending_faces WHERE id = %s", (pending_id,))
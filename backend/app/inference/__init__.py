@@ -0,0 +1,2 @@
+# Inference worker pool module
+from .pool import InferencePool, InferenceBusyError, InferenceWorkerError, get_inference_pool, run_inference
@@ -0,0 +1,357 @@
+# Module pool tiến trình cho các tác vụ nhận diện nặng CPU (dlib HOG, landmark, ResNet encoding)
+# Mỗi worker nạp detector/predictor/encoder một lần; frame được truyền qua shared memory
+# Số tác vụ đang chờ bị giới hạn (backpressure): vượt quá thì request nhận lỗi 503 thay vì xếp hàng vô hạn
+
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+import numpy as np
+from ..config.settings import Config
+
+WORKER_CHECK_INTERVAL = 1.0  # giây giữa hai lần kiểm tra worker còn sống
+
+
+class InferenceBusyError(RuntimeError):
+    """Raised when the pool already holds INFERENCE_MAX_PENDING tasks"""
+    pass
+
+
+class InferenceWorkerError(RuntimeError):
+    """Raised when a worker process died or did not answer in time"""
+    pass
+
+
+# ----------------------------------------------------------------------
+# Operations (chạy trong worker, hoặc trực tiếp khi pool bị tắt)
+# ----------------------------------------------------------------------
+def _op_encode(frames, single_face=False):
+    from ..face_encoding import get_face_encoder
+    return get_face_encoder().encode(frames[0], single_face=single_face)
+
+def _op_encode_best(frames):
+    from ..face_encoding import get_face_encoder
+    return get_face_encoder().encode_best(frames)
+
+def _op_process_attendance(frames, enable_liveness_check=True):
+    from ..attendance.attendance import process_attendance_image
+    return process_attendance_image(frames[0], enable_liveness_check=enable_liveness_check)
+
+def _op_liveness_image(frames):
+    from ..liveness_detection.liveness_detection import check_liveness_from_image
+    return check_liveness_from_image(frames[0])
+
+def _op_liveness_landmarks(frames):
+    from ..liveness_detection.liveness_detection import get_liveness_detector
+    return get_liveness_detector().frame_landmarks(frames[0])
+
+def _op_liveness_frames(frames):
+    from ..liveness_detection.liveness_detection import check_liveness_from_frames
+    return check_liveness_from_frames(frames)
+
+OPERATIONS = {
+    'encode': _op_encode,
+    'encode_best': _op_encode_best,
+    'process_attendance': _op_process_attendance,
+    'liveness_image': _op_liveness_image,
+    'liveness_landmarks': _op_liveness_landmarks,
+    'liveness_frames': _op_liveness_frames
+}
+
+
+# ----------------------------------------------------------------------
+# Shared memory packing
+# ----------------------------------------------------------------------
+def _pack_frames(frames):
+    """Copy frames into one shared memory segment; returns (segment, [(offset, shape, dtype)])"""
+    frames = [np.ascontiguousarray(frame) for frame in frames]
+    segment = shared_memory.SharedMemory(create=True, size=max(sum(f.nbytes for f in frames), 1))
+    specs = []
+    offset = 0
+    for frame in frames:
+        np.ndarray(frame.shape, frame.dtype, buffer=segment.buf, offset=offset)[...] = frame
+        specs.append((offset, frame.shape, frame.dtype.str))
+        offset += frame.nbytes
+    return segment, specs
+
+def _unpack_frames(segment, specs):
+    """Zero-copy views over the frames stored in `segment`"""
+    return [np.ndarray(shape, np.dtype(dtype), buffer=segment.buf, offset=offset) for offset, shape, dtype in specs]
+
+
+# ----------------------------------------------------------------------
+# Worker process
+# ----------------------------------------------------------------------
+def _warm_up():
+    """Nạp model dlib một lần cho mỗi worker; lỗi sẽ được trả về theo từng tác vụ"""
+    try:
+        from ..face_encoding import get_face_encoder
+        get_face_encoder()
+        from ..liveness_detection.liveness_detection import get_liveness_detector
+        get_liveness_detector()
+    except Exception as e:
+        print(f"Inference worker {os.getpid()}: models not preloaded: {e}")
+
+def _worker_main(task_queue, result_queue):
+    import cv2
+    # Mỗi worker dùng một core; song song hóa ở mức tiến trình
+    cv2.setNumThreads(1)
+    _warm_up()
+    pid = os.getpid()
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, op, segment_name, specs, kwargs = task
+        result_queue.put(('start', task_id, pid))
+        start = time.perf_counter()
+        segment = None
+        try:
+            # Worker (spawn) dùng chung resource_tracker với tiến trình cha; tiến trình cha unlink segment
+            segment = shared_memory.SharedMemory(name=segment_name)
+            frames = _unpack_frames(segment, specs)
+            result = OPERATIONS[op](frames, **kwargs)
+            del frames
+            result_queue.put(('done', task_id, True, result, time.perf_counter() - start))
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(str(e))
+            result_queue.put(('done', task_id, False, e, time.perf_counter() - start))
+        finally:
+            if segment is not None:
+                try:
+                    segment.close()
+                except BufferError:
+                    pass
+
+
+# ----------------------------------------------------------------------
+# Pool
+# ----------------------------------------------------------------------
+class _Task:
+    __slots__ = ('future', 'segment', 'submitted', 'started', 'pid')
+
+    def __init__(self, future, segment):
+        self.future = future
+        self.segment = segment
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.pid = None
+
+
+class InferencePool:
+    """Bounded pool of inference worker processes"""
+
+    def __init__(self, workers=None, max_pending=None, queue_timeout=None, task_timeout=None):
+        self.workers = Config.INFERENCE_WORKERS if workers is None else workers
+        self.max_pending = max_pending or Config.INFERENCE_MAX_PENDING
+        self.queue_timeout = Config.INFERENCE_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.task_timeout = task_timeout or Config.INFERENCE_TASK_TIMEOUT
+        self._ctx = multiprocessing.get_context('spawn')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count(1)
+        self._tasks = {}
+        self._processes = []
+        self._listener = None
+        self._started = False
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0,
+                       'max_in_flight': 0, 'queue_seconds': 0.0, 'run_seconds': 0.0}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def start(self):
+        with self._lock:
+            if self._started or not self.enabled:
+                return
+            self._task_queue = self._ctx.Queue()
+            self._result_queue = self._ctx.Queue()
+            self._processes = [self._spawn() for _ in range(self.workers)]
+            self._listener = threading.Thread(target=self._listen, name='inference-results', daemon=True)
+            self._started = True
+        self._listener.start()
+
+    def _spawn(self):
+        process = self._ctx.Process(target=_worker_main, args=(self._task_queue, self._result_queue), daemon=True)
+        process.start()
+        return process
+
+    def stop(self):
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            processes = self._processes
+        for _ in processes:
+            self._task_queue.put(None)
+        for process in processes:
+            process.join(timeout=5)
+
+    def submit(self, op, frames, **kwargs):
+        """Queue an operation; raises InferenceBusyError when the pool is saturated"""
+        return self._submit(op, frames, kwargs)[1]
+
+    def _submit(self, op, frames, kwargs):
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown inference operation: {op}")
+        self.start()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise InferenceBusyError('Face recognition service is busy, please retry')
+
+        try:
+            segment, specs = _pack_frames(frames)
+        except Exception:
+            self._slots.release()
+            raise
+        future = Future()
+        with self._lock:
+            task_id = next(self._task_ids)
+            self._tasks[task_id] = _Task(future, segment)
+            self._stats['submitted'] += 1
+            self._stats['max_in_flight'] = max(self._stats['max_in_flight'], len(self._tasks))
+        self._task_queue.put((task_id, op, segment.name, specs, kwargs))
+        return task_id, future
+
+    def run(self, op, frames, **kwargs):
+        task_id, future = self._submit(op, frames, kwargs)
+        try:
+            return future.result(timeout=self.task_timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                task = self._tasks.get(task_id)
+                pid = task.pid if task is not None else None
+                if task is not None:
+                    self._stats['timed_out'] += 1
+            self._finish(task_id, False, InferenceWorkerError('Face recognition timed out'))
+            # Worker vẫn đang chạy tác vụ (vd. dlib bị treo): dừng nó để slot vừa trả ứng với một worker rảnh;
+            # _check_workers khởi động lại worker. Tác vụ chưa bắt đầu sẽ lỗi ngay vì segment đã bị unlink
+            if pid is not None:
+                self._terminate_worker(pid)
+            raise InferenceWorkerError('Face recognition timed out')
+
+    def _terminate_worker(self, pid):
+        with self._lock:
+            process = next((p for p in self._processes if p.pid == pid), None)
+        if process is None:
+            return
+        print(f"Inference worker {pid} timed out, terminating")
+        # SIGKILL: một lệnh C đang treo không xử lý SIGTERM
+        process.kill()
+        process.join(timeout=5)
+        self._check_workers()
+
+    def _finish(self, task_id, ok, value, run_seconds=0.0):
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            if task is None:
+                return
+            self._stats['completed' if ok else 'failed'] += 1
+            self._stats['run_seconds'] += run_seconds
+        task.segment.close()
+        task.segment.unlink()
+        self._slots.release()
+        if ok:
+            task.future.set_result(value)
+        else:
+            task.future.set_exception(value)
+
+    def _listen(self):
+        last_check = time.monotonic()
+        while self._started:
+            try:
+                message = self._result_queue.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                message = None
+            # Kiểm tra theo thời gian, kể cả khi worker khác vẫn liên tục trả kết quả
+            if time.monotonic() - last_check >= WORKER_CHECK_INTERVAL:
+                last_check = time.monotonic()
+                self._check_workers()
+            if message is None:
+                continue
+            if message[0] == 'start':
+                _, task_id, pid = message
+                with self._lock:
+                    task = self._tasks.get(task_id)
+                    if task is not None:
+                        task.started = time.perf_counter()
+                        task.pid = pid
+                        self._stats['queue_seconds'] += task.started - task.submitted
+            else:
+                _, task_id, ok, value, run_seconds = message
+                self._finish(task_id, ok, value, run_seconds)
+
+    def _check_workers(self):
+        """Thay worker đã chết và báo lỗi cho các tác vụ nó đang xử lý"""
+        with self._lock:
+            dead = [p for p in self._processes if not p.is_alive()]
+            if not dead or not self._started:
+                return
+            dead_pids = {p.pid for p in dead}
+            self._processes = [p for p in self._processes if p.is_alive()]
+            lost = [task_id for task_id, task in self._tasks.items() if task.pid in dead_pids]
+        for process in dead:
+            print(f"Inference worker {process.pid} exited with code {process.exitcode}, restarting")
+            with self._lock:
+                self._processes.append(self._spawn())
+        for task_id in lost:
+            self._finish(task_id, False, InferenceWorkerError('Inference worker crashed'))
+
+    def stats(self):
+        """Queue depth and throughput counters"""
+        with self._lock:
+            running = sum(1 for task in self._tasks.values() if task.started is not None)
+            stats = dict(self._stats)
+            in_flight = len(self._tasks)
+            alive = sum(1 for p in self._processes if p.is_alive())
+        done = stats['completed'] + stats['failed']
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'workers_alive': alive,
+            'max_pending': self.max_pending,
+            'queue_depth': in_flight - running,
+            'running': running,
+            'in_flight': in_flight,
+            'max_in_flight': stats['max_in_flight'],
+            'submitted': stats['submitted'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'rejected': stats['rejected'],
+            'timed_out': stats['timed_out'],
+            'avg_queue_ms': round(stats['queue_seconds'] * 1000 / done, 3) if done else 0.0,
+            'avg_run_ms': round(stats['run_seconds'] * 1000 / done, 3) if done else 0.0
+        }
+
+
+# Singleton instance
+_inference_pool = None
+_inference_pool_lock = threading.Lock()
+
+def get_inference_pool():
+    """Lấy instance của InferencePool dùng chung trong tiến trình"""
+    global _inference_pool
+    if _inference_pool is None:
+        with _inference_pool_lock:
+            if _inference_pool is None:
+                _inference_pool = InferencePool()
+    return _inference_pool
+
+
+def run_inference(op, frames, **kwargs):
+    """Chạy một tác vụ nhận diện trên pool worker (hoặc ngay trong thread hiện tại nếu pool bị tắt)"""
+    pool = get_inference_pool()
+    if not pool.enabled:
+        return OPERATIONS[op](list(frames), **kwargs)
+    return pool.run(op, frames, **kwargs)
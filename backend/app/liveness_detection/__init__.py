@@ -1,5 +1,5 @@
 # Liveness detection module init
 from .routes import liveness_bp
-from .liveness_detection import get_liveness_detector, check_liveness_from_image, check_liveness_from_frames, check_liveness_from_video
+from .liveness_detection import LivenessDetector, LivenessSession, get_liveness_detector, check_liveness_from_image, check_liveness_from_frames, check_liveness_from_video
 
-__all__ = ['liveness_bp', 'get_liveness_detector', 'check_liveness_from_image', 'check_liveness_from_frames', 'check_liveness_from_video']
+__all__ = ['liveness_bp', 'LivenessDetector', 'LivenessSession', 'get_liveness_detector', 'check_liveness_from_image', 'check_liveness_from_frames', 'check_liveness_from_video']
@@ -4,16 +4,75 @@
 import cv2
 import numpy as np
 import dlib
+import math
 import os
-from scipy.spatial import distance as dist
+import shutil
+import tempfile
 from collections import deque
+from functools import lru_cache
+import threading
 import time
 from ..config.settings import Config
+from ..face_encoding import FaceFrame, FaceEncoder, get_face_encoder
+
+# Chỉ số landmark của mắt phải (36-41) và mắt trái (42-47) theo mô hình 68 điểm
+EYE_INDICES = np.array([np.arange(36, 42), np.arange(42, 48)])
+NOSE_TIP = 30
+
+# Các điểm 3D của khuôn mặt chuẩn và landmark 2D tương ứng cho solvePnP
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),             # Nose tip
+    (0.0, -330.0, -65.0),        # Chin
+    (-225.0, 170.0, -135.0),     # Left eye left corner
+    (225.0, 170.0, -135.0),      # Right eye right corner
+    (-150.0, -150.0, -125.0),    # Left Mouth corner
+    (150.0, -150.0, -125.0)      # Right mouth corner
+])
+POSE_LANDMARKS = [30, 8, 36, 45, 48, 54]
+DIST_COEFFS = np.zeros((4, 1))
+
+# Ngưỡng điểm liveness trung bình để xác định live (có thể điều chỉnh)
+LIVENESS_THRESHOLD = 0.5
+# Điểm cao nhất một frame có thể đạt (nháy mắt 0.6 + chuyển động đầu 0.4)
+MAX_FRAME_SCORE = 1.0
+
+
+def shape_to_array(shape):
+    """Chuyển dlib full_object_detection thành mảng (num_parts, 2) int32"""
+    count = shape.num_parts
+    coords = np.fromiter((c for p in shape.parts() for c in (p.x, p.y)), dtype=np.int32, count=2 * count)
+    return coords.reshape(count, 2)
+
+
+@lru_cache(maxsize=16)
+def camera_intrinsics(height, width):
+    """Camera matrix xấp xỉ (tiêu cự = chiều rộng ảnh) cho một kích thước frame, được cache"""
+    matrix = np.array(
+        [[width, 0, width / 2],
+         [0, width, height / 2],
+         [0, 0, 1]], dtype="double"
+    )
+    matrix.flags.writeable = False
+    return matrix
+
+
+class LivenessThresholds:
+    """Các ngưỡng liveness; LivenessSession chỉ cần phần này khi landmark được tính ở nơi khác (pool worker)"""
+
+    # Thông số cho phát hiện nháy mắt
+    EYE_AR_THRESH = 0.25  # Ngưỡng Eye Aspect Ratio
+    EYE_AR_CONSEC_FRAMES = 3  # Số frame liên tiếp mắt đóng
+    BLINK_TIME_THRESH = 0.1  # Thời gian tối thiểu cho một cái nháy mắt
+    
+    # Thông số cho phát hiện chuyển động đầu
+    HEAD_MOVEMENT_THRESH = 15  # Ngưỡng chuyển động đầu (pixels)
+    MOVEMENT_FRAMES = 5  # Số frame để theo dõi chuyển động
+
+
+class LivenessDetector(LivenessThresholds):
+    """Model dùng chung (shape predictor; khuôn mặt do FaceEncoder phát hiện) và các ngưỡng; không giữ trạng thái theo phiên"""
 
-class LivenessDetector:
     def __init__(self):
-        # Khởi tạo face detector và landmark predictor
-        self.detector = dlib.get_frontal_face_detector()
         # Use correct path to the model file in liveness_detection/models directory
         model_path = os.path.join(os.path.dirname(__file__), 'models', 'shape_predictor_68_face_landmarks.dat')
         
@@ -25,124 +84,175 @@ class LivenessDetector:
                 "Or run: python download_liveness_model.py"
             )
         
+        # shape_predictor chỉ đọc sau khi nạp nên dùng chung giữa các thread được
         self.predictor = dlib.shape_predictor(model_path)
+    
+    def frame_landmarks(self, frame):
+        """68 landmark của khuôn mặt lớn nhất trong một FaceFrame (hoặc ảnh BGR), hoặc None
         
-        # Thông số cho phát hiện nháy mắt
-        self.EYE_AR_THRESH = 0.25  # Ngưỡng Eye Aspect Ratio
-        self.EYE_AR_CONSEC_FRAMES = 3  # Số frame liên tiếp mắt đóng
-        self.BLINK_TIME_THRESH = 0.1  # Thời gian tối thiểu cho một cái nháy mắt
-        
-        # Thông số cho phát hiện chuyển động đầu
-        self.HEAD_MOVEMENT_THRESH = 15  # Ngưỡng chuyển động đầu (pixels)
-        self.MOVEMENT_FRAMES = 5  # Số frame để theo dõi chuyển động
+        Dùng lại box do FaceEncoder phát hiện trên cùng frame (và cache landmark trên frame),
+        nên liveness và encoding trong một request chỉ chạy detector một lần
+        """
+        frame = FaceFrame.of(frame)
         
-        # Lưu trữ trạng thái
-        self.blink_counter = 0
-        self.total_blinks = 0
-        self.blink_start_time = None
-        self.head_positions = deque(maxlen=self.MOVEMENT_FRAMES)
+        def compute():
+            faces = get_face_encoder().face_boxes(frame)
+            if not faces:
+                return None
+            top, right, bottom, left = max((box for box, _ in faces), key=FaceEncoder._box_area)
+            return shape_to_array(self.predictor(frame.gray, dlib.rectangle(left, top, right, bottom)))
         
-    def eye_aspect_ratio(self, eye):
-        """Tính toán Eye Aspect Ratio (EAR)"""
-        # Tính khoảng cách giữa các điểm landmark của mắt
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        C = dist.euclidean(eye[0], eye[3])
-        
-        # Tính EAR
-        ear = (A + B) / (2.0 * C)
-        return ear
+        return frame.cached(('landmarks',), compute)
+    
+    @staticmethod
+    def eye_aspect_ratio(eye):
+        """Tính toán Eye Aspect Ratio (EAR) cho 6 điểm của một mắt (hoặc một mảng (..., 6, 2))"""
+        eye = np.asarray(eye, dtype=np.float64)
+        vertical = np.linalg.norm(eye[..., [1, 2], :] - eye[..., [5, 4], :], axis=-1).sum(axis=-1)
+        horizontal = np.linalg.norm(eye[..., 0, :] - eye[..., 3, :], axis=-1)
+        return vertical / (2.0 * horizontal)
+    
+    @staticmethod
+    def eye_aspect_ratios(landmarks):
+        """EAR trung bình của hai mắt cho một (68, 2) hoặc cả chuỗi (N, 68, 2) landmark"""
+        return LivenessDetector.eye_aspect_ratio(np.asarray(landmarks)[..., EYE_INDICES, :]).mean(axis=-1)
     
     def get_head_pose(self, landmarks, img_size):
         """Tính toán pose của đầu"""
-        # Các điểm 3D của khuôn mặt chuẩn
-        model_points = np.array([
-            (0.0, 0.0, 0.0),             # Nose tip
-            (0.0, -330.0, -65.0),        # Chin
-            (-225.0, 170.0, -135.0),     # Left eye left corner
-            (225.0, 170.0, -135.0),      # Right eye right corner
-            (-150.0, -150.0, -125.0),    # Left Mouth corner
-            (150.0, -150.0, -125.0)      # Right mouth corner
-        ])
-        
-        # Các điểm 2D tương ứng trên ảnh
-        image_points = np.array([
-            (landmarks[30][0], landmarks[30][1]),     # Nose tip
-            (landmarks[8][0], landmarks[8][1]),       # Chin
-            (landmarks[36][0], landmarks[36][1]),     # Left eye left corner
-            (landmarks[45][0], landmarks[45][1]),     # Right eye right corner
-            (landmarks[48][0], landmarks[48][1]),     # Left Mouth corner
-            (landmarks[54][0], landmarks[54][1])      # Right mouth corner
-        ], dtype="double")
-        
-        # Camera matrix
-        focal_length = img_size[1]
-        center = (img_size[1]/2, img_size[0]/2)
-        camera_matrix = np.array(
-            [[focal_length, 0, center[0]],
-             [0, focal_length, center[1]],
-             [0, 0, 1]], dtype="double"
-        )
-        
-        # Distortion coefficients
-        dist_coeffs = np.zeros((4,1))
+        image_points = np.asarray(landmarks, dtype=np.float64)[POSE_LANDMARKS]
+        camera_matrix = camera_intrinsics(img_size[0], img_size[1])
         
         # Solve PnP
         success, rotation_vector, translation_vector = cv2.solvePnP(
-            model_points, image_points, camera_matrix, dist_coeffs)
+            MODEL_POINTS, image_points, camera_matrix, DIST_COEFFS)
         
         return rotation_vector, translation_vector
     
-    def detect_blink(self, landmarks):
-        """Phát hiện nháy mắt"""
-        # Lấy tọa độ các điểm landmark của mắt trái và phải
-        left_eye = landmarks[42:48]
-        right_eye = landmarks[36:42]
-        
-        # Tính EAR cho cả hai mắt
-        left_ear = self.eye_aspect_ratio(left_eye)
-        right_ear = self.eye_aspect_ratio(right_eye)
-        
-        # Trung bình EAR của cả hai mắt
-        ear = (left_ear + right_ear) / 2.0
-        
-        # Kiểm tra nháy mắt
-        if ear < self.EYE_AR_THRESH:
+    def session(self):
+        """Tạo một phiên liveness mới dùng chung model này"""
+        return LivenessSession(self)
+
+
+class LivenessSession:
+    """Trạng thái liveness của một phiên (một người trước camera)
+    
+    Mỗi request/phiên tạo session riêng nên nhiều phiên có thể chạy song song trên cùng một LivenessDetector.
+    `stride`: số frame gốc giữa hai frame được phân tích (VideoFrameStream.stride); các ngưỡng đếm theo frame
+    (EYE_AR_CONSEC_FRAMES, MOVEMENT_FRAMES) được chia theo stride để vẫn ứng với cùng một khoảng thời gian
+    """
+
+    def __init__(self, models=None, stride=1):
+        self.models = models or get_liveness_detector()
+        self.set_stride(stride)
+    
+    def set_stride(self, stride):
+        """Đặt bước lấy mẫu frame và tính lại các ngưỡng theo frame; reset phiên"""
+        stride = max(1, int(stride))
+        self.blink_frames = max(1, round(self.models.EYE_AR_CONSEC_FRAMES / stride))
+        # Cần ít nhất hai vị trí để đo chuyển động
+        self.movement_frames = max(2, round(self.models.MOVEMENT_FRAMES / stride))
+        self.head_positions = deque(maxlen=self.movement_frames)
+        self.reset()
+    
+    def reset(self):
+        """Reset trạng thái phiên"""
+        self.blink_counter = 0
+        self.total_blinks = 0
+        self.blink_start_time = None
+        self.head_positions.clear()
+        self.frames_analyzed = 0
+    
+    def _update_blink(self, ear, timestamp):
+        """Cập nhật bộ đếm nháy mắt với EAR của một frame"""
+        if ear < self.models.EYE_AR_THRESH:
             self.blink_counter += 1
             if self.blink_counter == 1:
-                self.blink_start_time = time.time()
+                self.blink_start_time = timestamp
         else:
-            if self.blink_counter >= self.EYE_AR_CONSEC_FRAMES:
+            if self.blink_counter >= self.blink_frames:
                 if self.blink_start_time:
-                    blink_duration = time.time() - self.blink_start_time
-                    if blink_duration >= self.BLINK_TIME_THRESH:
+                    blink_duration = timestamp - self.blink_start_time
+                    if blink_duration >= self.models.BLINK_TIME_THRESH:
                         self.total_blinks += 1
                         self.blink_start_time = None
             self.blink_counter = 0
-        
-        return ear, self.total_blinks
+        return self.total_blinks
+    
+    def detect_blink(self, landmarks):
+        """Phát hiện nháy mắt"""
+        # Trung bình EAR của cả hai mắt
+        ear = float(LivenessDetector.eye_aspect_ratios(landmarks))
+        return ear, self._update_blink(ear, time.time())
     
     def detect_head_movement(self, landmarks):
         """Phát hiện chuyển động đầu"""
-        # Lấy tọa độ trung tâm khuôn mặt
-        nose_tip = landmarks[30]
-        current_position = np.array([nose_tip[0], nose_tip[1]])
-        
-        # Thêm vị trí hiện tại vào queue
-        self.head_positions.append(current_position)
+        # Thêm vị trí đầu mũi hiện tại vào queue
+        self.head_positions.append(np.asarray(landmarks[NOSE_TIP], dtype=np.float64))
         
         # Tính chuyển động nếu có đủ frame
         if len(self.head_positions) >= 2:
             movement = np.linalg.norm(self.head_positions[-1] - self.head_positions[0])
-            return movement > self.HEAD_MOVEMENT_THRESH
+            return movement > self.models.HEAD_MOVEMENT_THRESH
         
         return False
     
-    def analyze_frame(self, frame):
-        """Phân tích một frame để phát hiện liveness"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.detector(gray)
+    def _head_movements(self, nose_positions):
+        """detect_head_movement cho cả chuỗi vị trí đầu mũi (M, 2) bằng phép toán mảng"""
+        history = np.array(self.head_positions, dtype=np.float64).reshape(-1, 2)
+        positions = np.concatenate([history, nose_positions])
+        current = np.arange(len(history), len(positions))
+        # Phần tử đầu của cửa sổ movement_frames frame kết thúc tại frame hiện tại
+        oldest = np.maximum(current - (self.movement_frames - 1), 0)
+        movement = np.linalg.norm(positions[current] - positions[oldest], axis=1)
+        self.head_positions.extend(nose_positions)
+        return (current >= 1) & (movement > self.models.HEAD_MOVEMENT_THRESH)
+    
+    def analyze_frames(self, frames):
+        """Phân tích cả chuỗi frame một lần
+        
+        Phát hiện landmark vẫn chạy từng frame; EAR, chuyển động đầu và điểm liveness
+        được tính trên mảng (N, 68, 2). Trả về dict các mảng độ dài N như analyze_frame
+        """
+        landmarks = []
+        timestamps = []
+        detected = np.zeros(len(frames), dtype=bool)
+        for i, frame in enumerate(frames):
+            points = self.models.frame_landmarks(frame)
+            if points is not None:
+                detected[i] = True
+                landmarks.append(points)
+                timestamps.append(time.time())
         
+        results = {
+            'face_detected': detected,
+            'blink_detected': np.zeros(len(frames), dtype=bool),
+            'head_movement': np.zeros(len(frames), dtype=bool),
+            'ear_value': np.zeros(len(frames)),
+            'total_blinks': np.zeros(len(frames), dtype=np.int64),
+            'liveness_score': np.zeros(len(frames))
+        }
+        if not landmarks:
+            return results
+        
+        stacked = np.stack(landmarks)
+        ears = LivenessDetector.eye_aspect_ratios(stacked)
+        # Trạng thái nháy mắt phụ thuộc frame trước nên vẫn duyệt tuần tự, nhưng chỉ trên số thực
+        blinks = np.array([self._update_blink(ear, ts) for ear, ts in zip(ears.tolist(), timestamps)])
+        head_movement = self._head_movements(stacked[:, NOSE_TIP].astype(np.float64))
+        
+        results['ear_value'][detected] = ears
+        results['total_blinks'][detected] = blinks
+        results['blink_detected'][detected] = blinks > 0
+        results['head_movement'][detected] = head_movement
+        results['liveness_score'][detected] = 0.6 * (blinks > 0) + 0.4 * head_movement
+        return results
+    
+    def analyze_frame(self, frame):
+        """Phân tích một frame (ảnh BGR hoặc FaceFrame) để phát hiện liveness"""
+        return self.analyze_landmarks(self.models.frame_landmarks(frame))
+    
+    def analyze_landmarks(self, landmarks):
+        """Cập nhật phiên với landmark (68, 2) của một frame (None nếu không thấy khuôn mặt)"""
         results = {
             'face_detected': False,
             'blink_detected': False,
@@ -152,13 +262,8 @@ class LivenessDetector:
             'liveness_score': 0.0
         }
         
-        if len(faces) > 0:
+        if landmarks is not None:
             results['face_detected'] = True
-            face = faces[0]
-            
-            # Lấy landmarks
-            landmarks = self.predictor(gray, face)
-            landmarks = np.array([[p.x, p.y] for p in landmarks.parts()])
             
             # Phát hiện nháy mắt
             ear, total_blinks = self.detect_blink(landmarks)
@@ -182,77 +287,157 @@ class LivenessDetector:
         return results
     
     def is_live(self, frames_or_video):
-        """Kiểm tra liveness từ danh sách frames hoặc video"""
-        if isinstance(frames_or_video, str):  # Video file path
-            cap = cv2.VideoCapture(frames_or_video)
-            frames = []
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frames.append(frame)
-            cap.release()
-        else:  # List of frames
-            frames = frames_or_video
+        """Kiểm tra liveness từ danh sách frames hoặc video (đường dẫn hoặc stream file)"""
+        if isinstance(frames_or_video, (str, os.PathLike)) or hasattr(frames_or_video, 'read'):
+            with VideoFrameStream(frames_or_video) as stream:
+                self.set_stride(stream.stride)
+                return self.is_live_stream(stream, stream.expected_frames)
+        if not isinstance(frames_or_video, (list, tuple)):
+            return self.is_live_stream(frames_or_video)
         
+        frames = frames_or_video
         if not frames:
             return False, 0.0, "No frames to analyze"
         
         # Reset counters
-        self.blink_counter = 0
-        self.total_blinks = 0
-        self.head_positions.clear()
+        self.reset()
         
+        results = self.analyze_frames(frames)
+        self.frames_analyzed = len(frames)
+        return self._verdict(float(results['liveness_score'].sum()), int(results['face_detected'].sum()))
+    
+    def is_live_stream(self, frames, expected_frames=None):
+        """Kiểm tra liveness trên một iterable frame, xử lý từng frame một
+        
+        Khi biết trước số frame tối đa (`expected_frames`), dừng ngay khi kết quả không thể
+        thay đổi dù các frame còn lại đạt điểm 0 hay điểm tối đa
+        """
+        self.reset()
         total_liveness_score = 0.0
         valid_frames = 0
         
         for frame in frames:
+            self.frames_analyzed += 1
             result = self.analyze_frame(frame)
             if result['face_detected']:
                 total_liveness_score += result['liveness_score']
                 valid_frames += 1
+            
+            remaining = (expected_frames or 0) - self.frames_analyzed
+            if remaining > 0 and self._decided(total_liveness_score, valid_frames, remaining):
+                break
         
+        if self.frames_analyzed == 0:
+            return False, 0.0, "No frames to analyze"
+        return self._verdict(total_liveness_score, valid_frames)
+    
+    @staticmethod
+    def _decided(total_score, valid_frames, remaining):
+        """True nếu `remaining` frame nữa không thể làm đổi kết quả live/spoof"""
+        if valid_frames == 0:
+            return False
+        lowest = total_score / (valid_frames + remaining)
+        highest = max(total_score / valid_frames,
+                      (total_score + remaining * MAX_FRAME_SCORE) / (valid_frames + remaining))
+        return lowest >= LIVENESS_THRESHOLD or highest < LIVENESS_THRESHOLD
+    
+    @staticmethod
+    def _verdict(total_score, valid_frames):
         if valid_frames == 0:
             return False, 0.0, "No face detected in any frame"
         
         # Tính điểm liveness trung bình
-        avg_liveness_score = total_liveness_score / valid_frames
-        
-        # Ngưỡng để xác định live (có thể điều chỉnh)
-        LIVENESS_THRESHOLD = 0.5
+        avg_liveness_score = total_score / valid_frames
         
-        is_live = avg_liveness_score >= LIVENESS_THRESHOLD
-        
-        if is_live:
+        if avg_liveness_score >= LIVENESS_THRESHOLD:
             return True, avg_liveness_score, "Liveness detected"
         else:
             return False, avg_liveness_score, "Possible spoofing detected"
+
+
+class VideoFrameStream:
+    """Duyệt frame của video theo bước nhảy mà không giữ toàn bộ frame trong bộ nhớ
     
-    def reset(self):
-        """Reset trạng thái detector"""
-        self.blink_counter = 0
-        self.total_blinks = 0
-        self.blink_start_time = None
-        self.head_positions.clear()
+    `source` là đường dẫn hoặc file-like có seek. Frame bị bỏ qua chỉ được grab() (không giải mã ảnh).
+    Bước nhảy lấy từ `stride`, hoặc từ `target_fps` so với FPS của video (mặc định LIVENESS_VIDEO_FPS = 0: mọi frame).
+    """
+
+    def __init__(self, source, stride=None, target_fps=None, max_frames=None):
+        self._temp_path = None
+        self.capture = self._open(source)
+        if not self.capture.isOpened():
+            self.close()
+            raise ValueError("Cannot open video")
+        
+        target_fps = Config.LIVENESS_VIDEO_FPS if target_fps is None else target_fps
+        self.max_frames = Config.LIVENESS_VIDEO_MAX_FRAMES if max_frames is None else max_frames
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        if stride is None:
+            stride = round(self.fps / target_fps) if self.fps > 0 and target_fps > 0 else 1
+        self.stride = max(1, int(stride))
+        
+        # Số frame sẽ được phân tích (nếu video cho biết số frame); dùng để dừng sớm
+        frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        sampled = math.ceil(frame_count / self.stride) if frame_count > 0 else 0
+        limits = [n for n in (sampled, self.max_frames) if n > 0]
+        self.expected_frames = min(limits) if limits else None
+
+    def _open(self, source):
+        if isinstance(source, (str, os.PathLike)):
+            return cv2.VideoCapture(os.fspath(source))
+        
+        # VideoCapture chỉ đọc được từ file: chép stream ra file tạm theo từng khối (RAM không phụ thuộc kích thước video)
+        source.seek(0)
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
+            shutil.copyfileobj(source, temp_file, 1024 * 1024)
+            self._temp_path = temp_file.name
+        return cv2.VideoCapture(self._temp_path)
+
+    def __iter__(self):
+        yielded = 0
+        position = 0
+        while self.max_frames <= 0 or yielded < self.max_frames:
+            if not self.capture.grab():
+                break
+            if position % self.stride == 0:
+                ok, frame = self.capture.retrieve()
+                if not ok:
+                    break
+                yielded += 1
+                yield frame
+            position += 1
+
+    def close(self):
+        self.capture.release()
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.unlink(self._temp_path)
+        self._temp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 # Singleton instance
 _liveness_detector = None
+_liveness_detector_lock = threading.Lock()
 
 def get_liveness_detector():
-    """Lấy instance của LivenessDetector"""
+    """Lấy instance của LivenessDetector (model dùng chung, nạp một lần)"""
     global _liveness_detector
     if _liveness_detector is None:
-        _liveness_detector = LivenessDetector()
+        with _liveness_detector_lock:
+            if _liveness_detector is None:
+                _liveness_detector = LivenessDetector()
     return _liveness_detector
 
 
 def check_liveness_from_image(image):
-    """Kiểm tra liveness từ một ảnh đơn (ít tin cậy hơn)"""
-    detector = get_liveness_detector()
-    detector.reset()
-    
-    result = detector.analyze_frame(image)
+    """Kiểm tra liveness từ một ảnh đơn (ít tin cậy hơn); nhận ảnh BGR hoặc FaceFrame"""
+    session = LivenessSession()
+    result = session.analyze_frame(image)
     
     # Với ảnh đơn, chỉ có thể kiểm tra một số đặc điểm cơ bản
     if not result['face_detected']:
@@ -266,11 +451,10 @@ def check_liveness_from_image(image):
 
 def check_liveness_from_frames(frames):
     """Kiểm tra liveness từ nhiều frames (tin cậy hơn)"""
-    detector = get_liveness_detector()
-    return detector.is_live(frames)
+    return LivenessSession().is_live(frames)
 
 
-def check_liveness_from_video(video_path):
-    """Kiểm tra liveness từ video file"""
-    detector = get_liveness_detector()
-    return detector.is_live(video_path)
+def check_liveness_from_video(video, stride=None, target_fps=None, max_frames=None):
+    """Kiểm tra liveness từ video (đường dẫn hoặc stream file), đọc và chấm điểm từng frame"""
+    with VideoFrameStream(video, stride=stride, target_fps=target_fps, max_frames=max_frames) as stream:
+        return LivenessSession(stride=stream.stride).is_live_stream(stream, stream.expected_frames)
@@ -1,51 +1,22 @@
 # API routes cho liveness detection
 from flask import Blueprint, request, jsonify
-import cv2
-import numpy as np
-from .liveness_detection import check_liveness_from_image, check_liveness_from_frames, check_liveness_from_video
-import base64
-import io
-from PIL import Image
+from ..config.settings import Config
+from .liveness_detection import check_liveness_from_video
+from .sessions import get_liveness_sessions, VERDICT_PENDING
+from ..inference import run_inference, InferenceBusyError, InferenceWorkerError
+from ..core.utils import get_request_image, request_image_payloads, decode_image
 
 liveness_bp = Blueprint('liveness', __name__)
 
-def decode_base64_image(base64_string):
-    """Decode base64 string thành OpenCV image"""
-    try:
-        # Remove data URL prefix if present
-        if ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        
-        # Decode base64
-        image_data = base64.b64decode(base64_string)
-        
-        # Convert to PIL Image
-        pil_image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        
-        return opencv_image
-    except Exception as e:
-        raise ValueError(f"Invalid image data: {str(e)}")
-
 @liveness_bp.route('/check_image', methods=['POST'])
 def check_liveness_image():
     """Kiểm tra liveness từ một ảnh đơn"""
     try:
-        data = request.get_json()
-        
-        if not data or 'image' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'No image data provided'
-            }), 400
-        
-        # Decode image
-        image = decode_base64_image(data['image'])
+        # Multipart / raw image upload, or base64 `image` in JSON
+        image = get_request_image('image')
         
         # Kiểm tra liveness
-        is_live, score, message = check_liveness_from_image(image)
+        is_live, score, message = run_inference('liveness_image', [image])
         
         return jsonify({
             'success': True,
@@ -60,6 +31,11 @@ def check_liveness_image():
             'success': False,
             'error': str(e)
         }), 400
+    except (InferenceBusyError, InferenceWorkerError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -70,26 +46,19 @@ def check_liveness_image():
 def check_liveness_frames():
     """Kiểm tra liveness từ nhiều frames"""
     try:
-        data = request.get_json()
-        
-        if not data or 'frames' not in data:
+        # Multipart `frames` files, hoặc mảng base64 `frames` trong JSON
+        frames_data = request_image_payloads('frames')
+        if not frames_data:
             return jsonify({
                 'success': False,
                 'error': 'No frames data provided'
             }), 400
         
-        frames_data = data['frames']
-        if not isinstance(frames_data, list) or len(frames_data) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid frames data'
-            }), 400
-        
         # Decode tất cả frames
         frames = []
         for i, frame_data in enumerate(frames_data):
             try:
-                frame = decode_base64_image(frame_data)
+                frame = decode_image(frame_data)
                 frames.append(frame)
             except Exception as e:
                 return jsonify({
@@ -98,7 +67,7 @@ def check_liveness_frames():
                 }), 400
         
         # Kiểm tra liveness
-        is_live, score, message = check_liveness_from_frames(frames)
+        is_live, score, message = run_inference('liveness_frames', frames)
         
         return jsonify({
             'success': True,
@@ -109,6 +78,11 @@ def check_liveness_frames():
             'frames_analyzed': len(frames)
         })
         
+    except (InferenceBusyError, InferenceWorkerError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -132,37 +106,107 @@ def check_liveness_video():
                 'error': 'No video file selected'
             }), 400
         
-        # Lưu video tạm thời
-        import tempfile
-        import os
+        # Video được giải mã và chấm điểm từng frame, dừng sớm khi đã có kết quả
+        is_live, score, message = check_liveness_from_video(video_file.stream)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-            video_file.save(temp_file.name)
-            temp_video_path = temp_file.name
+        return jsonify({
+            'success': True,
+            'is_live': is_live,
+            'liveness_score': float(score),
+            'message': message,
+            'method': 'video_file'
+        })
         
-        try:
-            # Kiểm tra liveness
-            is_live, score, message = check_liveness_from_video(temp_video_path)
-            
-            return jsonify({
-                'success': True,
-                'is_live': is_live,
-                'liveness_score': float(score),
-                'message': message,
-                'method': 'video_file'
-            })
-            
-        finally:
-            # Xóa file tạm
-            if os.path.exists(temp_video_path):
-                os.unlink(temp_video_path)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Liveness detection failed: {str(e)}'
+        }), 500
+
+@liveness_bp.route('/sessions', methods=['POST'])
+def open_liveness_session():
+    """Mở phiên liveness streaming; client đẩy từng frame tới /sessions/<id>/frames"""
+    data = request.get_json(silent=True) or {}
+    max_frames = data.get('max_frames')
+    if max_frames is not None and (not isinstance(max_frames, int) or max_frames <= 0):
+        return jsonify({
+            'success': False,
+            'error': 'max_frames must be a positive integer'
+        }), 400
+    if max_frames is not None:
+        # Giới hạn phía server: phiên phải đi tới kết luận (kể cả spoof) sau tối đa chừng này frame
+        max_frames = min(max_frames, Config.LIVENESS_SESSION_MAX_FRAMES)
+    
+    store = get_liveness_sessions()
+    session = store.open(max_frames=max_frames)
+    return jsonify({
+        'success': True,
+        'session_id': session.session_id,
+        'max_frames': session.max_frames,
+        'expires_in': store.ttl
+    }), 201
+
+@liveness_bp.route('/sessions/<session_id>/frames', methods=['POST'])
+def push_liveness_frame(session_id):
+    """Đẩy một frame vào phiên; trả về kết quả tăng dần và kết luận (nếu đã có)"""
+    session = get_liveness_sessions().get(session_id)
+    if session is None:
+        return jsonify({
+            'success': False,
+            'error': 'Liveness session not found or expired'
+        }), 404
+    
+    try:
+        if session.verdict == VERDICT_PENDING:
+            landmarks = run_inference('liveness_landmarks', [get_request_image('frame')])
+            event = session.push(landmarks)
+        else:
+            event = session.event()
+        return jsonify(dict(event, success=True))
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except (InferenceBusyError, InferenceWorkerError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
             'error': f'Liveness detection failed: {str(e)}'
         }), 500
 
+@liveness_bp.route('/sessions/<session_id>', methods=['GET'])
+def get_liveness_session(session_id):
+    """Trạng thái hiện tại của phiên"""
+    session = get_liveness_sessions().get(session_id)
+    if session is None:
+        return jsonify({
+            'success': False,
+            'error': 'Liveness session not found or expired'
+        }), 404
+    return jsonify(dict(session.event(), success=True))
+
+@liveness_bp.route('/sessions/<session_id>', methods=['DELETE'])
+def close_liveness_session(session_id):
+    """Đóng phiên khi client không cần gửi thêm frame"""
+    session = get_liveness_sessions().close(session_id)
+    if session is None:
+        return jsonify({
+            'success': False,
+            'error': 'Liveness session not found or expired'
+        }), 404
+    return jsonify(dict(session.event(), success=True))
+
 @liveness_bp.route('/status', methods=['GET'])
 def liveness_status():
     """Kiểm tra trạng thái liveness detection service"""
@@ -180,8 +224,10 @@ def liveness_status():
                 'head_movement_detection': True,
                 'single_image_analysis': True,
                 'multi_frame_analysis': True,
-                'video_analysis': True
-            }
+                'video_analysis': True,
+                'streaming_sessions': True
+            },
+            'sessions': get_liveness_sessions().stats()
         })
         
     except Exception as e:
@@ -0,0 +1,160 @@
+# Module phiên liveness dạng streaming cho camera kiosk
+# Client mở phiên, đẩy từng frame JPEG và nhận kết quả tăng dần (nháy mắt, chuyển động đầu, điểm);
+# phiên trả về kết luận "live" sớm để client ngừng gửi. Trạng thái giữ phía server, hết hạn theo TTL
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from ..config.settings import Config
+from .config import LivenessConfig
+from .liveness_detection import LivenessSession, LivenessThresholds, LIVENESS_THRESHOLD
+
+VERDICT_PENDING = 'pending'
+VERDICT_LIVE = 'live'
+VERDICT_SPOOF = 'spoof'
+
+
+class StreamingLivenessSession:
+    """Một phiên liveness nhận frame theo thời gian thực
+
+    Kết luận "live" ngay khi đã nháy mắt và điểm trung bình đạt ngưỡng (sau tối thiểu
+    MIN_FRAMES_FOR_ANALYSIS frame có khuôn mặt); "spoof" khi các frame còn lại trong
+    giới hạn max_frames không thể kéo điểm lên ngưỡng. Kết luận đã đưa ra thì không đổi.
+    """
+
+    def __init__(self, session_id, max_frames=None, min_frames=None):
+        self.session_id = session_id
+        self.max_frames = max_frames or Config.LIVENESS_SESSION_MAX_FRAMES
+        self.min_frames = min_frames or LivenessConfig.MIN_FRAMES_FOR_ANALYSIS
+        # Landmark đến từ pool worker (run_inference) nên chỉ cần ngưỡng, không nạp shape predictor ở đây
+        self.liveness = LivenessSession(LivenessThresholds())
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self.frames_received = 0
+        self.valid_frames = 0
+        self.total_score = 0.0
+        self.verdict = VERDICT_PENDING
+
+    @property
+    def average_score(self):
+        return self.total_score / self.valid_frames if self.valid_frames else 0.0
+
+    def push(self, landmarks):
+        """Cập nhật phiên với landmark của một frame; trả về sự kiện cho client"""
+        with self.lock:
+            if self.verdict != VERDICT_PENDING:
+                return self.event()
+            result = self.liveness.analyze_landmarks(landmarks)
+            self.frames_received += 1
+            if result['face_detected']:
+                self.valid_frames += 1
+                self.total_score += result['liveness_score']
+            self.verdict = self._decide(result)
+            return self.event(result)
+
+    def _decide(self, result):
+        remaining = self.max_frames - self.frames_received
+        if remaining <= 0:
+            if self.valid_frames and self.average_score >= LIVENESS_THRESHOLD:
+                return VERDICT_LIVE
+            return VERDICT_SPOOF
+        if (result['blink_detected'] and self.valid_frames >= self.min_frames
+                and self.average_score >= LIVENESS_THRESHOLD):
+            return VERDICT_LIVE
+        if self.valid_frames and LivenessSession._decided(self.total_score, self.valid_frames, remaining):
+            return VERDICT_LIVE if self.average_score >= LIVENESS_THRESHOLD else VERDICT_SPOOF
+        return VERDICT_PENDING
+
+    def event(self, result=None):
+        event = {
+            'session_id': self.session_id,
+            'verdict': self.verdict,
+            'is_live': self.verdict == VERDICT_LIVE,
+            'done': self.verdict != VERDICT_PENDING,
+            'liveness_score': round(self.average_score, 4),
+            'frames_received': self.frames_received,
+            'frames_with_face': self.valid_frames,
+            'frames_remaining': max(self.max_frames - self.frames_received, 0),
+            'total_blinks': self.liveness.total_blinks
+        }
+        if result is not None:
+            event['frame'] = {
+                'face_detected': result['face_detected'],
+                'blink_detected': bool(result['blink_detected']),
+                'head_movement': bool(result['head_movement']),
+                'ear_value': round(float(result['ear_value']), 4),
+                'score': result['liveness_score']
+            }
+        return event
+
+
+class LivenessSessionStore:
+    """Các phiên streaming đang mở trong tiến trình, hết hạn sau `ttl` giây không có frame"""
+
+    def __init__(self, ttl=None, max_sessions=None):
+        self.ttl = ttl or Config.LIVENESS_SESSION_TTL
+        self.max_sessions = max_sessions or Config.LIVENESS_SESSION_MAX
+        self._sessions = OrderedDict()  # theo thứ tự truy cập, cũ nhất ở đầu
+        self._lock = threading.Lock()
+        self._expired = 0
+
+    def _evict_expired(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen < self.ttl:
+                break
+            del self._sessions[session_id]
+            self._expired += 1
+
+    def open(self, max_frames=None):
+        """Mở phiên mới; khi đầy, phiên ít được dùng nhất bị loại"""
+        now = time.time()
+        session = StreamingLivenessSession(secrets.token_urlsafe(16), max_frames=max_frames)
+        with self._lock:
+            self._evict_expired(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._expired += 1
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        """Phiên còn hạn (và gia hạn TTL), hoặc None"""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_seen = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            self._evict_expired(time.time())
+            return {
+                'open_sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'expired': self._expired
+            }
+
+
+# Singleton instance
+_session_store = None
+_session_store_lock = threading.Lock()
+
+def get_liveness_sessions():
+    """Lấy kho phiên liveness streaming dùng chung"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = LivenessSessionStore()
+    return _session_store
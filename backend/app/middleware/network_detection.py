@@ -1,8 +1,68 @@
 # Network detection middleware
 import os
 import ipaddress
+from bisect import bisect_right
 from flask import request, g
-from functools import wraps
+from functools import wraps, lru_cache
+from ..config.settings import Config
+
+class NetworkClassifier:
+    """Internal/external classifier compiled from CIDR strings
+    
+    Ranges are parsed once into sorted, merged integer intervals per address family;
+    a lookup is one bisect, and results are memoized per IP string in a bounded LRU.
+    """
+    
+    def __init__(self, ranges, cache_size=None):
+        self.ranges = list(ranges)
+        self._starts = {4: [], 6: []}
+        self._ends = {4: [], 6: []}
+        
+        intervals = {4: [], 6: []}
+        for range_str in self.ranges:
+            try:
+                network = ipaddress.ip_network(range_str, strict=False)
+            except ValueError:
+                continue
+            intervals[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        
+        for version, spans in intervals.items():
+            for start, end in sorted(spans):
+                ends = self._ends[version]
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    self._starts[version].append(start)
+                    ends.append(end)
+        
+        self.is_internal = lru_cache(maxsize=cache_size or Config.NETWORK_CLASSIFIER_CACHE_SIZE)(self._classify)
+    
+    def _classify(self, ip_address):
+        if not ip_address:
+            return False
+        try:
+            address = ipaddress.ip_address(ip_address.strip())
+        except ValueError:
+            # Invalid IP address
+            return False
+        
+        # IPv4 clients seen through a dual-stack socket (::ffff:a.b.c.d)
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        
+        value = int(address)
+        index = bisect_right(self._starts[address.version], value) - 1
+        return index >= 0 and value <= self._ends[address.version][index]
+    
+    def stats(self):
+        info = self.is_internal.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'cached_ips': info.currsize,
+            'max_cached_ips': info.maxsize,
+            'intervals': {f'ipv{version}': len(starts) for version, starts in self._starts.items()}
+        }
 
 class NetworkDetector:
     """Network detection utility class"""
@@ -20,6 +80,7 @@ class NetworkDetector:
         
         # Load custom ranges from environment
         self.internal_ranges = self._load_internal_ranges()
+        self.classifier = NetworkClassifier(self.internal_ranges)
     
     def _load_internal_ranges(self):
         """Load internal IP ranges from environment variables"""
@@ -63,25 +124,7 @@ class NetworkDetector:
     
     def is_internal_network(self, ip_address):
         """Check if IP address is from internal network"""
-        if not ip_address:
-            return False
-        
-        try:
-            client_ip = ipaddress.ip_address(ip_address)
-            
-            for range_str in self.internal_ranges:
-                try:
-                    network = ipaddress.ip_network(range_str, strict=False)
-                    if client_ip in network:
-                        return True
-                except ValueError:
-                    continue
-            
-            return False
-            
-        except ValueError:
-            # Invalid IP address
-            return False
+        return self.classifier.is_internal(ip_address)
     
     def get_network_info(self):
         """Get complete network information"""
@@ -1 +1,3 @@
 # Report module
+from .rollup import month_bounds, refresh_attendance_rollup, refresh_daily_rollup, rebuild_attendance_rollup, user_totals, attendance_watermark
+from .jobs import ReportJobQueue, ReportJobBusyError, get_report_job_queue
@@ -0,0 +1,75 @@
+# Xuất báo cáo dạng luồng (CSV / XLSX)
+# Dòng dữ liệu đi thẳng từ server-side cursor (core.database.stream_query) qua bộ ghi từng khối
+# ra body của Response, nên file một năm của toàn bộ nhân viên vẫn dùng bộ nhớ cố định.
+import csv
+import io
+import tempfile
+from datetime import datetime
+from flask import Response
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+CHUNK_SIZE = 64 * 1024  # bytes gửi mỗi lần
+
+
+def csv_chunks(headers, rows, chunk_size=CHUNK_SIZE):
+    """Sinh các khối bytes UTF-8 của file CSV; chỉ giữ trong bộ nhớ một khối"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_chunks(title, headers, rows, chunk_size=CHUNK_SIZE):
+    """Sinh các khối bytes của file XLSX
+
+    Workbook ở chế độ write-only ghi từng dòng ra file tạm thay vì giữ mọi ô trong bộ nhớ;
+    file zip chỉ hoàn chỉnh khi lưu xong nên phần gửi đi bắt đầu sau bước lưu.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row in rows:
+        ws.append(row)
+
+    with tempfile.TemporaryFile() as output:
+        wb.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_filename(name, extension):
+    """attendance_report_20240305.csv"""
+    return f'{name}_{datetime.now().strftime("%Y%m%d")}.{extension}'
+
+
+def streaming_download(chunks, mimetype, filename):
+    """Response tải file với body là generator (Flask gửi từng khối khi sinh ra)"""
+    return Response(chunks, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        # Không để reverse proxy gom cả file lại trước khi gửi
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,321 @@
+# Hàng đợi job tạo file báo cáo chạy nền (không cần broker)
+# submit() trả về job id ngay; một pool thread cục bộ sinh file, tiến độ được ghi ra <id>.json cạnh file kết quả
+# nên mọi worker process đều đọc được. Job id là hash của (loại báo cáo, định dạng, tham số, watermark dữ liệu):
+# yêu cầu giống hệt trong REPORT_ARTIFACT_TTL dùng lại file đã có, dữ liệu thay đổi thì watermark đổi và job mới được tạo.
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ..config.settings import Config
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+PROGRESS_INTERVAL = 1.0  # giây tối thiểu giữa hai lần ghi tiến độ ra đĩa
+PURGE_INTERVAL = 60.0  # giây tối thiểu giữa hai lần dọn file hết hạn
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class ReportJobBusyError(RuntimeError):
+    """Raised when REPORT_JOB_MAX_PENDING jobs are already queued or running"""
+    pass
+
+
+class ReportJob:
+    """Trạng thái một job báo cáo (lưu ra <id>.json)"""
+
+    FIELDS = ('job_id', 'report_type', 'format', 'params', 'filename', 'mimetype', 'status',
+              'rows', 'total_rows', 'size', 'error', 'created_at', 'started_at', 'finished_at', 'updated_at')
+
+    def __init__(self, job_id, report_type, format, params, filename, mimetype):
+        self.job_id = job_id
+        self.report_type = report_type
+        self.format = format
+        self.params = params
+        self.filename = filename
+        self.mimetype = mimetype
+        self.status = JOB_QUEUED
+        self.rows = 0
+        self.total_rows = None
+        self.size = None
+        self.error = None
+        self.created_at = self.updated_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def progress(self):
+        """0..1; chỉ đạt 1 khi file đã ghi xong"""
+        if self.status == JOB_DONE:
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        # Phần cuối (lưu file) chưa xong nên giữ dưới 1
+        return round(min(self.rows / self.total_rows, 0.99), 4)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['job_id'], data['report_type'], data['format'], data['params'],
+                  data['filename'], data['mimetype'])
+        for field in cls.FIELDS:
+            setattr(job, field, data.get(field))
+        return job
+
+
+def counted(rows, progress, every=500):
+    """Chuyển tiếp các dòng và báo số dòng đã xử lý cho progress(rows) sau mỗi `every` dòng"""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % every == 0:
+            progress(count)
+    progress(count)
+
+
+class ReportJobQueue:
+    """Pool thread cục bộ sinh file báo cáo, kèm kho file kết quả trên đĩa"""
+
+    def __init__(self, directory=None, workers=None, max_pending=None, ttl=None, stale_after=None):
+        self.directory = directory or Config.REPORT_ARTIFACT_DIR
+        self.workers = workers or Config.REPORT_JOB_WORKERS
+        self.max_pending = max_pending or Config.REPORT_JOB_MAX_PENDING
+        self.ttl = Config.REPORT_ARTIFACT_TTL if ttl is None else ttl
+        self.stale_after = stale_after or Config.REPORT_JOB_STALE_AFTER
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._active = {}  # job_id -> ReportJob đang chờ/chạy trong tiến trình này
+        self._last_purge = 0.0
+        self._stats = {'submitted': 0, 'cache_hits': 0, 'joined': 0, 'completed': 0,
+                       'failed': 0, 'rejected': 0, 'run_seconds': 0.0}
+
+    @staticmethod
+    def job_key(report_type, format, params, watermark):
+        """Job id: hash ổn định của loại báo cáo, định dạng, tham số và watermark dữ liệu"""
+        payload = json.dumps([report_type, format, params, watermark], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _ensure_started(self):
+        # Thread không còn sau fork nên tạo lại executor trong tiến trình con
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._active = {}
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-job')
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def artifact_path(self, job):
+        """Đường dẫn file kết quả của job"""
+        return os.path.join(self.directory, f"{job.job_id}.{job.format}")
+
+    def _save(self, job):
+        """Ghi trạng thái job (thay thế nguyên tử để tiến trình khác không đọc phải file dở)"""
+        job.updated_at = time.time()
+        path = self._status_path(job.job_id)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'w') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(temp, path)
+
+    def get(self, job_id):
+        """Job theo id (trong tiến trình này hoặc từ file trạng thái), None nếu không có"""
+        # job_id đến từ URL nên chỉ chấp nhận đúng dạng hash trước khi ghép đường dẫn
+        if not _JOB_ID.fullmatch(job_id or ''):
+            return None
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        try:
+            with open(self._status_path(job_id)) as f:
+                return ReportJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _reusable(self, job):
+        """Job đã xong còn hạn, hoặc đang chạy ở tiến trình khác mà vẫn còn cập nhật"""
+        now = time.time()
+        if job.status == JOB_DONE:
+            return now - job.finished_at < self.ttl and os.path.exists(self.artifact_path(job))
+        if job.status in (JOB_QUEUED, JOB_RUNNING):
+            return job.job_id in self._active or now - job.updated_at < self.stale_after
+        return False
+
+    def submit(self, report_type, format, params, watermark, producer, filename, mimetype):
+        """Đưa job vào hàng đợi; trả về (job, cached) - cached=True khi dùng lại job/file đã có
+
+        producer(params, progress) trả về iterable các khối bytes của file; progress(rows, total=None)
+        cập nhật tiến độ.
+        """
+        self._ensure_started()
+        self.purge_expired()
+        job_id = self.job_key(report_type, format, params, watermark)
+
+        with self._lock:
+            existing = self.get(job_id)
+            if existing is not None and self._reusable(existing):
+                self._stats['cache_hits' if existing.status == JOB_DONE else 'joined'] += 1
+                return existing, True
+            if len(self._active) >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise ReportJobBusyError('Report service is busy, please retry later')
+
+            job = ReportJob(job_id, report_type, format, params, filename, mimetype)
+            self._active[job_id] = job
+            self._stats['submitted'] += 1
+
+        try:
+            self._save(job)
+            self._executor.submit(self._run, job, producer)
+        except Exception:
+            with self._lock:
+                self._active.pop(job_id, None)
+            raise
+        return job, False
+
+    def _run(self, job, producer):
+        last_saved = [time.time()]
+
+        def progress(rows, total=None):
+            job.rows = rows
+            if total is not None:
+                job.total_rows = total
+            if total is not None or time.time() - last_saved[0] >= PROGRESS_INTERVAL:
+                last_saved[0] = time.time()
+                self._save(job)
+
+        path = self.artifact_path(job)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            # Nằm trong try để lỗi ghi trạng thái cũng đi qua finally và job được gỡ khỏi _active
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            self._save(job)
+            with open(temp, 'wb') as f:
+                for chunk in producer(job.params, progress):
+                    f.write(chunk)
+            os.replace(temp, path)
+            job.size = os.path.getsize(path)
+            job.status = JOB_DONE
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            from ..core.utils import log_activity
+            log_activity('ERROR', f'Report job {job.job_id} ({job.report_type}) failed: {str(e)}', 'reports')
+        finally:
+            job.finished_at = time.time()
+            try:
+                self._save(job)
+            finally:
+                with self._lock:
+                    self._active.pop(job.job_id, None)
+                    self._stats['completed' if job.status == JOB_DONE else 'failed'] += 1
+                    self._stats['run_seconds'] += job.finished_at - job.started_at
+
+    def _stale_temp(self, name, now):
+        """File tạm (<id>.<ext>.<pid>.<tid>.part / <id>.json.<pid>.<tid>.tmp) bị bỏ lại khi tiến trình ghi dừng giữa chừng"""
+        job_id = name.split('.', 1)[0]
+        if job_id in self._active:
+            return False
+        job = self.get(job_id)
+        # Job của tiến trình khác vẫn đang cập nhật thì file tạm còn được ghi tiếp
+        if job is not None and job.status in (JOB_QUEUED, JOB_RUNNING) and now - job.updated_at < self.stale_after:
+            return False
+        try:
+            return now - os.path.getmtime(os.path.join(self.directory, name)) >= self.stale_after
+        except OSError:
+            return False
+
+    def purge_expired(self, force=False):
+        """Xóa file kết quả và trạng thái đã quá hạn cùng file tạm bị bỏ lại; trả về số job bị xóa"""
+        now = time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return 0
+        self._last_purge = now
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            if name.endswith(('.part', '.tmp')):
+                if self._stale_temp(name, now):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+                continue
+            if not name.endswith('.json'):
+                continue
+            job = self.get(name[:-5])
+            if job is None or job.job_id in self._active:
+                continue
+            if job.status in (JOB_QUEUED, JOB_RUNNING):
+                expired = now - job.updated_at >= max(self.stale_after, self.ttl)
+            else:
+                expired = now - job.finished_at >= self.ttl
+            if not expired:
+                continue
+            for path in (self.artifact_path(job), self._status_path(job.job_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            removed += 1
+        return removed
+
+    def stats(self):
+        """Số job đang chờ/chạy và bộ đếm cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            running = sum(1 for job in self._active.values() if job.status == JOB_RUNNING)
+            active = len(self._active)
+        done = stats['completed'] + stats['failed']
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'artifact_ttl': self.ttl,
+            'queued': active - running,
+            'running': running,
+            'submitted': stats['submitted'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'rejected': stats['rejected'],
+            'cache_hits': stats['cache_hits'],
+            'joined': stats['joined'],
+            'avg_run_ms': round(stats['run_seconds'] * 1000 / done, 3) if done else 0.0
+        }
+
+
+# Singleton instance
+_report_jobs = None
+_report_jobs_lock = threading.Lock()
+
+def get_report_job_queue():
+    """Lấy hàng đợi job báo cáo dùng chung trong tiến trình"""
+    global _report_jobs
+    if _report_jobs is None:
+        with _report_jobs_lock:
+            if _report_jobs is None:
+                _report_jobs = ReportJobQueue()
+    return _report_jobs
@@ -0,0 +1,226 @@
+# Bảng tổng hợp chấm công (rollup) cho thống kê và báo cáo
+# attendance_daily_stats: một dòng mỗi ngày; attendance_user_monthly_stats: một dòng mỗi user mỗi tháng.
+# Mỗi lần ghi chấm công chỉ tính lại đúng dòng ngày và dòng user-tháng bị ảnh hưởng (truy vấn theo
+# idx_attendance_date / idx_attendance_user_date); scripts/backfill_attendance_rollup.py dựng lại theo khoảng ngày.
+
+from datetime import date, datetime, timedelta
+from ..core.database import get_db_cursor
+from ..core.dialect import get_dialect
+from ..core.periods import month_bounds
+
+DAILY_TABLE = 'attendance_daily_stats'
+MONTHLY_TABLE = 'attendance_user_monthly_stats'
+
+DAILY_COLUMNS = ('date', 'unique_users', 'total_records', 'present_count', 'late_count',
+                 'absent_count', 'total_hours', 'updated_at')
+MONTHLY_COLUMNS = ('user_id', 'month_start', 'total_days', 'present_days', 'late_days',
+                   'absent_days', 'total_hours', 'updated_at')
+
+# Bộ đếm chung, cùng thứ tự với các cột sau khóa trong hai bảng
+COUNTERS = """
+    COUNT(*),
+    COUNT(CASE WHEN status = 'present' THEN 1 END),
+    COUNT(CASE WHEN status = 'late' THEN 1 END),
+    COUNT(CASE WHEN status = 'absent' THEN 1 END),
+    COALESCE(SUM(total_hours), 0)
+"""
+
+SCHEMA = (
+    f"""
+    CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+        date DATE PRIMARY KEY,
+        unique_users INT NOT NULL DEFAULT 0,
+        total_records INT NOT NULL DEFAULT 0,
+        present_count INT NOT NULL DEFAULT 0,
+        late_count INT NOT NULL DEFAULT 0,
+        absent_count INT NOT NULL DEFAULT 0,
+        total_hours DECIMAL(10,2) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NULL
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {MONTHLY_TABLE} (
+        user_id INT NOT NULL,
+        month_start DATE NOT NULL,
+        total_days INT NOT NULL DEFAULT 0,
+        present_days INT NOT NULL DEFAULT 0,
+        late_days INT NOT NULL DEFAULT 0,
+        absent_days INT NOT NULL DEFAULT 0,
+        total_hours DECIMAL(8,2) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NULL,
+        PRIMARY KEY (user_id, month_start),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """
+)
+
+
+def _lock_rollup_row(cursor, dialect, table, keys, values):
+    """Tạo dòng tổng hợp nếu chưa có rồi khóa nó (FOR UPDATE) đến hết transaction"""
+    cursor.execute(dialect.insert_missing(table, keys, keys), values)
+    where = ' AND '.join(f"{key} = %s" for key in keys)
+    cursor.execute(f"SELECT 1 FROM {table} WHERE {where} FOR UPDATE", values)
+    cursor.fetchone()
+
+
+def _refresh_day(cursor, dialect, day, now):
+    """Tính lại dòng ngày `day` từ attendance"""
+    cursor.execute(dialect.upsert(
+        DAILY_TABLE, DAILY_COLUMNS, ('date',),
+        select=f"SELECT %s, COUNT(DISTINCT user_id), {COUNTERS}, %s FROM attendance WHERE date = %s"
+    ), (day, now, day))
+
+
+def refresh_attendance_rollup(user_id, day):
+    """Tính lại dòng ngày `day` và dòng tháng của `user_id` sau khi bản ghi chấm công thay đổi
+
+    Chạy trong block con của get_db_cursor() nên dùng chung transaction với lệnh ghi chấm công;
+    lỗi ở đây chỉ được ghi log, không làm hỏng lượt chấm công (backfill sẽ sửa lại).
+
+    PostgreSQL (READ COMMITTED): snapshot của câu INSERT ... SELECT không thấy bản ghi chưa commit của
+    transaction khác, nên hai lượt chấm công cùng ngày chạy song song sẽ mỗi bên chỉ đếm dòng của mình.
+    Vì vậy khóa dòng ngày (và dòng user-tháng) trước: transaction sau chờ transaction trước commit rồi mới
+    đếm lại với snapshot mới. MySQL chạy autocommit và INSERT ... SELECT đọc bản mới nhất nên không cần khóa.
+    """
+    from ..core.utils import log_activity
+
+    if isinstance(day, datetime):
+        day = day.date()
+    start, end = month_bounds(day)
+    now = datetime.now()
+    dialect = get_dialect()
+
+    try:
+        with get_db_cursor() as cursor:
+            if not dialect.is_mysql:
+                # Luôn khóa dòng ngày trước dòng user-tháng để các transaction không chờ vòng nhau
+                _lock_rollup_row(cursor, dialect, DAILY_TABLE, ('date',), (day,))
+                _lock_rollup_row(cursor, dialect, MONTHLY_TABLE, ('user_id', 'month_start'), (user_id, start))
+            _refresh_day(cursor, dialect, day, now)
+            cursor.execute(dialect.upsert(
+                MONTHLY_TABLE, MONTHLY_COLUMNS, ('user_id', 'month_start'),
+                select=f"SELECT %s, %s, {COUNTERS}, %s FROM attendance WHERE user_id = %s AND date >= %s AND date < %s"
+            ), (user_id, start, now, user_id, start, end))
+    except Exception as e:
+        log_activity('WARNING', f'Attendance rollup refresh failed for user {user_id} on {day}: {str(e)}', 'reports')
+
+
+def refresh_daily_rollup(days):
+    """Tính lại các dòng ngày `days`, vd. sau khi xóa user
+
+    ON DELETE CASCADE xóa chấm công và dòng user-tháng của user, nhưng bảng ngày không có khóa ngoại
+    nên phải đếm lại. Chạy trong transaction của bên gọi như refresh_attendance_rollup.
+    """
+    from ..core.utils import log_activity
+
+    days = sorted({day.date() if isinstance(day, datetime) else day for day in days})
+    if not days:
+        return
+    now = datetime.now()
+    dialect = get_dialect()
+
+    try:
+        with get_db_cursor() as cursor:
+            # Khóa theo thứ tự ngày tăng dần để không chờ vòng với transaction khác
+            for day in days:
+                if not dialect.is_mysql:
+                    _lock_rollup_row(cursor, dialect, DAILY_TABLE, ('date',), (day,))
+                _refresh_day(cursor, dialect, day, now)
+    except Exception as e:
+        log_activity('WARNING', f'Daily rollup refresh failed for {len(days)} days: {str(e)}', 'reports')
+
+
+def rebuild_attendance_rollup(cursor, start, end):
+    """Dựng lại toàn bộ dòng tổng hợp của các tháng giao với [start, end); trả về (số ngày, số dòng user-tháng)"""
+    month_start = month_bounds(start)[0]
+    month_end = end if end.day == 1 else month_bounds(end)[1]
+    now = datetime.now()
+
+    cursor.execute(f"DELETE FROM {DAILY_TABLE} WHERE date >= %s AND date < %s", (month_start, month_end))
+    cursor.execute(f"""
+        INSERT INTO {DAILY_TABLE} ({', '.join(DAILY_COLUMNS)})
+        SELECT date, COUNT(DISTINCT user_id), {COUNTERS}, %s
+        FROM attendance WHERE date >= %s AND date < %s
+        GROUP BY date
+    """, (now, month_start, month_end))
+    days = cursor.rowcount
+
+    cursor.execute(f"DELETE FROM {MONTHLY_TABLE} WHERE month_start >= %s AND month_start < %s", (month_start, month_end))
+    month_expr = get_dialect().date_trunc('month', 'date')
+    cursor.execute(f"""
+        INSERT INTO {MONTHLY_TABLE} ({', '.join(MONTHLY_COLUMNS)})
+        SELECT user_id, {month_expr}, {COUNTERS}, %s
+        FROM attendance WHERE date >= %s AND date < %s AND user_id IS NOT NULL
+        GROUP BY user_id, {month_expr}
+    """, (now, month_start, month_end))
+    user_months = cursor.rowcount
+
+    return days, user_months
+
+
+def user_totals(cursor, start, end, user_id=None):
+    """Tổng chấm công theo user trong [start, end): {user_id: [days, present, late, absent, hours]}
+
+    Các tháng trọn vẹn đọc từ bảng user-tháng; phần lẻ đầu/cuối khoảng đọc từ attendance theo index ngày.
+    """
+    # Chưa có chấm công cho ngày tương lai nên khoảng kéo quá hôm nay được tính đến hết tháng
+    if end > date.today():
+        end = max(end, month_bounds(end - timedelta(days=1))[1])
+
+    first_full = start if start.day == 1 else month_bounds(start)[1]
+    last_full = end if end.day == 1 else month_bounds(end)[0]
+
+    user_filter = " AND user_id = %s" if user_id is not None else ""
+    user_params = [user_id] if user_id is not None else []
+    totals = {}
+
+    def add(rows):
+        for row in rows:
+            current = totals.setdefault(row[0], [0, 0, 0, 0, 0.0])
+            for i, value in enumerate(row[1:]):
+                current[i] += float(value or 0) if i == 4 else int(value or 0)
+
+    if first_full < last_full:
+        cursor.execute(f"""
+            SELECT user_id, SUM(total_days), SUM(present_days), SUM(late_days), SUM(absent_days), SUM(total_hours)
+            FROM {MONTHLY_TABLE}
+            WHERE month_start >= %s AND month_start < %s{user_filter}
+            GROUP BY user_id
+        """, [first_full, last_full] + user_params)
+        add(cursor.fetchall())
+        edges = [(start, first_full), (last_full, end)]
+    else:
+        edges = [(start, end)]
+
+    for edge_start, edge_end in edges:
+        if edge_start >= edge_end:
+            continue
+        cursor.execute(f"""
+            SELECT user_id, {COUNTERS}
+            FROM attendance
+            WHERE date >= %s AND date < %s{user_filter}
+            GROUP BY user_id
+        """, [edge_start, edge_end] + user_params)
+        add(cursor.fetchall())
+
+    return totals
+
+
+def attendance_watermark(cursor, start=None, end=None):
+    """Dấu phiên bản dữ liệu chấm công của các ngày start..end (bao gồm hai đầu, None = không giới hạn)
+
+    Mỗi lần ghi chấm công đều làm mới updated_at của dòng ngày tương ứng, nên (updated_at lớn nhất,
+    tổng số bản ghi) đổi khi dữ liệu trong khoảng thay đổi; dùng để khóa cache file báo cáo.
+    """
+    conditions = []
+    params = []
+    if start:
+        conditions.append("date >= %s")
+        params.append(start)
+    if end:
+        conditions.append("date <= %s")
+        params.append(end)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"SELECT MAX(updated_at), COALESCE(SUM(total_records), 0) FROM {DAILY_TABLE}{where}", params)
+    row = cursor.fetchone()
+    return f"{row[0]}|{row[1]}"
@@ -0,0 +1,75 @@
+# Attendance rollup backfill script
+# Dựng lại attendance_daily_stats / attendance_user_monthly_stats từ bảng attendance, mỗi tháng một transaction
+import sys
+import os
+from datetime import datetime
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.database import get_db_cursor
+from app.report.rollup import SCHEMA, month_bounds, rebuild_attendance_rollup
+
+def ensure_rollup_tables():
+    """Create the rollup tables if they do not exist yet"""
+    with get_db_cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    print("✓ Rollup tables ready")
+
+def attendance_date_range():
+    """(first, last) attendance date, or None when the table is empty"""
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT MIN(date), MAX(date) FROM attendance")
+        row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    return row[0], row[1]
+
+def backfill_attendance_rollup(start=None, end=None):
+    print("Backfilling attendance rollup...")
+
+    try:
+        ensure_rollup_tables()
+
+        if start is None or end is None:
+            bounds = attendance_date_range()
+            if bounds is None:
+                print("✓ No attendance rows, nothing to backfill")
+                return True
+            start = start or bounds[0]
+            end = end or bounds[1]
+
+        current = month_bounds(start)[0]
+        total_days = 0
+        total_user_months = 0
+        while current <= end:
+            following = month_bounds(current)[1]
+            with get_db_cursor() as cursor:
+                days, user_months = rebuild_attendance_rollup(cursor, current, following)
+            total_days += max(days, 0)
+            total_user_months += user_months
+            print(f"  {current:%Y-%m}: {days} days, {user_months} user-months")
+            current = following
+
+        print(f"✓ Attendance rollup rebuilt: {total_days} days, {total_user_months} user-months")
+        return True
+
+    except Exception as e:
+        print(f"✗ Attendance rollup backfill failed: {e}")
+        return False
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild the daily and per-user monthly attendance rollup tables')
+    parser.add_argument('--start', type=parse_date, help='First date to rebuild (YYYY-MM-DD); default: first attendance date')
+    parser.add_argument('--end', type=parse_date, help='Last date to rebuild (YYYY-MM-DD); default: last attendance date')
+
+    args = parser.parse_args()
+
+    if not backfill_attendance_rollup(args.start, args.end):
+        sys.exit(1)
@@ -0,0 +1,98 @@
+# Face detection scale measurement script
+# Đo độ chính xác / độ trễ của FaceEncoder theo kích thước ảnh phát hiện trên một bộ ảnh mẫu
+# Tham chiếu: phát hiện trên ảnh đầy đủ; so sánh box (IoU) và encoding với tham chiếu
+import sys
+import os
+import time
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import cv2
+import numpy as np
+from app.face_encoding import FaceEncoder, NoFaceDetectedError
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def load_fixtures(fixture_dir):
+    images = []
+    for name in sorted(os.listdir(fixture_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(os.path.join(fixture_dir, name))
+            if image is not None:
+                images.append((name, image))
+    return images
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    union = area(a) + area(b) - inter
+    return inter / union if union else 0.0
+
+def run_encoder(encoder, image, repeat):
+    """(faces, median ms) cho một ảnh; faces là list (box, encoding)"""
+    timings = []
+    faces = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            faces = encoder.encode_all(image)
+        except NoFaceDetectedError:
+            faces = []
+        timings.append((time.perf_counter() - start) * 1000)
+    return faces, float(np.median(timings))
+
+def measure(fixtures, scales, repeat=3, upsample=1, model='hog'):
+    reference_encoder = FaceEncoder(detection_model=model, upsample=upsample, detection_max_dimension=0)
+    reference = [run_encoder(reference_encoder, image, repeat) for _, image in fixtures]
+    total_faces = sum(len(faces) for faces, _ in reference)
+    print(f"Fixtures: {len(fixtures)} images, {total_faces} reference faces (full-resolution {model}, upsample={upsample})")
+    print(f"{'max side':>9} {'recall':>7} {'extra':>6} {'mean dist':>10} {'max dist':>9} {'ms/image':>9} {'speedup':>8}")
+
+    reference_ms = np.mean([ms for _, ms in reference])
+    for scale in scales:
+        encoder = FaceEncoder(detection_model=model, upsample=upsample, detection_max_dimension=scale)
+        matched = 0
+        extra = 0
+        distances = []
+        latencies = []
+        for (name, image), (ref_faces, _) in zip(fixtures, reference):
+            faces, ms = run_encoder(encoder, image, repeat)
+            latencies.append(ms)
+            used = set()
+            for ref_box, ref_encoding in ref_faces:
+                candidates = [(iou(ref_box, box), i) for i, (box, _) in enumerate(faces) if i not in used]
+                best = max(candidates, default=(0.0, None))
+                if best[0] >= 0.5:
+                    used.add(best[1])
+                    matched += 1
+                    distances.append(float(np.linalg.norm(faces[best[1]][1] - ref_encoding)))
+            extra += len(faces) - len(used)
+
+        recall = matched / total_faces if total_faces else 0.0
+        mean_ms = float(np.mean(latencies))
+        print(f"{scale or 'full':>9} {recall:7.3f} {extra:6d} "
+              f"{np.mean(distances) if distances else 0.0:10.4f} {max(distances, default=0.0):9.4f} "
+              f"{mean_ms:9.1f} {reference_ms / mean_ms:7.1f}x")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure face detection accuracy vs latency per detection scale')
+    parser.add_argument('fixture_dir', help='Directory of camera frames (jpg/png) from the kiosk to tune')
+    parser.add_argument('--scales', type=int, nargs='+', default=[0, 320, 480, 640, 800],
+                        help='Max side of the detection image (0 = full resolution)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--upsample', type=int, default=1)
+    parser.add_argument('--model', default='hog', choices=['hog', 'cnn'])
+
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixture_dir)
+    if not fixtures:
+        print(f"✗ No images found in {args.fixture_dir}")
+        sys.exit(1)
+
+    measure(fixtures, args.scales, args.repeat, args.upsample, args.model)
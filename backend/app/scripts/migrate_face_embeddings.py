@@ -0,0 +1,122 @@
+# Face embedding migration script
+# Chuyển face_encoding dạng TEXT (JSON) sang cột face_embedding nhị phân theo từng batch
+import sys
+import os
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.database import get_db_cursor, get_db_dialect
+from app.face_gallery.codec import encode_embedding, load_embedding
+
+TABLES = ('faces', 'pending_faces')
+
+BLOB_TYPES = {
+    'mysql': 'BLOB',
+    'postgresql': 'BYTEA'
+}
+
+SCHEMA_FUNCTIONS = {
+    'mysql': 'DATABASE()',
+    'postgresql': 'current_schema()'
+}
+
+def ensure_embedding_columns():
+    """Add face_embedding columns and relax NOT NULL on the legacy face_encoding column"""
+    dialect = get_db_dialect()
+    
+    with get_db_cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = {SCHEMA_FUNCTIONS[dialect]}
+                AND table_name = %s AND column_name = 'face_embedding'
+            """, (table,))
+            
+            if cursor.fetchone():
+                print(f"✓ {table}.face_embedding already exists")
+                continue
+            
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN face_embedding {BLOB_TYPES[dialect]} NULL")
+            
+            if dialect == 'mysql':
+                cursor.execute(f"ALTER TABLE {table} MODIFY face_encoding TEXT NULL")
+            else:
+                cursor.execute(f"ALTER TABLE {table} ALTER COLUMN face_encoding DROP NOT NULL")
+            
+            print(f"✓ Added {table}.face_embedding")
+
+def migrate_table(table, batch_size=500, clear_text=False, dry_run=False):
+    """Convert legacy rows of one table, one transaction per batch"""
+    set_clause = "face_embedding = %s"
+    if clear_text:
+        set_clause += ", face_encoding = NULL"
+    if table == 'faces':
+        # Giữ nguyên updated_at để các worker không coi đây là thay đổi gallery
+        set_clause += ", updated_at = updated_at"
+    
+    last_id = 0
+    converted = 0
+    failed = 0
+    
+    while True:
+        with get_db_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, face_encoding FROM {table}
+                WHERE id > %s AND face_embedding IS NULL AND face_encoding IS NOT NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            
+            if not rows:
+                break
+            
+            updates = []
+            for row_id, legacy_text in rows:
+                try:
+                    updates.append((encode_embedding(load_embedding(None, legacy_text)), row_id))
+                except Exception as e:
+                    failed += 1
+                    print(f"✗ {table} row {row_id}: {e}")
+            
+            last_id = rows[-1][0]
+            
+            if updates and not dry_run:
+                cursor.executemany(f"UPDATE {table} SET {set_clause} WHERE id = %s", updates)
+            
+            converted += len(updates)
+            print(f"  {table}: {converted} rows converted (last id {last_id})")
+    
+    return converted, failed
+
+def migrate_face_embeddings(batch_size=500, clear_text=False, dry_run=False):
+    print("Migrating face encodings to binary format...")
+    
+    try:
+        if not dry_run:
+            ensure_embedding_columns()
+        
+        for table in TABLES:
+            converted, failed = migrate_table(table, batch_size, clear_text, dry_run)
+            print(f"✓ {table}: {converted} converted, {failed} failed")
+        
+        print("✓ Face embedding migration completed")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Face embedding migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Convert TEXT face encodings to binary embeddings')
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows converted per transaction')
+    parser.add_argument('--clear-text', action='store_true', help='Set legacy face_encoding to NULL after conversion')
+    parser.add_argument('--dry-run', action='store_true', help='Parse and count rows without writing')
+    
+    args = parser.parse_args()
+    
+    if not migrate_face_embeddings(args.batch_size, args.clear_text, args.dry_run):
+        sys.exit(1)
@@ -0,0 +1,169 @@
+# test_query_plans.py
+# Kiểm tra các bộ lọc thời gian của thống kê/báo cáo vẫn dùng được index (EXPLAIN)
+# Chạy với database thật, MySQL hoặc PostgreSQL tùy DATABASE_URL:
+#   python app/tests/test_query_plans.py
+# Dưới pytest, test được bỏ qua khi thiếu driver hoặc không kết nối được database.
+import sys
+import os
+import json
+from datetime import date
+
+try:
+    import pytest
+except ImportError:  # chạy trực tiếp bằng python không cần pytest
+    pytest = None
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+if pytest is not None and __name__ != "__main__":
+    # app.core.database nạp cả hai driver khi import
+    pytest.importorskip('mysql.connector')
+    pytest.importorskip('psycopg2')
+
+from app.core.database import get_db_cursor, get_db_dialect
+from app.core.dialect import get_dialect
+from app.core.periods import Period
+
+SAMPLE_USER_ID = 1
+
+def plan_queries(today=None):
+    """(tên, bảng/alias, SQL, params, có phải dùng index) cho các truy vấn thống kê tiêu biểu"""
+    today = today or date.today()
+    month = Period.containing('month', today)
+    day = Period.containing('day', today)
+    week = Period.containing('week', today)
+
+    month_where, month_params = month.sql('date')
+    alias_where, alias_params = month.sql('a.date')
+    day_where, day_params = day.sql('date')
+    week_where, week_params = week.sql('date')
+
+    # Trang tiếp theo của phân trang keyset, dựng giống KeysetPage.fetch
+    dialect = get_dialect()
+    date_before, date_before_params = dialect.keyset_before('date', 'id', today, 1000)
+    logs_before, logs_before_params = dialect.keyset_before('created_at', 'id', month.end, 1000)
+
+    return [
+        ('calculate_salary (user + month)', 'attendance',
+         f"SELECT COUNT(*), SUM(total_hours) FROM attendance WHERE user_id = %s AND {month_where}",
+         (SAMPLE_USER_ID, *month_params), True),
+        ('ai salary records (user + month, joined)', 'a',
+         f"SELECT a.date, a.status FROM attendance a JOIN users u ON a.user_id = u.id WHERE a.user_id = %s AND {alias_where}",
+         (SAMPLE_USER_ID, *alias_params), True),
+        ('monthly stats (user + month)', 'attendance',
+         f"SELECT date, COUNT(*) FROM attendance WHERE user_id = %s AND {month_where} GROUP BY date",
+         (SAMPLE_USER_ID, *month_params), True),
+        ('admin dashboard (today)', 'attendance',
+         f"SELECT COUNT(*) FROM attendance WHERE {day_where} AND check_in_time IS NOT NULL",
+         day_params, True),
+        ('weekly unique users', 'attendance',
+         f"SELECT COUNT(DISTINCT user_id) FROM attendance WHERE {week_where}",
+         week_params, True),
+        ('daily rollup (month)', 'attendance_daily_stats',
+         f"SELECT date, total_records FROM attendance_daily_stats WHERE {month_where}",
+         month_params, True),
+        ('monthly rollup (month)', 'attendance_user_monthly_stats',
+         "SELECT user_id, total_hours FROM attendance_user_monthly_stats WHERE month_start = %s",
+         (month.start,), True),
+        # Phân trang keyset: trang sâu vẫn tìm theo index (sort column, id)
+        ('attendance history (keyset page)', 'attendance',
+         f"SELECT id, date FROM attendance WHERE {date_before} ORDER BY date DESC, id DESC LIMIT %s",
+         (*date_before_params, 21), True),
+        ('system logs (keyset page)', 'logs',
+         f"SELECT id, created_at FROM logs WHERE {logs_before} ORDER BY created_at DESC, id DESC LIMIT %s",
+         (*logs_before_params, 101), True),
+        ('notifications (keyset page)', 'notifications',
+         f"SELECT id, created_at FROM notifications WHERE user_id = %s AND {logs_before} ORDER BY created_at DESC, id DESC LIMIT %s",
+         (SAMPLE_USER_ID, *logs_before_params, 21), True),
+        # Đối chứng: bộ lọc EXTRACT cũ không có điều kiện index nào, phải bị báo là quét (toàn bảng hoặc toàn index)
+        ('EXTRACT filter (control)', 'attendance',
+         "SELECT COUNT(*) FROM attendance WHERE EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s",
+         (today.month, today.year), False),
+    ]
+
+# Kiểu truy cập MySQL có tìm theo khóa index; 'index' (quét toàn index) và 'ALL' thì không
+MYSQL_SEEK_TYPES = ('range', 'ref', 'eq_ref', 'const')
+
+def mysql_uses_index(cursor, table, sql, params):
+    """MySQL: the table's EXPLAIN row must seek an index (range/ref/eq_ref/const access on a chosen key)"""
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [column[0] for column in cursor.description]
+    for row in cursor.fetchall():
+        row = dict(zip(columns, row))
+        if row.get('table') == table:
+            return row.get('type') in MYSQL_SEEK_TYPES and row.get('key') is not None, row
+    return False, None
+
+def _has_index_cond(node):
+    """Index Cond on the node itself, or on the bitmap index scans under a Bitmap Heap Scan"""
+    if 'Index Cond' in node:
+        return True
+    return node['Node Type'] == 'Bitmap Heap Scan' and any(_bitmap_index_cond(child) for child in node.get('Plans', []))
+
+def _bitmap_index_cond(node):
+    if 'Index Cond' in node:
+        return True
+    # BitmapAnd / BitmapOr: mọi nhánh đều phải tìm theo index
+    children = node.get('Plans', [])
+    return bool(children) and all(_bitmap_index_cond(child) for child in children)
+
+def postgresql_uses_index(cursor, table, sql, params):
+    """PostgreSQL: with sequential scans disabled, every node reading the table must have an Index Cond
+
+    A full index scan (e.g. an Index Only Scan that only filters) does not count as using the index.
+    """
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    nodes = []
+    stack = [plan[0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if node.get('Relation Name') == table or node.get('Alias') == table:
+            nodes.append(node)
+        stack.extend(node.get('Plans', []))
+    detail = [(node['Node Type'], node.get('Index Name')) for node in nodes]
+    return bool(nodes) and all(_has_index_cond(node) for node in nodes), detail
+
+def database_unavailable():
+    """Lý do bỏ qua test khi không kết nối được database, None nếu kết nối được"""
+    try:
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except Exception as e:
+        return f"No database reachable: {e}"
+    return None
+
+def check_query_plans():
+    dialect = get_db_dialect()
+    check = mysql_uses_index if dialect == 'mysql' else postgresql_uses_index
+    failures = []
+
+    for name, table, sql, params, expect_index in plan_queries():
+        with get_db_cursor() as cursor:
+            uses_index, detail = check(cursor, table, sql, params)
+        ok = uses_index == expect_index
+        print(f"{'✓' if ok else '✗'} [{dialect}] {name}: {'index' if uses_index else 'full scan'} {detail}")
+        if not ok:
+            failures.append(name)
+
+    assert not failures, f"Unexpected query plans: {', '.join(failures)}"
+
+def test_query_plans():
+    reason = database_unavailable()
+    if reason:
+        pytest.skip(reason)
+    check_query_plans()
+
+if __name__ == "__main__":
+    try:
+        check_query_plans()
+        print("✓ All statistics queries use an index")
+    except AssertionError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
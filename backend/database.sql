@@ -33,7 +33,8 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS faces (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT,
-    face_encoding TEXT NOT NULL,
+    face_embedding BLOB, -- Binary float32 embedding (6-byte header + raw little-endian data)
+    face_encoding TEXT NULL, -- Legacy JSON encoding, kept for rows not yet migrated
     image_path VARCHAR(255),
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -44,7 +45,8 @@ CREATE TABLE IF NOT EXISTS faces (
 -- 3. Create pending_faces table
 CREATE TABLE IF NOT EXISTS pending_faces (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    face_encoding TEXT NOT NULL,
+    face_embedding BLOB,
+    face_encoding TEXT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -136,12 +138,38 @@ CREATE TABLE IF NOT EXISTS file_references (
     FOREIGN KEY (file_id) REFERENCES uploaded_files(id) ON DELETE CASCADE
 );
 
--- 11. Create indexes for performance optimization
+-- 11. Create attendance rollup tables (maintained on check-in/out, rebuilt by app/scripts/backfill_attendance_rollup.py)
+CREATE TABLE IF NOT EXISTS attendance_daily_stats (
+    date DATE PRIMARY KEY,
+    unique_users INT NOT NULL DEFAULT 0,
+    total_records INT NOT NULL DEFAULT 0,
+    present_count INT NOT NULL DEFAULT 0,
+    late_count INT NOT NULL DEFAULT 0,
+    absent_count INT NOT NULL DEFAULT 0,
+    total_hours DECIMAL(10,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NULL
+);
+
+CREATE TABLE IF NOT EXISTS attendance_user_monthly_stats (
+    user_id INT NOT NULL,
+    month_start DATE NOT NULL, -- Ngày đầu tháng
+    total_days INT NOT NULL DEFAULT 0,
+    present_days INT NOT NULL DEFAULT 0,
+    late_days INT NOT NULL DEFAULT 0,
+    absent_days INT NOT NULL DEFAULT 0,
+    total_hours DECIMAL(8,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NULL,
+    PRIMARY KEY (user_id, month_start),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 12. Create indexes for performance optimization
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_faces_user_id ON faces(user_id);
 CREATE INDEX IF NOT EXISTS idx_attendance_user_date ON attendance(user_id, date);
 CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date);
+CREATE INDEX IF NOT EXISTS idx_attendance_monthly_month ON attendance_user_monthly_stats(month_start);
 CREATE INDEX IF NOT EXISTS idx_leave_requests_user_id ON leave_requests(user_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, is_read);
@@ -151,8 +179,14 @@ CREATE INDEX IF NOT EXISTS idx_uploaded_files_user_id ON uploaded_files(user_id)
 CREATE INDEX IF NOT EXISTS idx_uploaded_files_upload_date ON uploaded_files(upload_date);
 CREATE INDEX IF NOT EXISTS idx_file_references_file_id ON file_references(file_id);
 CREATE INDEX IF NOT EXISTS idx_file_references_reference ON file_references(reference_type, reference_id);
+-- Keyset pagination: newest-first listings seek on (sort column, id)
+CREATE INDEX IF NOT EXISTS idx_attendance_date_id ON attendance(date, id);
+CREATE INDEX IF NOT EXISTS idx_logs_created_id ON logs(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_logs_level_created_id ON logs(level, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_id ON notifications(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_uploaded_files_user_upload_id ON uploaded_files(user_id, upload_date, id);
 
--- 12. Insert default admin user
+-- 13. Insert default admin user
 -- Password: admin123 (bcrypt hashed)
 -- IMPORTANT: Change this password after first login!
 INSERT INTO users (
@@ -176,7 +210,7 @@ VALUES (
     CURRENT_TIMESTAMP
 ) ON DUPLICATE KEY UPDATE username = VALUES(username);
 
--- 13. Insert sample users với các loại access khác nhau
+-- 14. Insert sample users với các loại access khác nhau
 INSERT INTO users (
     username, full_name, email, password_hash, role,
     allow_password_login, allow_face_only, require_password_for_external,